@@ -4,7 +4,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .models.database import init_db
-from .routes import classify, clients, health, ingest, metrics, transcripts
+from .routes import classify, clients, health, ingest, metrics, pains, transcripts
 
 from .settings import settings
 
@@ -16,17 +16,19 @@ allowed_origins = ["*"]
 if settings.frontend_origin:
     allowed_origins = [settings.frontend_origin]
 
+app.middleware("http")(metrics.cache_metrics)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 app.include_router(health.router, prefix="/api")
 
-api_routers = (ingest.router, classify.router, clients.router, metrics.router, transcripts.router)
+api_routers = (ingest.router, classify.router, clients.router, metrics.router, pains.router, transcripts.router)
 for router in api_routers:
     app.include_router(router, prefix="/api")
 
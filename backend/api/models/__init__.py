@@ -1,5 +1,27 @@
 from .classification import Classification
+from .classification_cache import ClassificationCacheEntry
+from .classification_labels import ClassificationPain, ClassificationRisk
 from .client import Client
+from .ingest_run import IngestRun
+from .metric_rollup import MetricRollup
+from .metrics_generation import MetricsChange, MetricsGeneration
+from .pain import PainAlias, PainLabel
+from .reclassification import ReclassificationResult, ReclassificationRun
 from .transcript import Transcript
 
-__all__ = ["Client", "Transcript", "Classification"]
+__all__ = [
+    "Client",
+    "Transcript",
+    "Classification",
+    "IngestRun",
+    "ClassificationCacheEntry",
+    "ReclassificationRun",
+    "ReclassificationResult",
+    "PainLabel",
+    "PainAlias",
+    "ClassificationPain",
+    "ClassificationRisk",
+    "MetricRollup",
+    "MetricsGeneration",
+    "MetricsChange",
+]
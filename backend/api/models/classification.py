@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from sqlalchemy import Float, ForeignKey, Integer, JSON, String, Boolean
+from sqlalchemy import Float, ForeignKey, Index, Integer, JSON, String, Boolean
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from typing import TYPE_CHECKING
@@ -11,6 +11,20 @@ if TYPE_CHECKING: from .transcript import Transcript
 
 class Classification(Base):
     __tablename__ = "classifications"
+    # Covers the transcript join plus the metrics filter and GROUP BY columns.
+    __table_args__ = (
+        Index(
+            "ix_classifications_transcript_filters",
+            "transcript_id",
+            "use_case",
+            "origin",
+            "budget_tier",
+            "urgency",
+            "sentiment",
+            "automatization",
+            "fit_score",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     transcript_id: Mapped[int] = mapped_column(
@@ -24,11 +38,14 @@ class Classification(Base):
     buyer_role: Mapped[str | None] = mapped_column(String(50), nullable=True)
     use_case: Mapped[str | None] = mapped_column(String(120), nullable=True)
     pains: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
+    pain_ids: Mapped[list[int] | None] = mapped_column(JSON, nullable=True)
     risks: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
     automatization: Mapped[bool] = mapped_column(Boolean, nullable=True)
     origin: Mapped[str] = mapped_column(String(30), nullable=False)
     fit_score: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
     close_probability: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
     summary: Mapped[str] = mapped_column(String(120), nullable=False)
+    source: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    prompt_version: Mapped[str | None] = mapped_column(String(12), nullable=True)
 
     transcript: Mapped["Transcript"] = relationship("Transcript", back_populates="classification")
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base
+from .ingest_run import _utcnow
+
+
+class ClassificationCacheEntry(Base):
+    """LLM answer for one normalized transcript text, model and prompt version."""
+
+    __tablename__ = "classification_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(64), nullable=False)
+    prompt_version: Mapped[str] = mapped_column(String(16), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=_utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=_utcnow, index=True)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from sqlalchemy import ForeignKey, Index, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base
+
+
+class ClassificationPain(Base):
+    """One canonical pain of a classification, so pain metrics are GROUP BY queries over an index."""
+
+    __tablename__ = "classification_pains"
+    __table_args__ = (Index("ix_classification_pains_pain", "pain_id", "classification_id"),)
+
+    classification_id: Mapped[int] = mapped_column(
+        ForeignKey("classifications.id", ondelete="CASCADE"), primary_key=True
+    )
+    pain_id: Mapped[int] = mapped_column(ForeignKey("pain_labels.id"), primary_key=True)
+
+
+class ClassificationRisk(Base):
+    __tablename__ = "classification_risks"
+    __table_args__ = (Index("ix_classification_risks_risk", "risk", "classification_id"),)
+
+    classification_id: Mapped[int] = mapped_column(
+        ForeignKey("classifications.id", ondelete="CASCADE"), primary_key=True
+    )
+    risk: Mapped[str] = mapped_column(String(120), primary_key=True)
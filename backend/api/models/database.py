@@ -3,7 +3,7 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Generator
 
-from sqlalchemy import create_engine
+from sqlalchemy import bindparam, create_engine, inspect, select, text, update
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from ..settings import settings
@@ -52,10 +52,119 @@ class Base(DeclarativeBase):
     pass
 
 
+def _add_missing_columns() -> None:
+    """
+    `create_all` skips tables that already exist, so columns and indexes added
+    to the models later are created here. New columns must be nullable.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def _backfill_content_hashes(batch_size: int = 1000) -> None:
+    from .transcript import Transcript, content_hash
+
+    with engine.begin() as connection:
+        while True:
+            rows = connection.execute(
+                select(Transcript.id, Transcript.transcript)
+                .where(Transcript.content_hash.is_(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            connection.execute(
+                update(Transcript)
+                .where(Transcript.id == bindparam("row_id"))
+                .values(content_hash=bindparam("digest")),
+                [{"row_id": row_id, "digest": content_hash(body)} for row_id, body in rows],
+            )
+
+
+def _backfill_row_fingerprints(batch_size: int = 1000) -> None:
+    from .client import Client
+    from .transcript import Transcript, row_fingerprint
+
+    with engine.begin() as connection:
+        while True:
+            rows = connection.execute(
+                select(
+                    Transcript.id,
+                    Client.name,
+                    Client.email_hash,
+                    Client.phone_hash,
+                    Transcript.assigned_seller,
+                    Transcript.meeting_date,
+                    Transcript.closed,
+                    Transcript.content_hash,
+                )
+                .join(Client, Client.id == Transcript.client_id)
+                .where(Transcript.row_fingerprint.is_(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            connection.execute(
+                update(Transcript)
+                .where(Transcript.id == bindparam("row_id"))
+                .values(row_fingerprint=bindparam("fingerprint")),
+                [{"row_id": row_id, "fingerprint": row_fingerprint(*fields)} for row_id, *fields in rows],
+            )
+
+
+def _backfill_pain_ids() -> None:
+    from ..services.classification_labels import backfill_labels
+    from ..services.pain_canonical import backfill_pain_ids
+
+    db = SessionLocal()
+    try:
+        backfill_pain_ids(db)
+        backfill_labels(db)
+    finally:
+        db.close()
+
+
+def _ensure_rollups() -> None:
+    from ..services.rollups import ensure
+
+    db = SessionLocal()
+    try:
+        ensure(db)
+    finally:
+        db.close()
+
+
 def init_db() -> None:
-    from . import classification, client, transcript
+    from . import (
+        classification,
+        classification_cache,
+        classification_labels,
+        client,
+        ingest_run,
+        metric_rollup,
+        metrics_generation,
+        pain,
+        reclassification,
+        transcript,
+    )
 
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _backfill_content_hashes()
+    _backfill_row_fingerprints()
+    _backfill_pain_ids()
+    _ensure_rollups()
 
 
 def get_db() -> Generator[Session, None, None]:
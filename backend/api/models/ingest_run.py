@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class IngestRun(Base):
+    """Checkpoint of one ingested file, identified by the SHA-256 of its bytes."""
+
+    __tablename__ = "ingest_runs"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    filename: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="running")
+    committed_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    classified_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    inserted_clients: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    inserted_transcripts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    classified_transcripts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    errors: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=_utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=_utcnow, onupdate=_utcnow)
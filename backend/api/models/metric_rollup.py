@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base
+
+
+class MetricRollup(Base):
+    """
+    Pre-aggregated transcript counts per dashboard bucket. `bucket` is the
+    JSON-encoded key within `dimension` (e.g. `["2024-05"]` for a month or
+    `[3, "high"]` for an urgency/budget cell).
+    """
+
+    __tablename__ = "metric_rollups"
+
+    dimension: Mapped[str] = mapped_column(String(30), primary_key=True)
+    bucket: Mapped[str] = mapped_column(String(255), primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    closed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from sqlalchemy import JSON, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base
+
+
+class MetricsGeneration(Base):
+    """
+    Single row counting committed writes to the tables behind the metrics.
+    `token` is drawn when the row is created, so ETags from another database
+    (or a recreated one) never match.
+    """
+
+    __tablename__ = "metrics_generation"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    token: Mapped[str] = mapped_column(String(16), nullable=False)
+    generation: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class MetricsChange(Base):
+    """Transcripts changed by one generation, `NULL` when unknown; only the latest generations are kept."""
+
+    __tablename__ = "metrics_changes"
+
+    generation: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    transcript_ids: Mapped[list[int] | None] = mapped_column(JSON, nullable=True)
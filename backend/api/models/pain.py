@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import DateTime, Float, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base
+from .ingest_run import _utcnow
+
+
+class PainLabel(Base):
+    """Canonical pain category; `key` is its normalized form and merged labels point to their survivor."""
+
+    __tablename__ = "pain_labels"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    name: Mapped[str] = mapped_column(String(120), nullable=False)
+    key: Mapped[str] = mapped_column(String(120), nullable=False, index=True)
+    merged_into_id: Mapped[int | None] = mapped_column(ForeignKey("pain_labels.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=_utcnow)
+
+
+class PainAlias(Base):
+    """
+    Merge rule mapping a raw pain string written by the classifier to a
+    canonical label. `status` is `canonical` (the string that created the
+    label), `merged` (automatic), `suggested` (kept apart, with a candidate
+    waiting for review), `approved` or `rejected`.
+    """
+
+    __tablename__ = "pain_aliases"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    alias: Mapped[str] = mapped_column(String(120), nullable=False, unique=True)
+    label_id: Mapped[int] = mapped_column(ForeignKey("pain_labels.id"), nullable=False, index=True)
+    suggested_label_id: Mapped[int | None] = mapped_column(ForeignKey("pain_labels.id"), nullable=True)
+    score: Mapped[float] = mapped_column(Float, nullable=False, default=1.0)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=_utcnow)
+    reviewed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .database import Base
+from .ingest_run import _utcnow
+
+
+class ReclassificationRun(Base):
+    """
+    Campaign that reclassifies a selection of transcripts for one model and
+    prompt version, identified by the SHA-256 of the three.
+    """
+
+    __tablename__ = "reclassification_runs"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    model: Mapped[str] = mapped_column(String(64), nullable=False)
+    prompt_version: Mapped[str] = mapped_column(String(12), nullable=False)
+    selection: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="running")
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    processed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=_utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=_utcnow, onupdate=_utcnow)
+    swapped_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class ReclassificationResult(Base):
+    """Staged answer for one transcript of a campaign; `position` is its priority."""
+
+    __tablename__ = "reclassification_results"
+
+    run_id: Mapped[int] = mapped_column(
+        ForeignKey("reclassification_runs.id", ondelete="CASCADE"), primary_key=True
+    )
+    transcript_id: Mapped[int] = mapped_column(ForeignKey("transcripts.id", ondelete="CASCADE"), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, nullable=False)
+    source: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    payload: Mapped[dict | None] = mapped_column(JSON(none_as_null=True), nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
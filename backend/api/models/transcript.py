@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import unicodedata
 from datetime import datetime, timezone
+from hashlib import sha256
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 
 from typing import TYPE_CHECKING
 
@@ -13,8 +15,44 @@ if TYPE_CHECKING:
     from .client import Client
     from .classification import Classification
 
+def content_hash(text: str | None) -> str | None:
+    """SHA-256 of the transcript with Unicode and whitespace normalized, used for dedup."""
+    if text is None:
+        return None
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def row_fingerprint(
+    name: str,
+    email_hash: str | None,
+    phone_hash: str | None,
+    assigned_seller: str | None,
+    meeting_date: datetime | None,
+    closed: bool,
+    digest: str | None,
+) -> str:
+    """SHA-256 over the normalized client and transcript fields of one ingest row."""
+    parts = (
+        name,
+        email_hash or "",
+        phone_hash or "",
+        assigned_seller or "",
+        meeting_date.isoformat() if meeting_date else "",
+        "1" if closed else "0",
+        digest or "",
+    )
+    return sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
 class Transcript(Base):
     __tablename__ = "transcripts"
+    __table_args__ = (
+        Index("ix_transcripts_client_content_hash", "client_id", "content_hash"),
+        Index("ix_transcripts_row_fingerprint", "row_fingerprint"),
+        Index("ix_transcripts_meeting_date", "meeting_date"),
+        Index("ix_transcripts_seller_meeting_date", "assigned_seller", "meeting_date"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     client_id: Mapped[int] = mapped_column(ForeignKey("clients.id", ondelete="CASCADE"), nullable=False)
@@ -22,6 +60,8 @@ class Transcript(Base):
     meeting_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     closed: Mapped[bool] = mapped_column(Boolean, default=False)
     transcript: Mapped[str] = mapped_column(Text, nullable=False)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    row_fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
     classification: Mapped["Classification | None"] = relationship(
         "Classification",
@@ -31,6 +71,11 @@ class Transcript(Base):
     )
     client: Mapped["Client"] = relationship("Client", back_populates="transcripts")
 
+    @validates("transcript")
+    def _sync_content_hash(self, key: str, value: str) -> str:
+        self.content_hash = content_hash(value)
+        return value
+
     def touch_meeting_date(self) -> None:
         if self.meeting_date is None:
             self.meeting_date = datetime.now(timezone.utc)
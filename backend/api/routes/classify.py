@@ -1,15 +1,58 @@
 from __future__ import annotations
 
+import math
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from ..models.database import get_db
 from ..schemas.pipeline import ClassifyBatchRequest, ClassifyResponse
-from ..schemas.classification import ClassificationRead, ClassificationListResponse
+from ..schemas.classification import (
+    ClassificationCacheStats,
+    ClassificationListResponse,
+    ClassificationRead,
+    CompactionStats,
+    LLMHealth,
+    LocalClassifierStats,
+)
+from ..services.classification_cache import cache_stats
+from ..services.compaction import compaction_stats
+from ..services.llm_classifier import RateLimitExhaustedError
+from ..services.llm_health import CircuitOpenError, llm_health
+from ..services.local_classifier import local_stats
 from ..services.classify import classify_batch, classify_transcript, list_classifications
 
 router = APIRouter(prefix="/classify", tags=["classification"])
 
+RATE_LIMIT_RETRY_AFTER = 60
+
+
+@router.post("/batch", response_model=list[ClassifyResponse])
+async def classify_many(payload: ClassifyBatchRequest, db: Session = Depends(get_db)) -> list[ClassifyResponse]:
+    if not payload.transcript_ids:
+        raise HTTPException(status_code=400, detail="transcript_ids cannot be empty")
+    return await classify_batch(db, payload.transcript_ids)
+
+
+@router.get("/cache", response_model=ClassificationCacheStats)
+def read_cache_stats(db: Session = Depends(get_db)) -> ClassificationCacheStats:
+    return cache_stats(db)
+
+
+@router.get("/local", response_model=LocalClassifierStats)
+def read_local_stats() -> LocalClassifierStats:
+    return local_stats()
+
+
+@router.get("/compaction", response_model=CompactionStats)
+def read_compaction_stats() -> CompactionStats:
+    return compaction_stats()
+
+
+@router.get("/llm", response_model=LLMHealth)
+def read_llm_health() -> LLMHealth:
+    return llm_health()
+
 
 @router.post("/{transcript_id}", response_model=ClassifyResponse)
 def classify_single(transcript_id: int, db: Session = Depends(get_db)) -> ClassifyResponse:
@@ -17,14 +60,15 @@ def classify_single(transcript_id: int, db: Session = Depends(get_db)) -> Classi
         return classify_transcript(db, transcript_id)
     except ValueError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except CircuitOpenError as exc:
+        retry_after = max(1, math.ceil(exc.retry_in))
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": str(retry_after)}) from exc
+    except RateLimitExhaustedError as exc:
+        raise HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": str(RATE_LIMIT_RETRY_AFTER)}
+        ) from exc
 
 
-@router.post("/batch", response_model=list[ClassifyResponse])
-def classify_many(payload: ClassifyBatchRequest, db: Session = Depends(get_db)) -> list[ClassifyResponse]:
-    if not payload.transcript_ids:
-        raise HTTPException(status_code=400, detail="transcript_ids cannot be empty")
-    return classify_batch(db, payload.transcript_ids)
-
 @router.get("/", response_model=ClassificationListResponse)
 def read_classifications(
     skip: int = Query(0, ge=0),
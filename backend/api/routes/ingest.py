@@ -1,15 +1,88 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, File, UploadFile
+from typing import Literal
+
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from ..models.database import get_db
-from ..schemas.pipeline import CSVIngestResponse
-from ..services.pipeline import ingest_csv
+from ..schemas.pipeline import CSVIngestResponse, IngestJobStatus, IngestRunRead
+from ..services.ingest_jobs import create_job, get_job, run_job
+from ..services.ingest_runs import list_runs
+from ..services.pipeline import ingest_csv, ingest_files, ingest_upload
+from ..services.readers import iter_uploads_sources
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 
 
+@router.post("", response_model=CSVIngestResponse)
+async def ingest_any_format(
+    upload: UploadFile = File(...),
+    format: Literal["csv", "ndjson", "parquet", "arrow"] | None = Query(None),
+    resume: bool = Query(True, description="Continue from the last checkpoint of this same file"),
+    delta: bool = Query(False, description="Skip rows that are already stored unchanged, without writing them"),
+    db: Session = Depends(get_db),
+) -> CSVIngestResponse:
+    try:
+        return await ingest_upload(db, upload, fmt=format, resume=resume, delta=delta)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
 @router.post("/csv", response_model=CSVIngestResponse)
-async def ingest_clients(upload: UploadFile = File(...), db: Session = Depends(get_db)) -> CSVIngestResponse:
-    return await ingest_csv(db, upload)
+async def ingest_clients(
+    upload: UploadFile = File(...),
+    resume: bool = Query(True, description="Continue from the last checkpoint of this same file"),
+    delta: bool = Query(False, description="Skip rows that are already stored unchanged, without writing them"),
+    db: Session = Depends(get_db),
+) -> CSVIngestResponse:
+    return await ingest_csv(db, upload, resume=resume, delta=delta)
+
+
+@router.post("/files", response_model=CSVIngestResponse)
+async def ingest_many_files(
+    uploads: list[UploadFile] = File(...),
+    workers: int | None = Query(None, ge=1, le=32),
+    delta: bool = Query(False, description="Skip rows that are already stored unchanged, without writing them"),
+    db: Session = Depends(get_db),
+) -> CSVIngestResponse:
+    return await ingest_files(db, iter_uploads_sources(uploads), workers=workers, delta=delta)
+
+
+@router.post("/csv/jobs", response_model=IngestJobStatus, status_code=202)
+async def start_ingest_job(
+    background_tasks: BackgroundTasks,
+    upload: UploadFile = File(...),
+    resume: bool = Query(True, description="Continue from the last checkpoint of this same file"),
+) -> IngestJobStatus:
+    job, path = await create_job(upload)
+    background_tasks.add_task(run_job, job, path, resume)
+    return job.status
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobStatus)
+def read_ingest_job(job_id: str) -> IngestJobStatus:
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job.status
+
+
+@router.get("/jobs/{job_id}/events")
+def stream_ingest_job(job_id: str) -> StreamingResponse:
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return StreamingResponse(
+        job.events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/runs", response_model=list[IngestRunRead])
+def read_ingest_runs(
+    limit: int = Query(50, ge=1, le=200), db: Session = Depends(get_db)
+) -> list[IngestRunRead]:
+    return [IngestRunRead.model_validate(run, from_attributes=True) for run in list_runs(db, limit=limit)]
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from ..models.database import get_db
+from ..models.database import SessionLocal, get_db
 from ..schemas.metrics import (
     AvailablePains,
     AutomatizationOutcomeSeries,
     ConversionMetrics,
+    MetricsCacheStats,
+    MetricsDashboard,
+    MetricsFilters,
     MetricsFunnel,
     MetricsOverview,
     OriginDistribution,
+    PainConversionSeries,
     PainDistribution,
+    RiskDistribution,
     SellerConversionResponse,
     SentimentConversionSeries,
     UrgencyBudgetHeatmap,
@@ -19,11 +25,15 @@ from ..schemas.metrics import (
 )
 from ..services.metrics import (
     automatization_outcomes,
+    DASHBOARD_SECTIONS,
     conversion_metrics,
+    dashboard,
     funnel,
     list_pains,
     origin_distribution,
+    pain_conversion_breakdown,
     pain_distribution,
+    risk_distribution,
     seller_conversion_stats,
     overview,
     sentiment_conversion_breakdown,
@@ -31,66 +41,136 @@ from ..services.metrics import (
     use_case_distribution,
 )
 
+from ..services import metrics_cache
+
 router = APIRouter(prefix="/metrics", tags=["metrics"])
+CACHED_PREFIX = "/api/metrics/"
+UNCACHED_PATHS = {"/api/metrics/cache"}
+
+
+def _read_generation() -> tuple[str, int]:
+    db = SessionLocal()
+    try:
+        return metrics_cache.current(db)
+    finally:
+        db.close()
+
+
+async def cache_metrics(request: Request, call_next) -> Response:
+    """
+    Serve GET `/api/metrics/*` from the write-versioned cache: `304` when
+    the client's ETag matches the current data generation, the cached body
+    when this URL was computed in the current generation, or the computed
+    response (stored for next time) otherwise.
+    """
+    path = request.url.path
+    if request.method != "GET" or not path.startswith(CACHED_PREFIX) or path in UNCACHED_PATHS:
+        return await call_next(request)
+    token, generation = await run_in_threadpool(_read_generation)
+    etag = metrics_cache.etag(token, generation)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in {value.strip() for value in request.headers.get("if-none-match", "").split(",")}:
+        metrics_cache.cache.count("not_modified")
+        return Response(status_code=304, headers=headers)
+
+    key = f"{path}?{'&'.join(sorted(f'{name}={value}' for name, value in request.query_params.multi_items()))}"
+    body = metrics_cache.cache.get(key, generation)
+    if body is None:
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        metrics_cache.cache.put(key, generation, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/cache", response_model=MetricsCacheStats)
+def metrics_cache_stats(db: Session = Depends(get_db)) -> MetricsCacheStats:
+    return metrics_cache.stats(db)
+
+
+@router.get("/dashboard", response_model=MetricsDashboard)
+def metrics_dashboard(
+    sections: list[str] | None = Query(None, description=f"Subset of: {', '.join(DASHBOARD_SECTIONS)}"),
+    filters: MetricsFilters = Depends(),
+    db: Session = Depends(get_db),
+) -> MetricsDashboard:
+    try:
+        return dashboard(db, sections, filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.get("/overview", response_model=MetricsOverview)
-def metrics_overview(db: Session = Depends(get_db)) -> MetricsOverview:
-    return overview(db)
+def metrics_overview(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> MetricsOverview:
+    return overview(db, filters)
 
 
 @router.get("/funnel", response_model=MetricsFunnel)
-def metrics_funnel(db: Session = Depends(get_db)) -> MetricsFunnel:
-    return funnel(db)
+def metrics_funnel(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> MetricsFunnel:
+    return funnel(db, filters)
 
 
 @router.get("/conversions", response_model=ConversionMetrics)
-def metrics_conversions(db: Session = Depends(get_db)) -> ConversionMetrics:
-    return conversion_metrics(db)
+def metrics_conversions(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> ConversionMetrics:
+    return conversion_metrics(db, filters)
 
 
 @router.get("/urgency-budget", response_model=UrgencyBudgetHeatmap)
-def metrics_urgency_budget(db: Session = Depends(get_db)) -> UrgencyBudgetHeatmap:
-    return urgency_budget_heatmap(db)
+def metrics_urgency_budget(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> UrgencyBudgetHeatmap:
+    return urgency_budget_heatmap(db, filters)
 
 
 @router.get("/use-cases", response_model=UseCaseDistribution)
 def metrics_use_cases(
     status: str = Query("all", enum=["all", "closed", "open"]),
+    filters: MetricsFilters = Depends(),
     db: Session = Depends(get_db),
 ) -> UseCaseDistribution:
-    return use_case_distribution(db, status=status)
+    return use_case_distribution(db, status=status, filters=filters)
 
 
 @router.get("/pains", response_model=AvailablePains)
-def metrics_pains(db: Session = Depends(get_db)) -> AvailablePains:
-    return list_pains(db)
+def metrics_pains(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> AvailablePains:
+    return list_pains(db, filters)
 
 
 @router.get("/pains/distribution", response_model=PainDistribution)
-def metrics_pain_distribution(db: Session = Depends(get_db)) -> PainDistribution:
-    return pain_distribution(db)
+def metrics_pain_distribution(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> PainDistribution:
+    return pain_distribution(db, filters)
+
+
+@router.get("/pains/conversion", response_model=PainConversionSeries)
+def metrics_pain_conversion(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> PainConversionSeries:
+    return pain_conversion_breakdown(db, filters)
+
+
+@router.get("/risks/distribution", response_model=RiskDistribution)
+def metrics_risk_distribution(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> RiskDistribution:
+    return risk_distribution(db, filters)
 
 
 @router.get("/sentiment-conversion", response_model=SentimentConversionSeries)
 def metrics_sentiment_conversion(
+    filters: MetricsFilters = Depends(),
     db: Session = Depends(get_db),
 ) -> SentimentConversionSeries:
-    return sentiment_conversion_breakdown(db)
+    return sentiment_conversion_breakdown(db, filters)
 
 
 @router.get("/seller-conversion", response_model=SellerConversionResponse)
-def metrics_seller_conversion(db: Session = Depends(get_db)) -> SellerConversionResponse:
-    return seller_conversion_stats(db)
+def metrics_seller_conversion(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> SellerConversionResponse:
+    return seller_conversion_stats(db, filters)
 
 
 @router.get("/origins", response_model=OriginDistribution)
-def metrics_origins(db: Session = Depends(get_db)) -> OriginDistribution:
-    return origin_distribution(db)
+def metrics_origins(filters: MetricsFilters = Depends(), db: Session = Depends(get_db)) -> OriginDistribution:
+    return origin_distribution(db, filters)
 
 
 @router.get("/automatization-outcomes", response_model=AutomatizationOutcomeSeries)
 def metrics_automatization_outcomes(
+    filters: MetricsFilters = Depends(),
     db: Session = Depends(get_db),
 ) -> AutomatizationOutcomeSeries:
-    return automatization_outcomes(db)
+    return automatization_outcomes(db, filters)
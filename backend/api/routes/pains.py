@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ..models.database import get_db
+from ..schemas.classification import PainRule, PainRuleReview
+from ..services.pain_canonical import approve_rule, list_rules, reject_rule
+
+router = APIRouter(prefix="/pains", tags=["pains"])
+
+
+@router.get("/rules", response_model=list[PainRule])
+def read_rules(
+    status: str | None = Query(None, enum=["canonical", "merged", "suggested", "approved", "rejected"]),
+    db: Session = Depends(get_db),
+) -> list[PainRule]:
+    return list_rules(db, status)
+
+
+@router.post("/rules/{rule_id}/approve", response_model=PainRule)
+def approve(
+    rule_id: int, payload: PainRuleReview | None = Body(None), db: Session = Depends(get_db)
+) -> PainRule:
+    try:
+        return approve_rule(db, rule_id, payload.label_id if payload else None)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+@router.post("/rules/{rule_id}/reject", response_model=PainRule)
+def reject(rule_id: int, db: Session = Depends(get_db)) -> PainRule:
+    try:
+        return reject_rule(db, rule_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
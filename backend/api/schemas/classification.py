@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -17,6 +19,14 @@ class ClassificationBase(BaseModel):
     close_probability: float = Field(ge=0, le=1)
     summary: str = Field(default="")
 
+class PackedClassification(ClassificationBase):
+    id: str = Field(description="Id of the transcript inside the packed request")
+
+
+class PackedClassificationResponse(BaseModel):
+    items: list[PackedClassification]
+
+
 class ClassificationCreate(ClassificationBase):
     transcript_id: int
 
@@ -30,3 +40,62 @@ class ClassificationRead(ClassificationBase):
 class ClassificationListResponse(BaseModel):
     total: int
     items: list[ClassificationRead]
+
+
+class ClassificationCacheStats(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+    model: str
+    prompt_version: str
+
+
+class LocalClassifierStats(BaseModel):
+    enabled: bool
+    threshold: float
+    trained_on: int
+    predicted: int
+    escalated: int
+    llm_calls_avoided: float
+
+
+class CompactionStats(BaseModel):
+    budget: int
+    calls: int
+    compacted: int
+    original_tokens: int
+    sent_tokens: int
+    saved_ratio: float
+    mean_sent_tokens: float
+    mean_latency_ms: float
+    p95_latency_ms: float
+
+
+class LLMHealth(BaseModel):
+    concurrency_limit: int
+    concurrency_max: int
+    latency_ms: float
+    baseline_latency_ms: float
+    circuit_state: Literal["closed", "open", "half_open"]
+    consecutive_failures: int
+    retry_in_seconds: float
+    succeeded: int
+    rate_limited: int
+    failed: int
+    rejected: int
+
+
+class PainRule(BaseModel):
+    id: int
+    alias: str
+    label_id: int
+    label: str
+    suggested_label_id: int | None = None
+    suggested_label: str | None = None
+    score: float
+    status: Literal["canonical", "merged", "suggested", "approved", "rejected"]
+
+
+class PainRuleReview(BaseModel):
+    label_id: int | None = Field(default=None, description="Canonical label to map the alias to")
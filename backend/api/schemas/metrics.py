@@ -1,6 +1,33 @@
 from __future__ import annotations
 
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class MetricsFilters(BaseModel):
+    """Slice applied to every metrics query; unset fields do not filter."""
+
+    seller: str | None = Field(default=None, description="Assigned seller of the transcript")
+    date_range: Literal["all", "7d", "30d", "90d"] | None = Field(
+        default=None, description="Meetings within this range of the latest meeting"
+    )
+    date_from: datetime | None = Field(default=None, description="Meetings on or after this date")
+    date_to: datetime | None = Field(default=None, description="Meetings before this date")
+    closed: bool | None = None
+    use_case: str | None = None
+    origin: str | None = None
+    budget_tier: str | None = None
+    urgency: int | None = None
+    sentiment: int | None = None
+    automatization: bool | None = None
+    pain: str | None = Field(default=None, description="Canonical pain label")
+
+    def is_active(self) -> bool:
+        return any(
+            value is not None and value != "all" for value in self.model_dump().values()
+        )
 
 
 class MetricsOverview(BaseModel):
@@ -58,6 +85,27 @@ class PainDistribution(BaseModel):
     items: list[PainStat]
 
 
+class PainConversion(BaseModel):
+    pain: str
+    closed: int
+    open: int
+    total: int
+    conversion: float
+
+
+class PainConversionSeries(BaseModel):
+    items: list[PainConversion]
+
+
+class RiskStat(BaseModel):
+    risk: str
+    total: int
+
+
+class RiskDistribution(BaseModel):
+    items: list[RiskStat]
+
+
 class SentimentConversion(BaseModel):
     sentiment: int
     closed: int
@@ -100,3 +148,30 @@ class AutomatizationOutcome(BaseModel):
 
 class AutomatizationOutcomeSeries(BaseModel):
     items: list[AutomatizationOutcome]
+
+
+class MetricsDashboard(BaseModel):
+    """Every Metrics page widget; sections that were not requested are null."""
+
+    overview: MetricsOverview | None = None
+    funnel: MetricsFunnel | None = None
+    conversions: ConversionMetrics | None = None
+    urgency_budget: UrgencyBudgetHeatmap | None = None
+    use_cases: dict[str, UseCaseDistribution] | None = None
+    pains: PainDistribution | None = None
+    sentiment_conversion: SentimentConversionSeries | None = None
+    seller_conversion: SellerConversionResponse | None = None
+    origins: OriginDistribution | None = None
+    automatization_outcomes: AutomatizationOutcomeSeries | None = None
+
+
+class MetricsCacheStats(BaseModel):
+    generation: int
+    entries: int
+    bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    not_modified: int
+    evictions: int
+    hit_rate: float
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from datetime import datetime
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 from .classification import ClassificationRead
@@ -10,12 +13,44 @@ class CSVIngestResponse(BaseModel):
     inserted_clients: int
     inserted_transcripts: int
     classified_transcripts: int
+    errors: int = 0
+    skipped_rows: int = 0
+    new_rows: int = 0
+    changed_rows: int = 0
+    unchanged_rows: int = 0
+
+
+class IngestJobStatus(CSVIngestResponse):
+    job_id: str
+    filename: str | None = None
+    state: Literal["pending", "running", "completed", "failed"] = "pending"
+    last_error: str | None = None
+
+
+class IngestRunRead(BaseModel):
+    id: int
+    fingerprint: str
+    filename: str | None = None
+    status: str
+    committed_rows: int
+    classified_rows: int
+    inserted_clients: int
+    inserted_transcripts: int
+    classified_transcripts: int
+    errors: int
+    last_error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
 
 
 class ClassifyResponse(BaseModel):
     transcript_id: int
     created: bool
     classification: ClassificationRead | None = None
+    error: str | None = None
 
 
 class ClassifyBatchRequest(BaseModel):
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import NamedTuple, Sequence
+
+from sqlalchemy import and_, insert, or_, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models.client import Client
+from ..models.classification import Classification
+from ..models.transcript import Transcript, content_hash, row_fingerprint
+from ..schemas.client import ClientCreate
+from ..schemas.transcript import TranscriptCreate
+from . import rollups
+from .clients import _hash_identifier
+
+ClientKey = tuple[str, str | None]
+
+
+class PreparedRow(NamedTuple):
+    """One ingest row with every hash precomputed, ready for `bulk_upsert`."""
+
+    name: str
+    email_hash: str | None
+    phone_hash: str | None
+    transcript: dict[str, object]
+    content_hash: str | None
+    fingerprint: str
+
+
+def prepare_row(client_payload: ClientCreate, payload: TranscriptCreate) -> PreparedRow:
+    data = {field: value for field, value in payload.model_dump().items() if value is not None}
+    digest = content_hash(payload.transcript)
+    if digest is not None:
+        data["content_hash"] = digest
+    return build_prepared_row(
+        client_payload.name,
+        _hash_identifier(client_payload.email),
+        _hash_identifier(client_payload.phone),
+        data,
+    )
+
+
+def build_prepared_row(
+    name: str, email_hash: str | None, phone_hash: str | None, data: dict[str, object]
+) -> PreparedRow:
+    """Fingerprint the incoming row for the delta check; `data` holds the non-null transcript fields."""
+    fingerprint = row_fingerprint(
+        name,
+        email_hash,
+        phone_hash,
+        data.get("assigned_seller"),
+        data.get("meeting_date"),
+        bool(data.get("closed")),
+        data.get("content_hash"),
+    )
+    return PreparedRow(
+        name=name,
+        email_hash=email_hash,
+        phone_hash=phone_hash,
+        transcript=data,
+        content_hash=data.get("content_hash"),
+        fingerprint=fingerprint,
+    )
+
+
+def find_unchanged(db: Session, fingerprints: Sequence[str]) -> dict[str, tuple[int, bool]]:
+    """Map already stored row fingerprints to `(transcript_id, has_classification)` in one query."""
+    rows = db.execute(
+        select(Transcript.row_fingerprint, Transcript.id, Classification.id)
+        .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+        .where(Transcript.row_fingerprint.in_(set(fingerprints)))
+    ).all()
+    return {fingerprint: (transcript_id, classification_id is not None) for fingerprint, transcript_id, classification_id in rows}
+
+
+def _dialect_insert(db: Session):
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        return pg_insert
+    if name == "sqlite":
+        return sqlite_insert
+    return None
+
+
+def _resolve_clients(
+    db: Session, keys: dict[ClientKey, str | None]
+) -> tuple[dict[ClientKey, int], dict[int, str | None], int]:
+    """
+    Map each `(name, email_hash)` to a client id, inserting the missing ones
+    in bulk. Also returns the phone hash every client ends up with.
+    """
+    resolved: dict[ClientKey, int] = {}
+    phones: dict[int, str | None] = {}
+    if not keys:
+        return resolved, phones, 0
+
+    with_email = [key for key in keys if key[1] is not None]
+    without_email = [key[0] for key in keys if key[1] is None]
+    conditions = []
+    if with_email:
+        conditions.append(tuple_(Client.name, Client.email_hash).in_(with_email))
+    if without_email:
+        conditions.append(and_(Client.name.in_(without_email), Client.email_hash.is_(None)))
+    rows = db.execute(
+        select(Client.id, Client.name, Client.email_hash, Client.phone_hash).where(or_(*conditions))
+    ).all()
+    phone_updates = []
+    for client_id, name, email_hash, phone_hash in rows:
+        key = (name, email_hash)
+        if key in resolved or key not in keys:
+            continue
+        resolved[key] = client_id
+        new_phone = keys[key]
+        phones[client_id] = new_phone or phone_hash
+        if new_phone and new_phone != phone_hash:
+            phone_updates.append({"id": client_id, "phone_hash": new_phone})
+    if phone_updates:
+        db.execute(update(Client), phone_updates)
+
+    missing = [key for key in keys if key not in resolved]
+    if not missing:
+        return resolved, phones, 0
+    records = [{"name": name, "email_hash": email, "phone_hash": keys[(name, email)]} for name, email in missing]
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is None:
+        statement = insert(Client).returning(Client.id, sort_by_parameter_order=True)
+        for key, client_id in zip(missing, db.scalars(statement, records).all()):
+            resolved[key] = client_id
+            phones[client_id] = keys[key]
+        return resolved, phones, len(missing)
+
+    statement = (
+        dialect_insert(Client)
+        .on_conflict_do_nothing(index_elements=["name", "email_hash"])
+        .returning(Client.id, Client.name, Client.email_hash)
+    )
+    inserted = 0
+    for client_id, name, email in db.execute(statement, records).all():
+        resolved[(name, email)] = client_id
+        phones[client_id] = keys[(name, email)]
+        inserted += 1
+    # Rows skipped by ON CONFLICT were written concurrently; read their ids back.
+    for name, email in missing:
+        if (name, email) not in resolved:
+            client_id, phone_hash = db.execute(
+                select(Client.id, Client.phone_hash).where(Client.name == name, Client.email_hash == email)
+            ).one()
+            resolved[(name, email)] = client_id
+            phones[client_id] = phone_hash
+    return resolved, phones, inserted
+
+
+def _copy_transcripts(db: Session, records: list[dict[str, object]]) -> list[int]:
+    """Load new transcripts through Postgres `COPY`, pre-allocating ids from the sequence."""
+    ids = list(
+        db.scalars(
+            text("SELECT nextval(pg_get_serial_sequence('transcripts', 'id')) FROM generate_series(1, :total)"),
+            {"total": len(records)},
+        )
+    )
+    columns = ["id", *records[0].keys()]
+    cursor = db.connection().connection.driver_connection.cursor()
+    with cursor.copy(f"COPY transcripts ({', '.join(columns)}) FROM STDIN") as copy:
+        for transcript_id, record in zip(ids, records):
+            copy.write_row([transcript_id, *record.values()])
+    return ids
+
+
+def _insert_transcripts(db: Session, records: list[dict[str, object]]) -> list[int]:
+    if not records:
+        return []
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg":
+        return _copy_transcripts(db, records)
+    statement = insert(Transcript).returning(Transcript.id, sort_by_parameter_order=True)
+    return list(db.scalars(statement, records).all())
+
+
+def bulk_upsert(db: Session, rows: Sequence[PreparedRow]) -> tuple[list[int | None], int, int]:
+    """
+    Set-based equivalent of calling `upsert_transcript` for every row.
+
+    Clients and transcripts are resolved with one query each, written with
+    bulk statements and committed once. Returns the transcript id of every
+    row (None when the row has no transcript text and nothing to update),
+    plus the number of inserted clients and transcripts.
+    """
+    if not rows:
+        return [], 0, 0
+
+    row_keys: list[ClientKey | int] = []
+    client_keys: dict[ClientKey, str | None] = {}
+    anonymous: list[int] = []
+    for index, row in enumerate(rows):
+        key = (row.name, row.email_hash)
+        if row.email_hash is None and row.phone_hash is None:
+            anonymous.append(index)
+            row_keys.append(index)
+            continue
+        client_keys[key] = row.phone_hash or client_keys.get(key)
+        row_keys.append(key)
+
+    client_ids, phones, inserted_clients = _resolve_clients(db, client_keys)
+    identities = {
+        client_id: (name, email_hash, phones[client_id]) for (name, email_hash), client_id in client_ids.items()
+    }
+    if anonymous:
+        statement = insert(Client).returning(Client.id, sort_by_parameter_order=True)
+        records = [{"name": rows[index].name, "email_hash": None, "phone_hash": None} for index in anonymous]
+        for index, client_id in zip(anonymous, db.scalars(statement, records).all()):
+            client_ids[index] = client_id
+            identities[client_id] = (rows[index].name, None, None)
+        inserted_clients += len(anonymous)
+
+    row_client_ids = [client_ids[key] for key in row_keys]
+    meeting_dates = {row.transcript["meeting_date"] for row in rows if row.transcript.get("meeting_date")}
+    digests = {row.content_hash for row in rows if row.content_hash}
+    existing = db.execute(
+        select(
+            Transcript.id,
+            Transcript.client_id,
+            Transcript.meeting_date,
+            Transcript.content_hash,
+            Transcript.assigned_seller,
+            Transcript.closed,
+        ).where(
+            Transcript.client_id.in_(set(row_client_ids)),
+            or_(Transcript.meeting_date.in_(meeting_dates), Transcript.content_hash.in_(digests)),
+        )
+    ).all()
+    stored: dict[int, dict[str, object]] = {}
+    by_date: dict[tuple[int, datetime], int | str] = {}
+    by_hash: dict[tuple[int, str], int | str] = {}
+    for transcript_id, client_id, meeting_date, digest, seller, closed in existing:
+        stored[transcript_id] = {
+            "client_id": client_id,
+            "assigned_seller": seller,
+            "meeting_date": meeting_date,
+            "closed": closed,
+            "content_hash": digest,
+        }
+        if meeting_date is not None:
+            by_date.setdefault((client_id, meeting_date), transcript_id)
+        if digest is not None:
+            by_hash.setdefault((client_id, digest), transcript_id)
+
+    updates: dict[int, dict[str, object]] = {}
+    new_records: dict[str, dict[str, object]] = {}
+    row_targets: list[int | str | None] = []
+    for index, (row, client_id) in enumerate(zip(rows, row_client_ids)):
+        data = row.transcript
+        target = None
+        if data.get("meeting_date"):
+            target = by_date.get((client_id, data["meeting_date"]))
+        if target is None and row.content_hash is not None:
+            target = by_hash.get((client_id, row.content_hash))
+
+        if target is None:
+            if not data.get("transcript"):
+                row_targets.append(None)
+                continue
+            # Later rows of the same batch must match this pending insert.
+            target = f"new:{index}"
+            new_records[target] = {
+                "client_id": client_id,
+                "assigned_seller": None,
+                "meeting_date": None,
+                "closed": False,
+                "transcript": data["transcript"],
+                "content_hash": row.content_hash,
+            }
+        if isinstance(target, str):
+            new_records[target].update(data)
+        else:
+            updates.setdefault(target, {"id": target}).update(data)
+        record = new_records[target] if isinstance(target, str) else updates[target]
+        if record.get("meeting_date") is not None:
+            by_date[(client_id, record["meeting_date"])] = target
+        if record.get("content_hash"):
+            by_hash[(client_id, record["content_hash"])] = target
+        row_targets.append(target)
+
+    # Fingerprint the merged state, like `upsert_transcript` and the startup backfill.
+    for target, record in (*updates.items(), *new_records.items()):
+        merged = {**stored.get(target, {}), **record}
+        record["row_fingerprint"] = row_fingerprint(
+            *identities[merged["client_id"]],
+            merged.get("assigned_seller"),
+            merged.get("meeting_date"),
+            bool(merged.get("closed")),
+            merged.get("content_hash"),
+        )
+
+    before = rollups.snapshot(db, updates)
+    if updates:
+        db.execute(update(Transcript), list(updates.values()))
+    pending = list(new_records)
+    new_ids = dict(zip(pending, _insert_transcripts(db, [new_records[key] for key in pending])))
+    rollups.refresh(db, [*updates, *new_ids.values()], before)
+    rollups.add_clients(db, inserted_clients)
+    db.commit()
+
+    transcript_ids = [new_ids.get(target, target) if isinstance(target, str) else target for target in row_targets]
+    return transcript_ids, inserted_clients, len(new_ids)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..models.classification_cache import ClassificationCacheEntry
+from ..schemas.classification import ClassificationCacheStats
+from ..settings import settings
+from .llm_classifier import MODEL_NAME, PROMPT_VERSION
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0}
+
+
+def cache_key(digest: str) -> str:
+    """Key of a normalized transcript hash (`content_hash`) under the current model and prompt."""
+    return sha256(f"{digest}\x1f{MODEL_NAME}\x1f{PROMPT_VERSION}".encode("utf-8")).hexdigest()
+
+
+def _count(hits: int, misses: int) -> None:
+    with _lock:
+        _counters["hits"] += hits
+        _counters["misses"] += misses
+
+
+def lookup(db: Session, digests: Iterable[str]) -> dict[str, dict]:
+    """
+    Cached payloads for the given content hashes, in one query. Hit entries
+    are touched (hits, last_used_at) in the session; the caller commits.
+    """
+    keys = {cache_key(digest): digest for digest in set(digests)}
+    if not keys:
+        return {}
+    entries = db.scalars(select(ClassificationCacheEntry).where(ClassificationCacheEntry.key.in_(keys))).all()
+    now = datetime.now(timezone.utc)
+    payloads = {}
+    for entry in entries:
+        entry.hits += 1
+        entry.last_used_at = now
+        payloads[keys[entry.key]] = entry.payload
+    _count(len(payloads), len(keys) - len(payloads))
+    return payloads
+
+
+def store(db: Session, digest: str, payload: dict) -> None:
+    """Stage the LLM answer for `digest`; it is committed with the classification."""
+    db.merge(
+        ClassificationCacheEntry(
+            key=cache_key(digest), model=MODEL_NAME, prompt_version=PROMPT_VERSION, payload=payload, hits=0
+        )
+    )
+
+
+def store_many(db: Session, payloads: dict[str, dict]) -> None:
+    """Bulk `store`: one INSERT for new keys and one UPDATE for keys already cached."""
+    if not payloads:
+        return
+    keys = {cache_key(digest): payload for digest, payload in payloads.items()}
+    existing = set(db.scalars(select(ClassificationCacheEntry.key).where(ClassificationCacheEntry.key.in_(keys))))
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"key": key, "model": MODEL_NAME, "prompt_version": PROMPT_VERSION, "payload": payload, "last_used_at": now}
+        for key, payload in keys.items()
+    ]
+    new = [row for row in rows if row["key"] not in existing]
+    if new:
+        db.execute(insert(ClassificationCacheEntry), [{**row, "hits": 0, "created_at": now} for row in new])
+    if len(new) < len(rows):
+        db.execute(update(ClassificationCacheEntry), [row for row in rows if row["key"] in existing])
+
+
+def evict(db: Session) -> int:
+    """Drop entries unused for longer than the max age, then the least recently used above the max size."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.classification_cache_max_age_days)
+    removed = db.execute(
+        delete(ClassificationCacheEntry).where(ClassificationCacheEntry.last_used_at < cutoff)
+    ).rowcount
+    excess = (db.scalar(select(func.count()).select_from(ClassificationCacheEntry)) or 0) - (
+        settings.classification_cache_max_entries
+    )
+    if excess > 0:
+        oldest = select(ClassificationCacheEntry.key).order_by(ClassificationCacheEntry.last_used_at).limit(excess)
+        removed += db.execute(
+            delete(ClassificationCacheEntry).where(ClassificationCacheEntry.key.in_(oldest))
+        ).rowcount
+    db.commit()
+    return removed
+
+
+def cache_stats(db: Session) -> ClassificationCacheStats:
+    with _lock:
+        hits, misses = _counters["hits"], _counters["misses"]
+    return ClassificationCacheStats(
+        entries=db.scalar(select(func.count()).select_from(ClassificationCacheEntry)) or 0,
+        hits=hits,
+        misses=misses,
+        hit_rate=hits / (hits + misses) if hits + misses else 0.0,
+        model=MODEL_NAME,
+        prompt_version=PROMPT_VERSION,
+    )
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.orm import Session
+
+from ..models.classification import Classification
+from ..models.classification_labels import ClassificationPain, ClassificationRisk
+
+
+def _clean(labels: Iterable[str] | None) -> list[str]:
+    cleaned = (" ".join((label or "").split())[:120] for label in labels or ())
+    return list(dict.fromkeys(label for label in cleaned if label))
+
+
+def sync_pains(db: Session, pain_ids: dict[int, Iterable[int] | None]) -> None:
+    """Replace the `classification_pains` rows of each classification id; does not commit."""
+    if not pain_ids:
+        return
+    db.execute(delete(ClassificationPain).where(ClassificationPain.classification_id.in_(pain_ids)))
+    rows = [
+        {"classification_id": classification_id, "pain_id": pain_id}
+        for classification_id, ids in pain_ids.items()
+        for pain_id in dict.fromkeys(ids or ())
+    ]
+    if rows:
+        db.execute(insert(ClassificationPain), rows)
+
+
+def sync_risks(db: Session, risks: dict[int, Iterable[str] | None]) -> None:
+    """Replace the `classification_risks` rows of each classification id; does not commit."""
+    if not risks:
+        return
+    db.execute(delete(ClassificationRisk).where(ClassificationRisk.classification_id.in_(risks)))
+    rows = [
+        {"classification_id": classification_id, "risk": risk}
+        for classification_id, labels in risks.items()
+        for risk in _clean(labels)
+    ]
+    if rows:
+        db.execute(insert(ClassificationRisk), rows)
+
+
+def _backfill(db: Session, table, column, sync, batch_size: int) -> None:
+    last_id = 0
+    while rows := db.execute(
+        select(Classification.id, column)
+        .where(Classification.id > last_id, ~exists().where(table.classification_id == Classification.id))
+        .order_by(Classification.id)
+        .limit(batch_size)
+    ).all():
+        sync(db, {classification_id: labels for classification_id, labels in rows if labels})
+        db.commit()
+        last_id = rows[-1][0]
+
+
+def backfill_labels(db: Session, batch_size: int = 1000) -> None:
+    """Fill each child table from its JSON column for the classifications that have no rows in it yet."""
+    _backfill(db, ClassificationPain, Classification.pain_ids, sync_pains, batch_size)
+    _backfill(db, ClassificationRisk, Classification.risks, sync_risks, batch_size)
@@ -1,27 +1,38 @@
-from typing import Iterable
+from typing import AsyncIterator, Iterable
 
-from sqlalchemy import select, func
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from ..models.classification import Classification
-from ..models.transcript import Transcript
+from ..models.transcript import Transcript, content_hash
 from ..schemas.classification import ClassificationBase, ClassificationRead
 from ..schemas.pipeline import ClassifyResponse
+from . import classification_cache, classification_labels, local_classifier, pain_canonical, rollups
+from .pain_taxonomy import pain_taxonomy
 from .transcripts import get_transcript
-from .llm_classifier import call_api
+from .llm_classifier import PROMPT_VERSION, call_api, classify_concurrently
 
 def get_classification(transcript: Transcript):
     return getattr(transcript, "classification", None)
 
-def save_classification(db: Session, transcript_id: int, payload: ClassificationBase) -> Classification:
+def save_classification(
+    db: Session, transcript_id: int, payload: ClassificationBase, source: str | None = None
+) -> Classification:
     transcript = get_transcript(db, transcript_id)
     if not transcript:
         raise ValueError("Transcrito no encontrado para guardar la clasificación")
 
+    before = rollups.snapshot(db, [transcript_id])
     classification = db.scalar(
         select(Classification).where(Classification.transcript_id == transcript_id)
     )
     mapping = payload.model_dump()
+    mapping["source"] = source
+    mapping["prompt_version"] = PROMPT_VERSION if source == "llm" else None
+    mapping["pain_ids"] = pain_canonical.canonicalize(db, payload.pains)
     if classification:
         for field, value in mapping.items():
             setattr(classification, field, value)
@@ -29,8 +40,13 @@ def save_classification(db: Session, transcript_id: int, payload: Classification
         classification = Classification(transcript=transcript, **mapping)
         db.add(classification)
     transcript.classification = classification
+    db.flush()
+    classification_labels.sync_pains(db, {classification.id: mapping["pain_ids"]})
+    classification_labels.sync_risks(db, {classification.id: payload.risks})
+    rollups.refresh(db, [transcript_id], before)
     db.commit()
     db.refresh(classification)
+    pain_taxonomy.add(pain_canonical.label_names(db, classification.pain_ids))
     return classification
 
 def classify_transcript(db: Session, transcript_id: int) -> ClassifyResponse:
@@ -40,23 +56,235 @@ def classify_transcript(db: Session, transcript_id: int) -> ClassifyResponse:
     classification = get_classification(transcript)
     api_call = False
     if not classification:
-        api_call = True
-        classification_payload = call_api(transcript.transcript)
-        classification_payload = ClassificationBase.model_validate(classification_payload)
-        classification = save_classification(db, transcript.id, classification_payload)
+        digest = transcript.content_hash or content_hash(transcript.transcript)
+        cached = classification_cache.lookup(db, [digest]).get(digest)
+        if cached is not None:
+            classification = _save_payload(db, transcript.id, cached)
+        else:
+            local, _ = local_classifier.split_confident(db, [(digest, transcript.transcript)])
+            if digest in local:
+                classification = _save_payload(db, transcript.id, local[digest], source="local")
+            else:
+                api_call = True
+                classification = _save_payload(db, transcript.id, call_api(transcript.transcript), digest)
     classification_data = ClassificationRead.model_validate(classification, from_attributes=True)
     return ClassifyResponse(transcript_id=transcript.id, created=api_call, classification=classification_data)
 
 
-def classify_batch(db: Session, transcript_ids: Iterable[int]) -> list[ClassifyResponse]:
-    responses: list[ClassifyResponse] = []
+def pending_transcripts(db: Session, transcript_ids: Iterable[int]) -> dict[int, str]:
+    """Text of the given transcripts that have text and no classification yet."""
+    rows = db.execute(
+        select(Transcript.id, Transcript.transcript)
+        .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+        .where(Transcript.id.in_(set(transcript_ids)), Classification.id.is_(None), Transcript.transcript.is_not(None))
+    ).all()
+    return {transcript_id: text for transcript_id, text in rows}
+
+
+def _save_payload(
+    db: Session, transcript_id: int, payload: dict, digest: str | None = None, source: str = "llm"
+) -> Classification:
+    """Validate and save a payload, caching it under `digest` in the same commit."""
+    try:
+        validated = ClassificationBase.model_validate(payload)
+        if digest is not None:
+            classification_cache.store(db, digest, validated.model_dump())
+        return save_classification(db, transcript_id, validated, source=source)
+    except Exception:
+        db.rollback()
+        raise
+
+
+async def iter_payloads(
+    db: Session, transcripts: dict[int, str], concurrency: int | None = None, local: bool = True
+) -> AsyncIterator[tuple[int, dict | Exception, str, str | None]]:
+    """
+    Resolve a payload per transcript id without persisting anything, yielding
+    `(transcript_id, payload or error, source, digest_to_cache)`.
+
+    Texts already answered for the current model and prompt come from the
+    classification cache, texts the local pre-classifier is confident about
+    are answered with `source="local"` (unless `local` is False), and the
+    remaining distinct texts are sent once each, concurrently under the
+    Gemini rate limiter.
+    """
+    groups: dict[str, list[int]] = {}
+    for transcript_id, text in transcripts.items():
+        groups.setdefault(content_hash(text), []).append(transcript_id)
+
+    cached = await run_in_threadpool(classification_cache.lookup, db, groups)
+    for digest, payload in cached.items():
+        for transcript_id in groups.pop(digest):
+            yield transcript_id, payload, "llm", None
+
+    candidates = [(digest, transcripts[transcript_ids[0]]) for digest, transcript_ids in groups.items()]
+    confident, requests = {}, candidates
+    if local:
+        confident, requests = await run_in_threadpool(local_classifier.split_confident, db, candidates)
+    for digest, payload in confident.items():
+        for transcript_id in groups.pop(digest):
+            yield transcript_id, payload, "local", None
+
+    async for digest, outcome in classify_concurrently(requests, concurrency):
+        for index, transcript_id in enumerate(groups[digest]):
+            yield transcript_id, outcome, "llm", digest if index == 0 else None
+
+
+async def iter_classifications(
+    db: Session, transcripts: dict[int, str], concurrency: int | None = None
+) -> AsyncIterator[tuple[int, Classification | Exception]]:
+    """
+    Classify `transcripts` (cache, local tier, then LLM), persisting every
+    result as soon as it arrives and yielding it (or the error) per id.
+    """
+    asked_llm = False
+    async for transcript_id, outcome, source, digest in iter_payloads(db, transcripts, concurrency):
+        asked_llm = asked_llm or digest is not None
+        if isinstance(outcome, Exception):
+            yield transcript_id, outcome
+            continue
+        try:
+            yield transcript_id, await run_in_threadpool(_save_payload, db, transcript_id, outcome, digest, source)
+        except Exception as exc:
+            yield transcript_id, exc
+    if asked_llm:
+        await run_in_threadpool(classification_cache.evict, db)
+
+
+def save_classifications(
+    db: Session, results: dict[int, tuple[ClassificationBase, str]], existing: dict[int, int]
+) -> set[int]:
+    """
+    Persist many classifications in one transaction: one bulk INSERT for new
+    rows and one bulk UPDATE (by primary key) for the transcripts in
+    `existing` (transcript id -> classification id).
+
+    New rows are inserted with ON CONFLICT (transcript_id) DO NOTHING, so a
+    transcript classified concurrently keeps that classification instead of
+    failing the whole batch; their transcript ids are returned.
+    """
+    inserts, updates = [], []
+    before = rollups.snapshot(db, results)
+    for transcript_id, (payload, source) in results.items():
+        version = PROMPT_VERSION if source == "llm" else None
+        mapping = {**payload.model_dump(), "source": source, "prompt_version": version}
+        mapping["pain_ids"] = pain_canonical.canonicalize(db, payload.pains)
+        if transcript_id in existing:
+            updates.append({"id": existing[transcript_id], **mapping})
+        else:
+            inserts.append({"transcript_id": transcript_id, **mapping})
+    skipped: set[int] = set()
+    if inserts:
+        dialect_insert = {"postgresql": pg_insert, "sqlite": sqlite_insert}.get(db.get_bind().dialect.name)
+        statement = (
+            dialect_insert(Classification).on_conflict_do_nothing(index_elements=["transcript_id"])
+            if dialect_insert is not None
+            else insert(Classification)
+        )
+        created = db.execute(statement.returning(Classification.transcript_id, Classification.id), inserts)
+        ids = dict(created.all())
+        skipped = {row["transcript_id"] for row in inserts if row["transcript_id"] not in ids}
+        inserts = [row for row in inserts if row["transcript_id"] in ids]
+        for row in inserts:
+            row["id"] = ids[row["transcript_id"]]
+    if updates:
+        db.execute(update(Classification), updates)
+    rows = inserts + updates
+    classification_labels.sync_pains(db, {row["id"]: row["pain_ids"] for row in rows})
+    classification_labels.sync_risks(db, {row["id"]: row["risks"] for row in rows})
+    # The concurrent writer already moved the rollups for skipped transcripts.
+    written = [transcript_id for transcript_id in results if transcript_id not in skipped]
+    rollups.refresh(db, written, [row for row in before if row[0] not in skipped])
+    db.commit()
+    pain_taxonomy.add(
+        pain_canonical.label_names(db, sorted({label_id for row in rows for label_id in row["pain_ids"]}))
+    )
+    return skipped
+
+
+def _load_batch(db: Session, transcript_ids: list[int]) -> dict[int, tuple[str | None, Classification | None]]:
+    rows = db.execute(
+        select(Transcript.id, Transcript.transcript, Classification)
+        .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+        .where(Transcript.id.in_(transcript_ids))
+    ).all()
+    return {transcript_id: (text, classification) for transcript_id, text, classification in rows}
+
+
+def _load_classifications(db: Session, transcript_ids: Iterable[int]) -> dict[int, Classification]:
+    items = db.scalars(select(Classification).where(Classification.transcript_id.in_(set(transcript_ids)))).all()
+    return {classification.transcript_id: classification for classification in items}
+
+
+async def classify_batch(db: Session, transcript_ids: Iterable[int]) -> list[ClassifyResponse]:
+    """
+    Set-based classification of many transcripts.
+
+    Transcripts and their existing classifications are loaded with one
+    query, only the unclassified ones go through the cache, the local tier
+    and the LLM, and all new classifications (plus cache entries) are written
+    in a single transaction. Ids that are missing, have no text or fail to
+    classify are reported with `error` instead of being dropped.
+    """
+    transcript_ids = list(dict.fromkeys(transcript_ids))
+    loaded = await run_in_threadpool(_load_batch, db, transcript_ids)
+    errors: dict[int, str] = {}
+    pending: dict[int, str] = {}
     for transcript_id in transcript_ids:
+        if transcript_id not in loaded:
+            errors[transcript_id] = "Transcrito no encontrado"
+            continue
+        text, classification = loaded[transcript_id]
+        if classification is None and not text:
+            errors[transcript_id] = "Transcrito sin texto para clasificar"
+        elif classification is None:
+            pending[transcript_id] = text
+
+    results: dict[int, tuple[ClassificationBase, str]] = {}
+    to_cache: dict[str, dict] = {}
+    async for transcript_id, outcome, source, digest in iter_payloads(db, pending):
         try:
-            responses.append(classify_transcript(db, transcript_id))
-        except ValueError:
+            if isinstance(outcome, Exception):
+                raise outcome
+            payload = ClassificationBase.model_validate(outcome)
+        except Exception as exc:
+            errors[transcript_id] = str(exc) or exc.__class__.__name__
             continue
+        results[transcript_id] = (payload, source)
+        if digest is not None:
+            to_cache[digest] = payload.model_dump()
+
+    def persist() -> dict[int, Classification]:
+        try:
+            classification_cache.store_many(db, to_cache)
+            skipped = save_classifications(db, results, {})
+        except Exception:
+            db.rollback()
+            raise
+        for transcript_id in skipped:
+            del results[transcript_id]
+            errors[transcript_id] = "Transcrito clasificado por otra solicitud en paralelo; se conserva esa clasificación"
+        if to_cache:
+            classification_cache.evict(db)
+        return _load_classifications(db, transcript_ids)
+
+    stored = await run_in_threadpool(persist)
+    responses: list[ClassifyResponse] = []
+    for transcript_id in transcript_ids:
+        classification = stored.get(transcript_id)
+        responses.append(
+            ClassifyResponse(
+                transcript_id=transcript_id,
+                created=transcript_id in results,
+                classification=ClassificationRead.model_validate(classification, from_attributes=True)
+                if classification
+                else None,
+                error=errors.get(transcript_id),
+            )
+        )
     return responses
 
+
 def list_classifications(db: Session, skip: int = 0, limit: int = 50) -> tuple[list[Classification], int]:
     total = db.scalar(select(func.count()).select_from(Classification)) or 0
     items = list(db.scalars(select(Classification).offset(skip).limit(limit)).all())
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from ..models.client import Client
 from ..models.transcript import Transcript
 from ..schemas.client import ClientCreate, ClientFilters
+from . import metrics_cache, rollups
 
 
 def _hash_identifier(value: str | None) -> str | None:
@@ -32,11 +33,13 @@ def upsert_client(db: Session, payload: ClientCreate) -> tuple[Client, bool]:
     if client is None:
         client = Client(name=payload.name, email_hash=email_hash, phone_hash=phone_hash)
         db.add(client)
+        rollups.add_clients(db, 1)
         created = True
     else:
         # Keep stored hashes up to date if new info arrives
         client.email_hash = email_hash or client.email_hash
         client.phone_hash = phone_hash or client.phone_hash
+    metrics_cache.touch(db, ())
     db.commit()
     db.refresh(client)
     return client, created
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from typing import AsyncIterator, BinaryIO, Iterator
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..models.transcript import content_hash
+from .bulk import PreparedRow, build_prepared_row
+from .clients import _hash_identifier
+from .pipeline import COLUMN_ALIASES, DATE_FORMATS, DEFAULT_CLIENT_NAME, TRUE_VALUES
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+BATCH_ROWS = 10_000
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise ValueError("Para ingerir Parquet o Arrow instala las dependencias opcionales: pip install -e .[formats]")
+
+
+def iter_record_batches(handle: BinaryIO, fmt: str, batch_rows: int = BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    require_pyarrow()
+    if fmt == "parquet":
+        yield from pq.ParquetFile(handle).iter_batches(batch_size=batch_rows)
+        return
+    try:
+        reader = ipc.open_file(handle)
+    except pa.ArrowInvalid:
+        handle.seek(0)
+        yield from ipc.open_stream(handle)
+        return
+    for index in range(reader.num_record_batches):
+        yield reader.get_batch(index)
+
+
+def _columns(batch: pa.RecordBatch, field: str) -> Iterator[pa.Array]:
+    for alias in COLUMN_ALIASES[field]:
+        index = batch.schema.get_field_index(alias)
+        if index >= 0:
+            yield batch.column(index)
+
+
+def _trimmed(column: pa.Array) -> pa.Array:
+    """String view of a column with blanks turned into nulls, like `_value_from_row`."""
+    column = pc.utf8_trim_whitespace(pc.cast(column, pa.string()))
+    return pc.if_else(pc.equal(column, ""), pa.scalar(None, pa.string()), column)
+
+
+def _coalesce(arrays: list[pa.Array], length: int, type_: pa.DataType) -> pa.Array:
+    if not arrays:
+        return pa.nulls(length, type_)
+    return arrays[0] if len(arrays) == 1 else pc.coalesce(*arrays)
+
+
+def _text(batch: pa.RecordBatch, field: str) -> pa.Array:
+    return _coalesce([_trimmed(column) for column in _columns(batch, field)], batch.num_rows, pa.string())
+
+
+def _closed(batch: pa.RecordBatch) -> pa.Array:
+    values = []
+    for column in _columns(batch, "closed"):
+        if pa.types.is_boolean(column.type):
+            values.append(column)
+        elif pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+            values.append(pc.not_equal(column, 0))
+        else:
+            text = _trimmed(column)
+            parsed = pc.is_in(pc.utf8_lower(text), value_set=pa.array(TRUE_VALUES))
+            values.append(pc.if_else(pc.is_null(text), pa.scalar(None, pa.bool_()), parsed))
+    return pc.fill_null(_coalesce(values, batch.num_rows, pa.bool_()), False)
+
+
+def _meeting_dates(batch: pa.RecordBatch) -> pa.Array:
+    values = []
+    for column in _columns(batch, "meeting_date"):
+        if pa.types.is_timestamp(column.type) or pa.types.is_date(column.type):
+            if getattr(column.type, "tz", None):
+                column = pc.local_timestamp(column)
+            values.append(pc.cast(column, pa.timestamp("us")))
+            continue
+        text = _trimmed(column)
+        for fmt in DATE_FORMATS:
+            values.append(pc.strptime(text, format=fmt, unit="us", error_is_null=True))
+    return _coalesce(values, batch.num_rows, pa.timestamp("us"))
+
+
+def _hashes(values: list[str | None]) -> list[str | None]:
+    cache: dict[str, str | None] = {}
+    result = []
+    for value in values:
+        if value is not None and value not in cache:
+            cache[value] = _hash_identifier(value)
+        result.append(cache.get(value) if value is not None else None)
+    return result
+
+
+def prepare_batch(batch: pa.RecordBatch) -> list[PreparedRow]:
+    """Vectorized equivalent of `prepare_row(*_clean_row(row))` for a whole record batch."""
+    names = pc.fill_null(_text(batch, "name"), DEFAULT_CLIENT_NAME).to_pylist()
+    email_hashes = _hashes(pc.utf8_lower(_text(batch, "email")).to_pylist())
+    phone_hashes = _hashes(pc.utf8_lower(_text(batch, "phone")).to_pylist())
+    sellers = _text(batch, "assigned_seller").to_pylist()
+    dates = _meeting_dates(batch).to_pylist()
+    closed = _closed(batch).to_pylist()
+    transcripts = _text(batch, "transcript").to_pylist()
+
+    rows = []
+    for index, name in enumerate(names):
+        digest = content_hash(transcripts[index])
+        data = {
+            "assigned_seller": sellers[index],
+            "meeting_date": dates[index],
+            "closed": closed[index],
+            "transcript": transcripts[index],
+            "content_hash": digest,
+        }
+        rows.append(
+            build_prepared_row(
+                name,
+                email_hashes[index],
+                phone_hashes[index],
+                {field: value for field, value in data.items() if value is not None},
+            )
+        )
+    return rows
+
+
+async def iter_columnar_prepared(handle: BinaryIO, fmt: str, skip: int = 0) -> AsyncIterator[PreparedRow]:
+    """Read Parquet/Arrow record batches in the threadpool and yield prepared rows after `skip`."""
+    batches = iter_record_batches(handle, fmt)
+    while True:
+        batch = await run_in_threadpool(next, batches, None)
+        if batch is None:
+            return
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        if skip:
+            batch = batch.slice(skip)
+            skip = 0
+        for row in await run_in_threadpool(prepare_batch, batch):
+            yield row
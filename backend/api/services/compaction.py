@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import re
+import statistics
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Iterable
+
+from ..schemas.classification import CompactionStats
+from ..settings import settings
+from .text import fold
+
+CHARS_PER_TOKEN = 4
+COMPACTION_VERSION = "1"
+GAP = "[...]"
+HISTORY = 1000
+SENTENCE = re.compile(r"(?<=[.!?…])\s+")
+WORD = re.compile(r"[a-z0-9ñ]+")
+TIMESTAMP = re.compile(r"\[?\(?\b\d{1,2}:\d{2}(?::\d{2})?\b\)?\]?")
+FILLER = re.compile(r"(?<![\w])(?:e+h+|e+m+|m{2,}h*|a+h+|u+h+|o sea)(?![\w])[,.]?\s*", re.IGNORECASE)
+SPEAKER = re.compile(r"^[^\s:]{1,20}:\s*")
+BOILERPLATE = re.compile(
+    r"^(?:hola|buen[oa]s?(?: (?:dias|tardes|noches))?|(?:muchas )?gracias(?: por (?:la reunion|su tiempo|tu tiempo))?"
+    r"|perfecto|ok(?:ay)?|de acuerdo|claro|si|bueno|vale|entiendo|me escuchas|se escucha bien|un momento"
+    r"|adios|hasta luego|nos vemos)$"
+)
+STOPWORDS = frozenset(
+    "que de la el en los las por para con una uno del al se lo como mas pero sus nos nuestro nuestra nuestros "
+    "esta este estos estas muy ya tambien porque cuando donde sobre entre hemos tenemos hay ser son fue".split()
+)
+
+
+def text_tokens(text: str) -> int:
+    """Rough Gemini token count for `text` (~4 characters per token)."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _is_boilerplate(sentence: str) -> bool:
+    words = " ".join(WORD.findall(fold(SPEAKER.sub("", sentence))))
+    return not words or bool(BOILERPLATE.match(words))
+
+
+@dataclass
+class Compaction:
+    text: str
+    original_tokens: int
+    tokens: int
+    dropped_sentences: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+def _select(sentences: list[str], budget: int) -> tuple[list[str], int]:
+    """
+    Extractive summary (SumBasic): keep the first sentence, then repeatedly
+    take the sentence with the highest mean probability of its content words
+    (x1.5 if it has figures, which carry volumes and budgets), squaring the
+    probability of the words it covers so later picks add new information.
+    The chosen sentences are restored to their original order.
+    """
+    words = [
+        {word for word in WORD.findall(fold(sentence)) if len(word) > 2 and word not in STOPWORDS}
+        for sentence in sentences
+    ]
+    frequency = Counter(word for sentence in words for word in sentence)
+    total = sum(frequency.values()) or 1
+    probability = {word: count / total for word, count in frequency.items()}
+    costs = [text_tokens(sentence) + 1 for sentence in sentences]
+
+    def score(index: int) -> float:
+        value = sum(probability[word] for word in words[index]) / (len(words[index]) or 1)
+        return value * (1.5 if any(char.isdigit() for char in sentences[index]) else 1.0)
+
+    chosen = [0] if costs[0] <= budget else []
+    used = sum(costs[index] for index in chosen)
+    remaining = [index for index in range(1, len(sentences)) if used + costs[index] <= budget]
+    while remaining:
+        best = max(remaining, key=score)
+        chosen.append(best)
+        used += costs[best]
+        for word in words[best]:
+            probability[word] **= 2
+        remaining = [index for index in remaining if index != best and used + costs[index] <= budget]
+    chosen.sort()
+    parts: list[str] = []
+    for position, index in enumerate(chosen):
+        if position and index != chosen[position - 1] + 1:
+            parts.append(GAP)
+        parts.append(sentences[index])
+    return parts, len(sentences) - len(chosen)
+
+
+def compact(text: str, budget: int | None = None) -> Compaction:
+    """
+    Shrink a transcript before prompting: drop timestamps, fillers, greeting
+    or acknowledgement sentences and repeated sentences, then, if it is still
+    above `budget` estimated tokens (default `TRANSCRIPT_TOKEN_BUDGET`), keep
+    the best sentences that fit. A budget of 0 disables compaction.
+    """
+    budget = settings.transcript_token_budget if budget is None else budget
+    original = text_tokens(text)
+    if budget <= 0:
+        return Compaction(text, original, original)
+
+    cleaned = FILLER.sub("", TIMESTAMP.sub(" ", text))
+    sentences: list[str] = []
+    seen: set[str] = set()
+    dropped = 0
+    for sentence in SENTENCE.split(" ".join(cleaned.split())):
+        key = " ".join(WORD.findall(fold(SPEAKER.sub("", sentence))))
+        if _is_boilerplate(sentence) or key in seen:
+            dropped += 1
+            continue
+        seen.add(key)
+        sentences.append(sentence)
+    if not sentences:
+        return Compaction(text, original, original)
+
+    result = " ".join(sentences)
+    if text_tokens(result) > budget:
+        parts, removed = _select(sentences, budget)
+        dropped += removed
+        result = " ".join(parts) if parts else sentences[0][: budget * CHARS_PER_TOKEN].rstrip() + f" {GAP}"
+    return Compaction(result, original, text_tokens(result), dropped)
+
+
+_lock = threading.Lock()
+_history: deque[tuple[int, int, float]] = deque(maxlen=HISTORY)
+_totals = {"calls": 0, "compacted": 0, "original_tokens": 0, "sent_tokens": 0}
+
+
+def record_call(compactions: Iterable[Compaction], latency: float) -> None:
+    """Record one LLM request: the compactions of the transcripts it carried and its latency in seconds."""
+    compactions = list(compactions)
+    original = sum(item.original_tokens for item in compactions)
+    sent = sum(item.tokens for item in compactions)
+    with _lock:
+        _totals["calls"] += 1
+        _totals["compacted"] += sum(item.tokens < item.original_tokens for item in compactions)
+        _totals["original_tokens"] += original
+        _totals["sent_tokens"] += sent
+        _history.append((original, sent, latency))
+
+
+def compaction_stats() -> CompactionStats:
+    with _lock:
+        totals = dict(_totals)
+        history = list(_history)
+    latencies = sorted(latency for _, _, latency in history)
+    sent = [tokens for _, tokens, _ in history]
+    return CompactionStats(
+        budget=settings.transcript_token_budget,
+        calls=totals["calls"],
+        compacted=totals["compacted"],
+        original_tokens=totals["original_tokens"],
+        sent_tokens=totals["sent_tokens"],
+        saved_ratio=1 - totals["sent_tokens"] / totals["original_tokens"] if totals["original_tokens"] else 0.0,
+        mean_sent_tokens=statistics.fmean(sent) if sent else 0.0,
+        mean_latency_ms=statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        p95_latency_ms=latencies[int(0.95 * (len(latencies) - 1))] * 1000 if latencies else 0.0,
+    )
@@ -0,0 +1,443 @@
+"""
+In-process columnar snapshot of transcripts ⟕ classifications for
+cross-filtered dashboard reads.
+
+Each transcript is one row of NumPy arrays: categoricals are dictionary
+encoded (code 0 is `None`), meeting dates are `datetime64`, and pains are
+one bitmap per label over the rows. A filtered read builds a boolean mask
+and answers every bucket dimension with `bincount`, so re-slicing the
+dashboard costs a few vectorized passes instead of a GROUP BY per widget.
+
+The snapshot is loaded on the first filtered read and kept in step with the
+`metrics_cache` generation stored in the database, so writes from any
+process are seen: those logged in `metrics_changes` are patched in place,
+anything else (pain merges, manual edits, very large writes) reloads it.
+Loads run outside the lock and are swapped in when ready; filtered reads
+arriving meanwhile return None and are answered by SQL. Each worker process
+holds its own snapshot.
+"""
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Iterable, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models.classification import Classification
+from ..models.classification_labels import ClassificationPain
+from ..models.pain import PainLabel
+from ..models.transcript import Transcript
+from ..schemas.metrics import MetricsFilters
+from ..settings import settings
+from . import metrics_cache
+from .clients import RANGE_MAP
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+CHUNK_SIZE = 1000
+STAGES = ("discovery", "evaluation", "negotiation", "qualified")
+CATEGORICALS = ("seller", "urgency", "budget_tier", "use_case", "sentiment", "origin", "automatization")
+TRANSCRIPT_DIMENSIONS = ("stage", "seller", "month")
+CLASSIFICATION_COLUMNS = ("urgency", "budget_tier", "use_case", "sentiment", "origin", "automatization")
+DIMENSION_COLUMNS = {"urgency_budget": ("urgency", "budget_tier")}
+CUBE_LIMIT = 1 << 20
+
+_COLUMNS = (
+    Transcript.id,
+    Transcript.client_id,
+    Transcript.meeting_date,
+    Transcript.assigned_seller,
+    Transcript.closed,
+    Classification.id,
+    Classification.fit_score,
+    Classification.urgency,
+    Classification.budget_tier,
+    Classification.use_case,
+    Classification.sentiment,
+    Classification.origin,
+    Classification.automatization,
+)
+
+Rollups = dict[str, list[tuple[list, int, int]]]
+T = TypeVar("T")
+
+
+def available() -> bool:
+    return np is not None and settings.metrics_crossfilter
+
+
+def _naive(value: datetime | None) -> datetime | None:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class _Dictionary:
+    """Dense codes for the values of a categorical column; code 0 is `None`."""
+
+    def __init__(self) -> None:
+        self.values: list = [None]
+        self.codes: dict = {}
+
+    def encode(self, value) -> int:
+        if value is None:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value) -> int | None:
+        return 0 if value is None else self.codes.get(value)
+
+
+class Snapshot:
+    """Columns of every transcript, ordered by id, plus per-pain row bitmaps."""
+
+    def __init__(self, bind, generation: int) -> None:
+        self.bind = bind
+        self.generation = generation
+        self.dictionaries = {name: _Dictionary() for name in (*CATEGORICALS, "month")}
+        self.ids = np.zeros(0, np.int64)
+        self.live = np.zeros(0, bool)
+        self.client = np.zeros(0, np.int64)
+        self.meeting = np.zeros(0, "datetime64[us]")
+        self.closed = np.zeros(0, bool)
+        self.classified = np.zeros(0, bool)
+        self.stage = np.zeros(0, np.int8)
+        self.codes = {name: np.zeros(0, np.int32) for name in (*CATEGORICALS, "month")}
+        self.pain_rows: dict[int, int] = {}
+        self.pain_names: dict[int, str] = {}
+        self.bitmaps = np.zeros((0, 0), np.uint64)
+        self.latest = None
+        self.clients = 0
+        self._mask: tuple[str, object] | None = None
+        self._composites: dict[tuple[str, ...], object] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, db: Session, generation: int) -> "Snapshot":
+        snapshot = cls(db.get_bind(), generation)
+        last_id = 0
+        while rows := db.execute(
+            select(*_COLUMNS)
+            .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+            .where(Transcript.id > last_id)
+            .order_by(Transcript.id)
+            .limit(CHUNK_SIZE * 50)
+        ).all():
+            snapshot._append(snapshot._columns(rows))
+            last_id = rows[-1][0]
+        snapshot._set_pains(db, None)
+        snapshot._refresh_bounds()
+        return snapshot
+
+    def _columns(self, rows: list[tuple]) -> dict:
+        count = len(rows)
+        fields = list(zip(*rows)) if rows else [()] * len(_COLUMNS)
+        classified = np.fromiter((value is not None for value in fields[5]), bool, count)
+        columns = {
+            "ids": np.array(fields[0], np.int64),
+            "live": np.ones(count, bool),
+            "client": np.array(fields[1], np.int64),
+            "meeting": np.array([_naive(value) for value in fields[2]], "datetime64[us]"),
+            "closed": np.array(fields[4], bool),
+            "classified": classified,
+        }
+        fit = np.array([np.nan if value is None else value for value in fields[6]], np.float64)
+        stage = np.full(count, 3, np.int8)
+        stage[fit < 0.8] = 2
+        stage[fit < 0.6] = 1
+        stage[~classified] = 0
+        columns["stage"] = stage
+        for name, position in zip(CATEGORICALS, (3, 7, 8, 9, 10, 11, 12)):
+            encode = self.dictionaries[name].encode
+            lookup = {value: encode(value) for value in set(fields[position])}
+            columns[name] = np.fromiter(map(lookup.__getitem__, fields[position]), np.int32, count)
+        months, inverse = np.unique(columns["meeting"].astype("datetime64[M]"), return_inverse=True)
+        encode = self.dictionaries["month"].encode
+        lookup = np.array([0 if np.isnat(month) else encode(str(month)) for month in months], np.int32)
+        columns["month"] = lookup[inverse.reshape(-1)] if count else np.zeros(0, np.int32)
+        return columns
+
+    def _arrays(self) -> dict:
+        return {
+            "ids": self.ids,
+            "live": self.live,
+            "client": self.client,
+            "meeting": self.meeting,
+            "closed": self.closed,
+            "classified": self.classified,
+            "stage": self.stage,
+            **self.codes,
+        }
+
+    def _assign(self, arrays: dict) -> None:
+        for name in ("ids", "live", "client", "meeting", "closed", "classified", "stage"):
+            setattr(self, name, arrays[name])
+        self.codes = {name: arrays[name] for name in (*CATEGORICALS, "month")}
+        self._mask = None
+        self._composites = {}
+
+    def _append(self, columns: dict) -> None:
+        self._assign({name: np.concatenate([array, columns[name]]) for name, array in self._arrays().items()})
+
+    def _refresh_bounds(self) -> None:
+        self.clients = int(self.client.max()) + 1 if len(self) else 0
+        dates = self.meeting[self.live & ~np.isnat(self.meeting)]
+        self.latest = dates.max() if len(dates) else None
+
+    def _set_pains(self, db: Session, transcript_ids: list[int] | None) -> None:
+        """(Re)write the pain bits of the given transcripts' rows, or of every row when `None`."""
+        self.pain_names = dict(db.execute(select(PainLabel.id, PainLabel.name)).all())
+        words = (len(self) + 63) // 64
+        for pain_id in self.pain_names:
+            self.pain_rows.setdefault(pain_id, len(self.pain_rows))
+        grown = np.zeros((len(self.pain_rows), words), np.uint64)
+        grown[: self.bitmaps.shape[0], : self.bitmaps.shape[1]] = self.bitmaps
+        self.bitmaps = grown
+
+        query = select(Classification.transcript_id, ClassificationPain.pain_id).join(
+            Classification, Classification.id == ClassificationPain.classification_id
+        )
+        if transcript_ids is None:
+            pairs = db.execute(query).all()
+        else:
+            rows = self._positions(np.array(transcript_ids, np.int64))
+            rows = rows[rows >= 0]
+            clear = np.zeros(words, np.uint64)
+            np.bitwise_or.at(clear, rows >> 6, np.left_shift(np.uint64(1), (rows & 63).astype(np.uint64)))
+            self.bitmaps &= ~clear
+            pairs = []
+            for start in range(0, len(transcript_ids), CHUNK_SIZE):
+                chunk = transcript_ids[start : start + CHUNK_SIZE]
+                pairs += db.execute(query.where(Classification.transcript_id.in_(chunk))).all()
+        if not pairs:
+            return
+        rows = self._positions(np.fromiter((pair[0] for pair in pairs), np.int64, len(pairs)))
+        pains = np.fromiter((self.pain_rows[pair[1]] for pair in pairs), np.int64, len(pairs))
+        keep = rows >= 0
+        rows, pains = rows[keep], pains[keep]
+        np.bitwise_or.at(self.bitmaps, (pains, rows >> 6), np.left_shift(np.uint64(1), (rows & 63).astype(np.uint64)))
+
+    def _positions(self, transcript_ids):
+        """Row of each transcript id, -1 when it is not in the snapshot."""
+        positions = np.searchsorted(self.ids, transcript_ids)
+        found = positions < len(self)
+        found[found] = self.ids[positions[found]] == transcript_ids[found]
+        return np.where(found, positions, -1)
+
+    def update(self, db: Session, transcript_ids: Iterable[int]) -> bool:
+        """Patch the rows of the given transcripts; `False` when only a reload can place them."""
+        transcript_ids = sorted(set(transcript_ids))
+        rows = []
+        for start in range(0, len(transcript_ids), CHUNK_SIZE):
+            rows += db.execute(
+                select(*_COLUMNS)
+                .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+                .where(Transcript.id.in_(transcript_ids[start : start + CHUNK_SIZE]))
+                .order_by(Transcript.id)
+            ).all()
+        columns = self._columns(rows)
+        positions = self._positions(columns["ids"])
+        new = positions < 0
+        if new.any() and len(self) and columns["ids"][new].min() < self.ids[-1]:
+            return False
+        existing = positions[~new]
+        for name, array in self._arrays().items():
+            array[existing] = columns[name][~new]
+        missing = np.setdiff1d(np.array(transcript_ids, np.int64), columns["ids"])
+        gone = self._positions(missing)
+        self.live[gone[gone >= 0]] = False
+        if new.any():
+            self._append({name: column[new] for name, column in columns.items()})
+        self._set_pains(db, transcript_ids)
+        self._refresh_bounds()
+        self._mask = None
+        self._composites = {}
+        return True
+
+    def mask(self, filters: MetricsFilters):
+        """Boolean row mask of `filters`; the last one is kept, since a dashboard asks for it twice."""
+        key = filters.model_dump_json()
+        if self._mask is not None and self._mask[0] == key:
+            return self._mask[1]
+        mask = self.live.copy()
+        if filters.seller:
+            mask &= self._equals("seller", filters.seller)
+        if filters.date_range in RANGE_MAP and self.latest is not None:
+            mask &= self.meeting >= self.latest - np.timedelta64(RANGE_MAP[filters.date_range])
+        if filters.date_from is not None:
+            mask &= self.meeting >= np.datetime64(_naive(filters.date_from), "us")
+        if filters.date_to is not None:
+            mask &= self.meeting < np.datetime64(_naive(filters.date_to), "us")
+        if filters.closed is not None:
+            mask &= self.closed == filters.closed
+        for name in CATEGORICALS[1:]:
+            value = getattr(filters, name)
+            if value is not None:
+                mask &= self.classified & self._equals(name, value)
+        if filters.pain:
+            bitmap = np.zeros(self.bitmaps.shape[1], np.uint64)
+            for pain_id, name in self.pain_names.items():
+                if name == filters.pain:
+                    bitmap |= self.bitmaps[self.pain_rows[pain_id]]
+            mask &= np.unpackbits(bitmap.view(np.uint8), count=len(self), bitorder="little").astype(bool)
+        self._mask = (key, mask)
+        return mask
+
+    def _equals(self, name: str, value):
+        code = self.dictionaries[name].code(value)
+        if code is None:
+            return np.zeros(len(self), bool)
+        return self.codes[name] == code
+
+    def _values(self, name: str) -> list:
+        if name == "classified":
+            return [False, True]
+        return list(STAGES) if name == "stage" else self.dictionaries[name].values
+
+    def _column(self, name: str):
+        return getattr(self, name) if name in ("classified", "stage") else self.codes[name]
+
+    def _keys(self, names: tuple[str, ...]):
+        """Per-row mixed-radix key of `names` with `closed` as the last digit, built once per data generation."""
+        keys = self._composites.get(names)
+        if keys is None:
+            keys = np.zeros(len(self), np.int64)
+            for name in names:
+                keys *= len(self._values(name))
+                keys += self._column(name)
+            keys = (keys * 2 + self.closed).astype(np.int32)
+            self._composites[names] = keys
+        return keys
+
+    def _table(self, names: tuple[str, ...], rows):
+        """`(*codes, closed)` counts of `names` over `rows`, from one gather and one `bincount`."""
+        shape = tuple(len(self._values(name)) for name in names) + (2,)
+        return np.bincount(self._keys(names)[rows], minlength=int(np.prod(shape))).reshape(shape)
+
+    def aggregate(self, dimensions: Iterable[str], filters: MetricsFilters) -> Rollups:
+        rows = np.flatnonzero(self.mask(filters))
+        tables: dict[tuple[str, ...], object] = {}
+        result: Rollups = {}
+        for dimension in dimensions:
+            if dimension == "clients":
+                seen = np.zeros(self.clients, bool)
+                seen[self.client[rows]] = True
+                total = int(np.count_nonzero(seen))
+                result[dimension] = [([], total, 0)] if total else []
+                continue
+            names = DIMENSION_COLUMNS.get(dimension, (dimension,))
+            classified = dimension not in TRANSCRIPT_DIMENSIONS
+            group = ("classified", *CLASSIFICATION_COLUMNS) if classified else TRANSCRIPT_DIMENSIONS
+            if np.prod([len(self._values(name)) for name in group], dtype=np.float64) > CUBE_LIMIT:
+                group = ("classified", *names) if classified else names
+            if group not in tables:
+                tables[group] = self._table(group, rows)
+            table = tables[group][1] if classified else tables[group]
+            axes = group[1:] if classified else group
+            marginal = table.sum(axis=tuple(axis for axis, name in enumerate(axes) if name not in names))
+            totals = marginal.sum(axis=-1)
+            found = np.nonzero(totals)
+            values = [self._values(name) for name in names]
+            result[dimension] = [
+                ([values[axis][code] for axis, code in enumerate(index)], total, closed)
+                for index, total, closed in zip(
+                    np.transpose(found).tolist(), totals[found].tolist(), marginal[..., 1][found].tolist()
+                )
+                if dimension != "month" or index != [0]
+            ]
+        return result
+
+    def pain_counts(self, filters: MetricsFilters) -> list[tuple[str, int]]:
+        """`(name, rows)` per pain label among the filtered rows, most frequent first."""
+        packed = np.zeros(self.bitmaps.shape[1] * 8, np.uint8)
+        bits = np.packbits(self.mask(filters), bitorder="little")
+        packed[: len(bits)] = bits
+        selected = self.bitmaps & packed.view(np.uint64)
+        if hasattr(np, "bitwise_count"):
+            counts = np.bitwise_count(selected).sum(axis=1, dtype=np.int64)
+        else:  # pragma: no cover - NumPy < 2.0
+            counts = np.unpackbits(selected.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+        items = [
+            (self.pain_names[pain_id], int(counts[row]))
+            for pain_id, row in self.pain_rows.items()
+            if pain_id in self.pain_names and counts[row]
+        ]
+        items.sort(key=lambda item: (-item[1], item[0]))
+        return items
+
+
+_snapshot: Snapshot | None = None
+_loading = False
+_lock = threading.Lock()
+
+
+def _fresh(db: Session, generation: int) -> Snapshot | None:
+    """The snapshot patched up to `generation`, or None when it must be (re)loaded; call under `_lock`."""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or snapshot.bind is not db.get_bind():
+        return None
+    if snapshot.generation >= generation:
+        return snapshot
+    changed = metrics_cache.changes_since(db, snapshot.generation, generation)
+    if changed is None:
+        return None
+    try:
+        patched = snapshot.update(db, changed)
+    except Exception:
+        _snapshot = None
+        raise
+    if not patched:
+        return None
+    snapshot.generation = generation
+    return snapshot
+
+
+def _read(db: Session, read: Callable[[Snapshot], T]) -> T | None:
+    """`read(snapshot)` at the current generation; None while another request is loading the snapshot."""
+    global _snapshot, _loading
+    generation = metrics_cache.generation(db)
+    with _lock:
+        snapshot = _fresh(db, generation)
+        if snapshot is not None:
+            return read(snapshot)
+        if _loading:
+            return None
+        _loading = True
+    try:
+        snapshot = Snapshot.load(db, generation)
+    finally:
+        with _lock:
+            _loading = False
+    with _lock:
+        current = _snapshot
+        if current is None or current.bind is not snapshot.bind or current.generation < snapshot.generation:
+            _snapshot = snapshot
+        return read(snapshot)
+
+
+def aggregate(db: Session, dimensions: Iterable[str], filters: MetricsFilters) -> Rollups | None:
+    """Rollup buckets of the filtered rows, in the shape of `rollups.read`; None while the snapshot loads."""
+    dimensions = tuple(dimensions)
+    return _read(db, lambda snapshot: snapshot.aggregate(dimensions, filters))
+
+
+def pain_counts(db: Session, filters: MetricsFilters) -> list[tuple[str, int]] | None:
+    return _read(db, lambda snapshot: snapshot.pain_counts(filters))
+
+
+def reset() -> None:
+    global _snapshot
+    with _lock:
+        _snapshot = None
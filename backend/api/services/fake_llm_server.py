@@ -0,0 +1,145 @@
+"""
+Local stand-in for Gemini used to load-test classification offline.
+
+    llm-fake --port 8765 --latency 0.8 --rpm 15 --error-rate 0.02
+
+Answers POST /generate with a deterministic, schema-valid classification
+(one item per `TRANSCRITO id=N` for packed prompts) after a configurable
+latency. Requests above the per-minute quota, or picked by `--error-rate`,
+get a 429 like Gemini's RESOURCE_EXHAUSTED. GET /stats returns counters.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .rate_limit import TokenBucket
+
+PACKED_ID = re.compile(r"TRANSCRITO id=(\d+):")
+ORIGINS = ("Eventos", "Conocidos", "Web", "Contacto directo")
+USE_CASES = ("Venta productos", "Servicios", "Tecnología", "Alimentos", "Salud")
+PAINS = ("Alto volumen de consultas", "Respuestas lentas", "Procesos manuales", "Falta de integración")
+
+
+def fake_classification(seed: str) -> dict:
+    rng = random.Random(sha256(seed.encode("utf-8")).digest())
+    return {
+        "sentiment": rng.randint(-2, 2),
+        "urgency": rng.randint(0, 3),
+        "budget_tier": rng.choice(("Low", "Medium", "High", None)),
+        "buyer_role": rng.choice(("Decisor", "Influenciador", "Usuario", None)),
+        "use_case": rng.choice(USE_CASES),
+        "pains": rng.sample(PAINS, rng.randint(0, 2)),
+        "risks": [],
+        "origin": rng.choice(ORIGINS),
+        "automatization": rng.random() < 0.5,
+        "fit_score": round(rng.random(), 2),
+        "close_probability": round(rng.random(), 2),
+        "summary": "Respuesta simulada",
+    }
+
+
+def fake_response(prompt: str, schema: dict) -> dict:
+    if "items" in (schema.get("properties") or {}):
+        items = [{"id": item_id, **fake_classification(f"{prompt}:{item_id}")} for item_id in PACKED_ID.findall(prompt)]
+        return {"items": items}
+    return fake_classification(prompt)
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        latency: float = 0.5,
+        jitter: float = 0.2,
+        rpm: int = 0,
+        error_rate: float = 0.0,
+    ) -> None:
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.quota = TokenBucket(rpm) if rpm > 0 else None
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.stats = {"served": 0, "rate_limited": 0}
+
+    def count(self, field: str) -> None:
+        with self.lock:
+            self.stats[field] += 1
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeLLMServer
+
+    def _send(self, status: int, body: dict | str) -> None:
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if self.path != "/stats":
+            self._send(404, {"detail": "Not found"})
+            return
+        with self.server.lock:
+            self._send(200, dict(self.server.stats))
+
+    def do_POST(self) -> None:
+        if self.path != "/generate":
+            self._send(404, {"detail": "Not found"})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        server = self.server
+        over_quota = server.quota is not None and not server.quota.try_take()
+        if over_quota or random.random() < server.error_rate:
+            server.count("rate_limited")
+            self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}})
+            return
+        time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+        server.count("served")
+        self._send(200, json.dumps(fake_response(request["prompt"], request.get("schema") or {})))
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - BaseHTTPRequestHandler signature
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, **options) -> FakeLLMServer:
+    """Start the server on a background thread (port 0 picks a free port)."""
+    server = FakeLLMServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds per answer")
+    parser.add_argument("--jitter", type=float, default=0.2, help="standard deviation of the latency")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before answering 429 (0 = no quota)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of random 429 answers")
+    args = parser.parse_args()
+    server = FakeLLMServer(
+        (args.host, args.port), latency=args.latency, jitter=args.jitter, rpm=args.rpm, error_rate=args.error_rate
+    )
+    print(f"Fake LLM escuchando en {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,11 @@
-from google import genai
+from functools import lru_cache
+
 from ..settings import settings
 
-client = genai.Client(api_key=settings.google_api_key)
\ No newline at end of file
+
+@lru_cache(maxsize=1)
+def get_client():
+    """Gemini client, created on first use so importing the app needs no API key."""
+    from google import genai
+
+    return genai.Client(api_key=settings.google_api_key)
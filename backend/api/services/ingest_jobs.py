@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+from collections import OrderedDict
+from hashlib import sha256
+from pathlib import Path
+from typing import AsyncIterator
+from uuid import uuid4
+
+from fastapi import UploadFile
+
+from ..models.database import SessionLocal
+from ..schemas.pipeline import CSVIngestResponse, IngestJobStatus
+from .ingest_runs import start_run
+from .pipeline import ingest_rows
+from .readers import CHUNK_SIZE, FileSource, iter_csv_rows
+
+MAX_TRACKED_JOBS = 50
+HEARTBEAT_SECONDS = 15.0
+
+_jobs: OrderedDict[str, "IngestJob"] = OrderedDict()
+
+
+class IngestJob:
+    """In-process ingest job whose progress can be awaited from the event loop."""
+
+    def __init__(self, filename: str | None, fingerprint: str) -> None:
+        self.fingerprint = fingerprint
+        self.status = IngestJobStatus(
+            job_id=uuid4().hex,
+            filename=filename,
+            processed_rows=0,
+            inserted_clients=0,
+            inserted_transcripts=0,
+            classified_transcripts=0,
+        )
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+
+    @property
+    def id(self) -> str:
+        return self.status.job_id
+
+    @property
+    def finished(self) -> bool:
+        return self.status.state in {"completed", "failed"}
+
+    def update(self, progress: CSVIngestResponse | None = None, **changes: object) -> None:
+        """Publish new counters or state; safe to call from worker threads."""
+        data = progress.model_dump() if progress is not None else {}
+        data.update(changes)
+        self.status = self.status.model_copy(update=data)
+        self._loop.call_soon_threadsafe(self._notify)
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def events(self) -> AsyncIterator[str]:
+        """Server-Sent Events stream: one `progress` event per change until the job ends."""
+        while True:
+            changed, status = self._changed, self.status
+            yield f"event: progress\ndata: {status.model_dump_json()}\n\n"
+            if status.state in {"completed", "failed"}:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                continue
+
+
+def get_job(job_id: str) -> IngestJob | None:
+    return _jobs.get(job_id)
+
+
+def _register(job: IngestJob) -> None:
+    _jobs[job.id] = job
+    while len(_jobs) > MAX_TRACKED_JOBS:
+        oldest = next((key for key, item in _jobs.items() if item.finished), None)
+        if oldest is None:
+            break
+        del _jobs[oldest]
+
+
+async def create_job(upload: UploadFile) -> tuple[IngestJob, Path]:
+    """Spool the upload to disk (it is closed once the request ends) and register a job."""
+    fd, name = tempfile.mkstemp(prefix="ingest-", suffix=".csv")
+    digest = sha256()
+    with os.fdopen(fd, "wb") as handle:
+        while chunk := await upload.read(CHUNK_SIZE):
+            digest.update(chunk)
+            handle.write(chunk)
+    job = IngestJob(upload.filename, digest.hexdigest())
+    _register(job)
+    return job, Path(name)
+
+
+async def run_job(job: IngestJob, path: Path, resume: bool = True) -> None:
+    db = SessionLocal()
+    job.update(state="running")
+    try:
+        run = start_run(db, job.fingerprint, job.status.filename, resume=resume)
+        with path.open("rb") as handle:
+            result = await ingest_rows(
+                db,
+                iter_csv_rows(FileSource(handle)),
+                run=run,
+                on_progress=job.update,
+                on_error=lambda transcript_id, exc: job.update(
+                    last_error=f"Transcrito {transcript_id}: {exc}"
+                ),
+            )
+        job.update(result, state="completed")
+    except Exception as exc:
+        job.update(state="failed", last_error=str(exc))
+    finally:
+        db.close()
+        path.unlink(missing_ok=True)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from hashlib import sha256
+
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models.ingest_run import IngestRun
+from .readers import CHUNK_SIZE
+
+
+async def fingerprint_upload(upload: UploadFile) -> str:
+    """SHA-256 of the uploaded bytes; rewinds the upload so it can be read again."""
+    digest = sha256()
+    while chunk := await upload.read(CHUNK_SIZE):
+        digest.update(chunk)
+    await upload.seek(0)
+    return digest.hexdigest()
+
+
+def start_run(db: Session, fingerprint: str, filename: str | None, resume: bool = True) -> IngestRun:
+    """
+    Return the run for this file, creating it or resetting it when `resume`
+    is False. A resumed run that had classification errors restarts from the
+    first row with status `retrying`: the pipeline then replays it in delta
+    mode, so rows already stored are not rewritten and only the ones still
+    unclassified go back to the classifier.
+    """
+    run = db.scalar(select(IngestRun).where(IngestRun.fingerprint == fingerprint))
+    status = "running"
+    if run is None:
+        run = IngestRun(fingerprint=fingerprint)
+        db.add(run)
+    elif resume and run.errors:
+        run.committed_rows = run.classified_rows = run.errors = 0
+        run.last_error = None
+        status = "retrying"
+    elif not resume:
+        for field in (
+            "committed_rows",
+            "classified_rows",
+            "inserted_clients",
+            "inserted_transcripts",
+            "classified_transcripts",
+            "errors",
+        ):
+            setattr(run, field, 0)
+        run.last_error = None
+    run.filename = filename or run.filename
+    run.status = status
+    db.commit()
+    db.refresh(run)
+    return run
+
+
+def list_runs(db: Session, limit: int = 50) -> list[IngestRun]:
+    return list(db.scalars(select(IngestRun).order_by(IngestRun.updated_at.desc()).limit(limit)).all())
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import urllib.error
+import urllib.request
+from functools import lru_cache
+from hashlib import sha256
+from pathlib import Path
+from typing import Protocol
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..settings import settings
+from .genai_client import get_client
+
+DEFAULT_CASSETTE_DIR = Path(__file__).resolve().parents[2] / "data" / "cassettes"
+
+
+class RateLimitError(RuntimeError):
+    """HTTP 429 from a non-Gemini backend, recognized by the classifier's retry loop."""
+
+    def __init__(self, message: str = "429 RESOURCE_EXHAUSTED") -> None:
+        super().__init__(message)
+
+
+class LLMBackend(Protocol):
+    """Returns the raw JSON text the model produced for `prompt` under `schema`."""
+
+    def generate(self, model: str, prompt: str, schema: dict) -> str: ...
+
+    async def agenerate(self, model: str, prompt: str, schema: dict) -> str: ...
+
+
+def _config(schema: dict) -> dict:
+    return {"response_mime_type": "application/json", "response_json_schema": schema}
+
+
+def _extract_text(response) -> str:
+    if text := getattr(response, "text", None):
+        return text
+    candidates = getattr(response, "candidates", None) or []
+    if candidates:
+        return getattr(candidates[0], "content", "") or ""
+    return ""
+
+
+class GeminiBackend:
+    def generate(self, model: str, prompt: str, schema: dict) -> str:
+        return _extract_text(get_client().models.generate_content(model=model, contents=prompt, config=_config(schema)))
+
+    async def agenerate(self, model: str, prompt: str, schema: dict) -> str:
+        response = await get_client().aio.models.generate_content(model=model, contents=prompt, config=_config(schema))
+        return _extract_text(response)
+
+
+class FakeServerBackend:
+    """Client for `api.services.fake_llm_server`, a local stand-in for Gemini."""
+
+    def __init__(self, url: str, timeout: float = 60.0) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def generate(self, model: str, prompt: str, schema: dict) -> str:
+        body = json.dumps({"model": model, "prompt": prompt, "schema": schema}).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.url}/generate", data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read().decode("utf-8")
+        except urllib.error.HTTPError as exc:
+            if exc.code == 429:
+                raise RateLimitError() from exc
+            raise
+
+    async def agenerate(self, model: str, prompt: str, schema: dict) -> str:
+        return await run_in_threadpool(self.generate, model, prompt, schema)
+
+
+class CassetteBackend:
+    """
+    Record/replay wrapper keyed by the SHA-256 of model, prompt and schema.
+
+    In `record` mode answers missing from the cassette directory are fetched
+    from `inner` and saved, one JSON file per key; in `replay` mode a missing
+    answer is an error, so runs never reach the network.
+    """
+
+    def __init__(self, inner: LLMBackend | None, directory: str | Path, mode: str = "replay") -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Modo de cassette desconocido: {mode}")
+        self.inner = inner
+        self.directory = Path(directory)
+        self.mode = mode
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(model: str, prompt: str, schema: dict) -> str:
+        payload = json.dumps([model, prompt, schema], sort_keys=True, ensure_ascii=False)
+        return sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, model: str, prompt: str, schema: dict) -> Path:
+        return self.directory / f"{self.key(model, prompt, schema)}.json"
+
+    def _replay(self, path: Path) -> str | None:
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))["response"]
+        if self.mode == "replay":
+            raise LookupError(f"No hay respuesta grabada para este prompt ({path.stem})")
+        return None
+
+    def _record(self, path: Path, model: str, text: str) -> str:
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps({"model": model, "response": text}, ensure_ascii=False), encoding="utf-8")
+        temporary.replace(path)
+        return text
+
+    def generate(self, model: str, prompt: str, schema: dict) -> str:
+        path = self._path(model, prompt, schema)
+        cached = self._replay(path)
+        if cached is not None:
+            return cached
+        return self._record(path, model, self.inner.generate(model, prompt, schema))
+
+    async def agenerate(self, model: str, prompt: str, schema: dict) -> str:
+        path = self._path(model, prompt, schema)
+        cached = await run_in_threadpool(self._replay, path)
+        if cached is not None:
+            return cached
+        text = await self.inner.agenerate(model, prompt, schema)
+        return await run_in_threadpool(self._record, path, model, text)
+
+
+def build_backend(name: str, cassette_dir: str | None = None, cassette_mode: str = "replay") -> LLMBackend:
+    """`gemini`, `fake` (local server) or `replay` (cassette only); a cassette dir wraps the first two."""
+    if name == "replay":
+        return CassetteBackend(None, cassette_dir or DEFAULT_CASSETTE_DIR, mode="replay")
+    if name == "gemini":
+        backend: LLMBackend = GeminiBackend()
+    elif name == "fake":
+        backend = FakeServerBackend(settings.llm_fake_url)
+    else:
+        raise ValueError(f"Backend de LLM desconocido: {name}. Usa gemini, fake o replay")
+    if cassette_dir:
+        return CassetteBackend(backend, cassette_dir, mode=cassette_mode)
+    return backend
+
+
+@lru_cache(maxsize=1)
+def get_backend() -> LLMBackend:
+    """Backend selected by `LLM_BACKEND`, optionally wrapped by the `LLM_CASSETTE_DIR` cassette."""
+    return build_backend(settings.llm_backend, settings.llm_cassette_dir, settings.llm_cassette_mode)
@@ -1,13 +1,30 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import time
+from hashlib import sha256
+from typing import AsyncIterator, Hashable, Iterable, Iterator
 
-from .genai_client import client
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 
-from ..schemas.classification import ClassificationBase
-from ..models.database import SessionLocal
-from .metrics import list_pains
+from .compaction import COMPACTION_VERSION, Compaction, compact, record_call, text_tokens
+from .llm_backends import get_backend
+from .llm_health import (
+    AdaptiveGate,
+    CircuitOpenError,
+    count,
+    get_breaker,
+    get_controller,
+    is_rate_limit_error,
+    is_unavailable_error,
+)
+from .rate_limit import backoff_delay, get_rate_limiter
+
+from ..schemas.classification import ClassificationBase, PackedClassificationResponse
+from ..settings import settings
+from .pain_taxonomy import pain_taxonomy
 
 SYSTEM_PROMPT = (
     """Eres un analista experto en ventas B2B. Recibirás el transcrito de una reunión comercial y deberás evaluar al cliente usando criterios cuantitativos y cualitativos. Tu salida debe ser un JSON estricto y válido. Si no hay información suficiente en el transcrito, devuelve null o [] según corresponda en los campos donde se permita.
@@ -19,17 +36,7 @@ SYSTEM_PROMPT = (
         - Sé crítico al determinar el "sentiment", el "origin" del lead y si requiere "automatization"."""
 )
 
-USER_PROMPT = (
-    """Analiza el siguiente transcrito y genera una clasificación completa.
-
-                TRANSCRITO:
-                ""
-                {TRANSCRITO_AQUI}
-                ""
-
-                Devuelve exclusivamente un JSON con el siguiente esquema:
-
-                {
+RESPONSE_SCHEMA = """{
                 "sentiment": integer (-2 a 2),
                 "urgency": integer (0 a 3),
                 "budget_tier": "Low" | "Medium" | "High" | null,
@@ -51,72 +58,292 @@ USER_PROMPT = (
                 - "automatization" debe ser true cuando el cliente menciona explicitamente que requiere automatizar flujos de trabajo, y false en caso contrario.
                 - "summary" debe ser breve, no más de 80 caracteres
                 - "pains" representa categorías de dolores encontrados. Debes elegir entre las categorías [{LISTA_DOLORES_AQUI}] y solo si quedan dolores sin listar crear una nueva categoría de máximo 4 palabras."""
+
+USER_PROMPT = (
+    """Analiza el transcrito que aparece al final y genera una clasificación completa.
+
+                Devuelve exclusivamente un JSON con el siguiente esquema:
+
+                """
+    + RESPONSE_SCHEMA
+    + """
+
+                TRANSCRITO:
+                ""
+                {TRANSCRITO_AQUI}
+                ""
+                """
 )
 
+PACKED_PROMPT = (
+    """Analiza por separado cada transcrito que aparece al final, identificado por su id, y genera una clasificación completa para cada uno. No mezcles información entre transcritos.
+
+                Devuelve exclusivamente un JSON {"items": [...]} con un elemento por transcrito. Cada elemento lleva el "id" del transcrito y los campos del siguiente esquema:
+
+                """
+    + RESPONSE_SCHEMA
+    + """
+"""
+)
+PACKED_ITEM = """
+                TRANSCRITO id={id}:
+                ""
+                {text}
+                ""
+"""
+# Everything before the transcript is shared by every call, which lets the
+# provider reuse its cached context for the common prefix.
+USER_PROMPT_HEAD, USER_PROMPT_TAIL = USER_PROMPT.split("{TRANSCRITO_AQUI}")
+
 MODEL_NAME = "gemini-2.5-flash-lite"
+# Bumps automatically whenever the prompt templates change, invalidating cached answers.
+PROMPT_VERSION = sha256(
+    f"{SYSTEM_PROMPT}\x1f{USER_PROMPT}\x1f{PACKED_PROMPT}"
+    f"\x1f{COMPACTION_VERSION}:{settings.transcript_token_budget}".encode("utf-8")
+).hexdigest()[:12]
+MAX_ATTEMPTS = 5
+RESPONSE_TOKENS = 400
+RATE_LIMIT_MESSAGE = f"Se alcanzó el límite de solicitudes por minuto de Gemini tras {MAX_ATTEMPTS} intentos"
+
+
+class RateLimitExhaustedError(RuntimeError):
+    """Still rate limited after `MAX_ATTEMPTS` tries."""
+
+    def __init__(self) -> None:
+        super().__init__(RATE_LIMIT_MESSAGE)
+
+
+def _render_prefix(pains: list[str]) -> str:
+    pains_text = ", ".join(pains) if pains else "Sin pains registrados"
+    return f"{SYSTEM_PROMPT}\n\n{USER_PROMPT_HEAD.replace('{LISTA_DOLORES_AQUI}', pains_text)}"
+
+
+def prompt_prefix() -> str:
+    """System prompt plus instructions and pain list, rebuilt only when the taxonomy changes."""
+    return pain_taxonomy.prefix(_render_prefix)
 
 
 def build_prompt(transcript: str) -> str:
-    db = SessionLocal()
-    try:
-        pains_data = list_pains(db)
-    finally:
-        db.close()
-
-    pains_list = getattr(pains_data, "pains", []) or []
-    pains_text = ", ".join(pains_list) if pains_list else "Sin pains registrados"
-
-    prompt = USER_PROMPT.replace("{TRANSCRITO_AQUI}", transcript)
-    prompt = prompt.replace("{LISTA_DOLORES_AQUI}", pains_text)
-    return prompt
-
-
-def _extract_text(response) -> str:
-    if text := getattr(response, "text", None):
-        return text
-    candidates = getattr(response, "candidates", None) or []
-    if candidates:
-        return getattr(candidates[0], "content", "") or ""
-    return ""
-
-
-def _is_rate_limit_error(exc: Exception) -> bool:
-    text = str(exc)
-    code = getattr(exc, "code", None)
-    name = exc.__class__.__name__
-    indicators = (
-        "ResourceExhausted",
-        "TooManyRequests",
-        "RESOURCE_EXHAUSTED",
-        "TOO_MANY_REQUESTS",
+    return f"{prompt_prefix()}{transcript}{USER_PROMPT_TAIL}"
+
+
+def _render_packed_prefix(pains: list[str]) -> str:
+    pains_text = ", ".join(pains) if pains else "Sin pains registrados"
+    return f"{SYSTEM_PROMPT}\n\n{PACKED_PROMPT.replace('{LISTA_DOLORES_AQUI}', pains_text)}"
+
+
+def packed_prompt_prefix() -> str:
+    return pain_taxonomy.prefix(_render_packed_prefix)
+
+
+def build_packed_prompt(transcripts: list[str]) -> str:
+    """One prompt for several transcripts, identified by their position (1-based) as `id`."""
+    items = "".join(
+        PACKED_ITEM.replace("{id}", str(index)).replace("{text}", text)
+        for index, text in enumerate(transcripts, start=1)
     )
-    return any(indicator in part for part in (text, str(code), name) for indicator in indicators)
+    return packed_prompt_prefix() + items
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Rough Gemini token count (~4 characters per token) plus the expected JSON answer."""
+    return text_tokens(prompt) + RESPONSE_TOKENS
+
+
+def _parse_response(raw: str) -> dict:
+    raw = raw.strip()
+    if not raw:
+        raise RuntimeError("La respuesta de Gemini no contenía texto")
+    return json.loads(raw)
+
+
+def _admit() -> None:
+    try:
+        get_breaker().before_call()
+    except CircuitOpenError:
+        count("rejected")
+        raise
+
+
+def _on_success(latency: float) -> None:
+    get_breaker().on_success()
+    get_controller().on_success(latency)
+    count("succeeded")
+
+
+def _on_error(exc: Exception, attempt: int) -> float:
+    """
+    Feed a failed request to the AIMD controller and the circuit breaker.
+    Returns the backoff before retrying 429s and transient outages, or
+    re-raises when the error is final.
+    """
+    breaker = get_breaker()
+    if is_rate_limit_error(exc):
+        count("rate_limited")
+        get_controller().on_rate_limited()
+        if attempt >= MAX_ATTEMPTS:
+            breaker.on_failure()
+            raise RateLimitExhaustedError() from exc
+        breaker.release()
+        return backoff_delay(attempt)
+    count("failed")
+    if not is_unavailable_error(exc):
+        breaker.release()
+        raise exc
+    breaker.on_failure()
+    if attempt >= MAX_ATTEMPTS or breaker.state != "closed":
+        raise exc
+    return backoff_delay(attempt)
 
 
 def call_api(transcript: str):
-    prompt = f"{SYSTEM_PROMPT}\n\n{build_prompt(transcript)}"
-    attempts = 0
-    max_attempts = 3
-    wait_seconds = 60
-    while True:
+    compacted = compact(transcript)
+    prompt = build_prompt(compacted.text)
+    limiter = get_rate_limiter()
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        _admit()
+        limiter.acquire_blocking(estimate_tokens(prompt))
+        started = time.perf_counter()
+        try:
+            raw = get_backend().generate(MODEL_NAME, prompt, ClassificationBase.model_json_schema())
+        except Exception as exc:
+            time.sleep(_on_error(exc, attempt))
+            continue
+        latency = time.perf_counter() - started
+        _on_success(latency)
+        record_call([compacted], latency)
+        return _parse_response(raw)
+
+
+async def _generate_async(prompt: str, schema: dict, tokens: int, compactions: list[Compaction]) -> dict:
+    """
+    One rate-limited generate_content call. 429s and transient outages are
+    retried with jittered backoff; while the circuit is open it fails fast
+    with `CircuitOpenError`.
+    """
+    limiter = get_rate_limiter()
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        _admit()
+        await limiter.acquire(tokens)
+        started = time.perf_counter()
         try:
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents= prompt,
-                config={
-                    "response_mime_type": "application/json",
-                    "response_json_schema": ClassificationBase.model_json_schema(),
-                },
-            )
-            raw = _extract_text(response).strip()
-            if not raw:
-                raise RuntimeError("La respuesta de Gemini no contenía texto")
-            return json.loads(raw)
+            raw = await get_backend().agenerate(MODEL_NAME, prompt, schema)
         except Exception as exc:
-            if not _is_rate_limit_error(exc):
-                raise
-            attempts += 1
-            if attempts >= max_attempts:
-                raise RuntimeError("Se alcanzó el límite de 15 solicitudes por minuto de Gemini") from exc
-            print(f"Se alcanzó el límite ({attempts}/{max_attempts}); esperando {wait_seconds}s...")
-            time.sleep(wait_seconds)
+            await asyncio.sleep(_on_error(exc, attempt))
+            continue
+        latency = time.perf_counter() - started
+        _on_success(latency)
+        record_call(compactions, latency)
+        return _parse_response(raw)
+
+
+async def call_api_async(transcript: str) -> dict:
+    """Non-blocking `call_api`: waits on the shared rate limiter and retries 429s with jittered backoff."""
+    compacted = await run_in_threadpool(compact, transcript)
+    prompt = build_prompt(compacted.text)
+    return await _generate_async(
+        prompt, ClassificationBase.model_json_schema(), estimate_tokens(prompt), [compacted]
+    )
+
+
+async def call_api_packed_async(transcripts: list[str]) -> list[dict | Exception]:
+    """
+    Classify several transcripts with a single request. Returns one entry per
+    transcript, in order: the validated payload, or the exception explaining
+    why that item was missing or invalid.
+    """
+    compacted = await run_in_threadpool(lambda: [compact(text) for text in transcripts])
+    prompt = build_packed_prompt([item.text for item in compacted])
+    tokens = text_tokens(prompt) + RESPONSE_TOKENS * len(transcripts)
+    raw = await _generate_async(prompt, PackedClassificationResponse.model_json_schema(), tokens, compacted)
+    items = raw.get("items") if isinstance(raw, dict) else None
+    by_id = {str(item.get("id")): item for item in items or [] if isinstance(item, dict)}
+    results: list[dict | Exception] = []
+    for index in range(1, len(transcripts) + 1):
+        item = by_id.get(str(index))
+        if item is None:
+            results.append(ValueError(f"La respuesta agrupada no incluyó el transcrito {index}"))
+            continue
+        try:
+            results.append(ClassificationBase.model_validate(item).model_dump())
+        except ValidationError as exc:
+            results.append(exc)
+    return results
+
+
+def pack_transcripts(
+    transcripts: Iterable[tuple[Hashable, str]], token_budget: int, max_items: int
+) -> Iterator[list[tuple[Hashable, str]]]:
+    """
+    Greedily group transcripts so each pack stays within `token_budget`
+    estimated tokens, counting each one at most at its compaction budget.
+    The shared prefix (system prompt and pain list) is taken off the budget
+    first, and every item pays for its `PACKED_ITEM` wrapper.
+    """
+    budget = settings.transcript_token_budget
+    available = token_budget - text_tokens(packed_prompt_prefix())
+    wrapper = text_tokens(PACKED_ITEM)
+    pack: list[tuple[Hashable, str]] = []
+    used = 0
+    for key, text in transcripts:
+        tokens = min(text_tokens(text), budget or text_tokens(text)) + wrapper + RESPONSE_TOKENS
+        if pack and (used + tokens > available or len(pack) >= max_items):
+            yield pack
+            pack, used = [], 0
+        pack.append((key, text))
+        used += tokens
+    if pack:
+        yield pack
+
+
+async def classify_concurrently(
+    transcripts: Iterable[tuple[Hashable, str]], concurrency: int | None = None, pack_tokens: int | None = None
+) -> AsyncIterator[tuple[Hashable, dict | Exception]]:
+    """
+    Classify every `(key, text)` with as many requests in flight as the
+    adaptive (AIMD) limit allows, capped by `concurrency` when given,
+    yielding `(key, payload)` in completion order. Failures are
+    yielded as the exception instead of cancelling the remaining calls.
+
+    With a `pack_tokens` budget (default `CLASSIFY_PACK_TOKENS`), several
+    transcripts share one request; items missing from or invalid in the
+    packed answer are retried individually.
+    """
+    gate = AdaptiveGate(get_controller(), concurrency)
+    pack_tokens = settings.classify_pack_tokens if pack_tokens is None else pack_tokens
+
+    async def single(key: Hashable, text: str) -> tuple[Hashable, dict | Exception]:
+        async with gate:
+            try:
+                return key, await call_api_async(text)
+            except Exception as exc:
+                return key, exc
+
+    async def packed(pack: list[tuple[Hashable, str]]) -> list[tuple[Hashable, dict | Exception]]:
+        if len(pack) == 1:
+            return [await single(*pack[0])]
+        async with gate:
+            try:
+                outcomes = await call_api_packed_async([text for _, text in pack])
+            except ValueError as exc:
+                # Unparseable answer: every item failed validation.
+                outcomes = [exc] * len(pack)
+            except Exception as exc:
+                return [(key, exc) for key, _ in pack]
+        retries = [single(key, text) for (key, text), outcome in zip(pack, outcomes) if isinstance(outcome, Exception)]
+        retried = dict(await asyncio.gather(*retries))
+        return [(key, retried.get(key, outcome)) for (key, _), outcome in zip(pack, outcomes)]
+
+    if pack_tokens > 0:
+        packs = pack_transcripts(transcripts, pack_tokens, settings.classify_pack_max_items)
+        tasks = [asyncio.ensure_future(packed(pack)) for pack in packs]
+    else:
+        tasks = [asyncio.ensure_future(single(key, text)) for key, text in transcripts]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            outcome = await next_done
+            for item in outcome if isinstance(outcome, list) else [outcome]:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from ..schemas.classification import LLMHealth
+from ..settings import settings
+
+RATE_LIMIT_STATUSES = ("RESOURCE_EXHAUSTED", "TOO_MANY_REQUESTS", "ResourceExhausted", "TooManyRequests")
+UNAVAILABLE_STATUSES = ("UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED", "ServiceUnavailable", "InternalServerError")
+CIRCUIT_OPEN_MESSAGE = "Gemini no está disponible; la clasificación quedó pendiente para más tarde"
+
+
+def _status_code(exc: BaseException) -> int | None:
+    for attribute in ("code", "status_code"):
+        value = getattr(exc, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """HTTP 429 by status code when the client exposes one, else by Gemini's status names."""
+    code = _status_code(exc)
+    if code is not None:
+        return code == 429
+    text = f"{exc} {getattr(exc, 'status', '')} {exc.__class__.__name__}"
+    return "429" in text.split() or any(status in text for status in RATE_LIMIT_STATUSES)
+
+
+def is_unavailable_error(exc: BaseException) -> bool:
+    """Errors that say the provider itself is unhealthy: 5xx, timeouts and connection failures."""
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    code = _status_code(exc)
+    if code is not None:
+        return code >= 500
+    text = f"{exc} {getattr(exc, 'status', '')} {exc.__class__.__name__}"
+    return any(status in text for status in UNAVAILABLE_STATUSES)
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, retry_in: float) -> None:
+        super().__init__(CIRCUIT_OPEN_MESSAGE)
+        self.retry_in = retry_in
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller for the number of LLM requests in flight.
+
+    Every successful answer adds `1 / limit` (about +1 per round of
+    requests). A 429 cuts the limit by `decrease`, and a smoothed latency
+    above twice the baseline (the fastest recent answer) cuts it by 10%.
+    Further cuts are ignored for one baseline latency so a burst of 429s
+    from the same round counts once.
+    """
+
+    def __init__(self, initial: float, maximum: float, minimum: float = 1.0, decrease: float = 0.5) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.limit = min(max(initial, minimum), maximum)
+        self.baseline: float | None = None
+        self.latency: float | None = None
+        self._cut_at = 0.0
+        self._lock = threading.Lock()
+
+    def _cut(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._cut_at >= (self.baseline or 0.0):
+            self.limit = max(self.minimum, self.limit * factor)
+            self._cut_at = now
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline = 0.99 * self.baseline + 0.01 * latency
+            if self.latency > 2 * self.baseline:
+                self._cut(0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_rate_limited(self) -> None:
+        with self._lock:
+            self._cut(self.decrease)
+
+    def current(self) -> int:
+        return int(self.limit)
+
+
+class CircuitBreaker:
+    """
+    Closed while the provider answers. After `threshold` consecutive
+    unavailability errors it opens and calls fail immediately with
+    `CircuitOpenError`; after `reset_seconds` one probe is let through
+    (half-open) and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float) -> None:
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_in(self) -> float:
+        if self.state == "closed":
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and not self.retry_in():
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(self.retry_in())
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.state, self.failures, self._probing = "closed", 0, False
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """The probe ended with an error that says nothing about availability (e.g. an invalid answer)."""
+        with self._lock:
+            self._probing = False
+
+
+class AdaptiveGate:
+    """Per-batch asyncio gate that admits requests while fewer than the adaptive limit are in flight."""
+
+    def __init__(self, controller: AdaptiveConcurrency, cap: int | None = None) -> None:
+        self.controller = controller
+        self.cap = cap
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    def _limit(self) -> int:
+        limit = self.controller.current()
+        return min(limit, self.cap) if self.cap else limit
+
+    async def __aenter__(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self._limit())
+            self.in_flight += 1
+
+    async def __aexit__(self, *exc_info) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+
+_controller: AdaptiveConcurrency | None = None
+_breaker: CircuitBreaker | None = None
+_counters = {"succeeded": 0, "rate_limited": 0, "failed": 0, "rejected": 0}
+_counters_lock = threading.Lock()
+
+
+def get_controller() -> AdaptiveConcurrency:
+    global _controller
+    if _controller is None:
+        _controller = AdaptiveConcurrency(settings.classify_concurrency, settings.classify_concurrency_max)
+    return _controller
+
+
+def get_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(settings.circuit_failure_threshold, settings.circuit_reset_seconds)
+    return _breaker
+
+
+def count(outcome: str) -> None:
+    with _counters_lock:
+        _counters[outcome] += 1
+
+
+def llm_health() -> LLMHealth:
+    controller, breaker = get_controller(), get_breaker()
+    with _counters_lock:
+        counters = dict(_counters)
+    return LLMHealth(
+        concurrency_limit=controller.current(),
+        concurrency_max=int(controller.maximum),
+        latency_ms=(controller.latency or 0.0) * 1000,
+        baseline_latency_ms=(controller.baseline or 0.0) * 1000,
+        circuit_state=breaker.state,
+        consecutive_failures=breaker.failures,
+        retry_in_seconds=breaker.retry_in(),
+        **counters,
+    )
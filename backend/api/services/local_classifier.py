@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Hashable, Iterable, Sequence
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from ..models.classification import Classification
+from ..models.transcript import Transcript
+from ..schemas.classification import ClassificationBase, LocalClassifierStats
+from ..settings import settings
+from .text import fold
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+CATEGORICAL_FIELDS = ("sentiment", "urgency", "budget_tier", "buyer_role", "use_case", "origin", "automatization")
+SCORE_FIELDS = ("fit_score", "close_probability")
+LABEL_FIELDS = ("pains", "risks")
+MAX_FEATURES = 2000
+MIN_DOCUMENT_FREQUENCY = 2
+MIN_LABEL_COUNT = 3
+EPOCHS = 300
+LEARNING_RATE = 4.0
+L2 = 1e-3
+SUMMARY_LENGTH = 80
+SAMPLE_COUNT_TTL = 60.0
+TOKEN = re.compile(r"[a-z0-9ñ]{2,}")
+
+
+def available() -> bool:
+    return np is not None
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased, accent-folded word unigrams and bigrams."""
+    words = TOKEN.findall(fold(text))
+    return words + [f"{left} {right}" for left, right in zip(words, words[1:])]
+
+
+def _summary(text: str) -> str:
+    """Extractive stand-in for the LLM summary: the first sentence, cut to 80 characters."""
+    sentence = re.split(r"(?<=[.!?])\s", " ".join(text.split()), maxsplit=1)[0]
+    return sentence if len(sentence) <= SUMMARY_LENGTH else sentence[: SUMMARY_LENGTH - 1].rstrip() + "…"
+
+
+@dataclass
+class _Vectorizer:
+    vocabulary: dict[str, int]
+    idf: "np.ndarray"
+
+    @classmethod
+    def fit(cls, documents: list[list[str]]) -> "_Vectorizer":
+        frequency = Counter(token for tokens in documents for token in set(tokens))
+        common = [token for token, count in frequency.most_common() if count >= MIN_DOCUMENT_FREQUENCY]
+        vocabulary = {token: index for index, token in enumerate(common[:MAX_FEATURES])}
+        idf = np.array(
+            [math.log((1 + len(documents)) / (1 + frequency[token])) + 1 for token in vocabulary], dtype=np.float32
+        )
+        return cls(vocabulary, idf)
+
+    def transform(self, documents: list[list[str]]) -> "np.ndarray":
+        """L2-normalized TF-IDF rows with a trailing bias column."""
+        matrix = np.zeros((len(documents), len(self.vocabulary) + 1), dtype=np.float32)
+        for row, tokens in enumerate(documents):
+            for token in tokens:
+                index = self.vocabulary.get(token)
+                if index is not None:
+                    matrix[row, index] += 1
+        matrix[:, :-1] *= self.idf
+        norms = np.linalg.norm(matrix[:, :-1], axis=1, keepdims=True)
+        matrix[:, :-1] /= np.where(norms == 0, 1, norms)
+        matrix[:, -1] = 1
+        return matrix
+
+
+def _softmax(logits: "np.ndarray") -> "np.ndarray":
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _train_softmax(features: "np.ndarray", targets: "np.ndarray", classes: int) -> "np.ndarray":
+    """Multinomial logistic regression by full-batch gradient descent with L2."""
+    weights = np.zeros((features.shape[1], classes), dtype=np.float32)
+    onehot = np.eye(classes, dtype=np.float32)[targets]
+    for _ in range(EPOCHS):
+        gradient = features.T @ (_softmax(features @ weights) - onehot) / len(features)
+        weights -= LEARNING_RATE * (gradient + L2 * weights)
+    return weights
+
+
+def _train_sigmoid(features: "np.ndarray", targets: "np.ndarray") -> "np.ndarray":
+    """One-vs-rest logistic regression for every label column of `targets`."""
+    weights = np.zeros((features.shape[1], targets.shape[1]), dtype=np.float32)
+    for _ in range(EPOCHS):
+        probabilities = 1 / (1 + np.exp(-(features @ weights)))
+        weights -= LEARNING_RATE * (features.T @ (probabilities - targets) / len(features) + L2 * weights)
+    return weights
+
+
+def _train_ridge(features: "np.ndarray", targets: "np.ndarray", alpha: float = 1.0) -> "np.ndarray":
+    gram = features.T @ features + alpha * np.eye(features.shape[1], dtype=np.float32)
+    return np.linalg.solve(gram, features.T @ targets)
+
+
+@dataclass
+class LocalPrediction:
+    payload: dict
+    confidence: float
+    field_confidence: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class LocalClassifier:
+    """
+    TF-IDF + linear models trained on stored LLM classifications.
+
+    Categorical fields use softmax regression and their top probability is
+    the field confidence; the prediction confidence is the lowest of them.
+    Pains and risks are one-vs-rest over labels seen at least three times,
+    and the two scores use ridge regression.
+    """
+
+    vectorizer: _Vectorizer
+    categorical: dict[str, tuple[list, "np.ndarray"]]
+    labels: dict[str, tuple[list[str], "np.ndarray"]]
+    scores: "np.ndarray"
+    trained_on: int
+
+    @classmethod
+    def fit(cls, texts: Sequence[str], payloads: Sequence[dict]) -> "LocalClassifier":
+        documents = [tokenize(text) for text in texts]
+        vectorizer = _Vectorizer.fit(documents)
+        features = vectorizer.transform(documents)
+
+        categorical = {}
+        for name in CATEGORICAL_FIELDS:
+            values = [payload.get(name) for payload in payloads]
+            classes = sorted(set(values), key=repr)
+            index = {value: position for position, value in enumerate(classes)}
+            targets = np.array([index[value] for value in values])
+            categorical[name] = (classes, _train_softmax(features, targets, len(classes)))
+
+        labels = {}
+        for name in LABEL_FIELDS:
+            counts = Counter(label for payload in payloads for label in set(payload.get(name) or []))
+            vocabulary = sorted(label for label, count in counts.items() if count >= MIN_LABEL_COUNT)
+            targets = np.array(
+                [[label in (payload.get(name) or []) for label in vocabulary] for payload in payloads],
+                dtype=np.float32,
+            ).reshape(len(payloads), len(vocabulary))
+            labels[name] = (vocabulary, _train_sigmoid(features, targets))
+
+        score_targets = np.array([[payload[name] for name in SCORE_FIELDS] for payload in payloads], dtype=np.float32)
+        return cls(vectorizer, categorical, labels, _train_ridge(features, score_targets), len(texts))
+
+    def predict(self, texts: Sequence[str]) -> list[LocalPrediction]:
+        features = self.vectorizer.transform([tokenize(text) for text in texts])
+        payloads: list[dict] = [{"summary": _summary(text)} for text in texts]
+        confidences: list[dict[str, float]] = [{} for _ in texts]
+
+        for name, (classes, weights) in self.categorical.items():
+            probabilities = _softmax(features @ weights)
+            for row, best in enumerate(probabilities.argmax(axis=1)):
+                payloads[row][name] = classes[best]
+                confidences[row][name] = float(probabilities[row, best])
+        for name, (vocabulary, weights) in self.labels.items():
+            probabilities = 1 / (1 + np.exp(-(features @ weights)))
+            for row in range(len(texts)):
+                payloads[row][name] = [label for label, p in zip(vocabulary, probabilities[row]) if p >= 0.5]
+        scores = np.clip(features @ self.scores, 0, 1)
+        for row in range(len(texts)):
+            for column, name in enumerate(SCORE_FIELDS):
+                payloads[row][name] = round(float(scores[row, column]), 3)
+            if payloads[row].get("origin") is None:
+                payloads[row]["origin"] = "Desconocido"
+
+        return [
+            LocalPrediction(
+                payload=ClassificationBase.model_validate(payload).model_dump(),
+                confidence=min(confidence.values()),
+                field_confidence=confidence,
+            )
+            for payload, confidence in zip(payloads, confidences)
+        ]
+
+
+def training_rows(db: Session) -> tuple[list[str], list[dict]]:
+    """Transcript texts and LLM-produced payloads; local predictions are excluded to avoid feedback."""
+    columns = [getattr(Classification, name) for name in ClassificationBase.model_fields]
+    rows = db.execute(
+        select(Transcript.transcript, *columns)
+        .join(Classification, Classification.transcript_id == Transcript.id)
+        .where(Transcript.transcript.is_not(None), or_(Classification.source.is_(None), Classification.source != "local"))
+    ).all()
+    names = list(ClassificationBase.model_fields)
+    return [row[0] for row in rows], [dict(zip(names, row[1:])) for row in rows]
+
+
+def evaluate(
+    texts: list[str], payloads: list[dict], thresholds: Sequence[float], holdout: float = 0.2, seed: int = 0
+) -> tuple[int, int, float, float, list[tuple[float, float, dict[str, float]]]]:
+    """
+    Fit on a random split of the labelled rows and score the holdout: returns
+    `(train, test, fit_seconds, predict_seconds, rows)` with one
+    `(threshold, share_kept_locally, agreement_per_field)` row per threshold.
+    """
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    cut = int(len(order) * (1 - holdout))
+    train, test = order[:cut], order[cut:]
+
+    started = time.perf_counter()
+    model = LocalClassifier.fit([texts[i] for i in train], [payloads[i] for i in train])
+    trained = time.perf_counter() - started
+    started = time.perf_counter()
+    predictions = model.predict([texts[i] for i in test])
+    predicted = time.perf_counter() - started
+
+    rows = []
+    for threshold in thresholds:
+        kept = [(i, p) for i, p in zip(test, predictions) if p.confidence >= threshold]
+        agreement = {
+            name: sum(p.payload[name] == payloads[i].get(name) for i, p in kept) / len(kept) if kept else 0.0
+            for name in CATEGORICAL_FIELDS
+        }
+        rows.append((threshold, len(kept) / len(test) if test else 0.0, agreement))
+    return len(train), len(test), trained, predicted, rows
+
+
+_lock = threading.Lock()
+_model: LocalClassifier | None = None
+_trainer: threading.Thread | None = None
+_samples: tuple[float, int] | None = None
+_counters = {"predicted": 0, "escalated": 0}
+
+
+def _training_size(db: Session) -> int:
+    """LLM-labelled classifications, recounted at most every `SAMPLE_COUNT_TTL` seconds."""
+    global _samples
+    now = time.monotonic()
+    with _lock:
+        if _samples is not None and now - _samples[0] < SAMPLE_COUNT_TTL:
+            return _samples[1]
+    size = db.scalar(
+        select(func.count(Classification.id)).where(
+            or_(Classification.source.is_(None), Classification.source != "local")
+        )
+    ) or 0
+    with _lock:
+        _samples = (now, size)
+    return size
+
+
+def _retrain(bind) -> None:
+    global _model, _trainer
+    try:
+        with Session(bind) as db:
+            texts, payloads = training_rows(db)
+        model = LocalClassifier.fit(texts, payloads)
+        with _lock:
+            _model = model
+    finally:
+        with _lock:
+            _trainer = None
+
+
+def get_local_classifier(db: Session) -> LocalClassifier | None:
+    """
+    The in-process model. Training runs in a background thread on first use
+    and again once the LLM labelled set has grown by 20%; until the first fit
+    finishes this returns None and every transcript goes to the LLM. Also None
+    when NumPy is missing or there are fewer than
+    `LOCAL_CLASSIFIER_MIN_SAMPLES` labels.
+    """
+    global _trainer
+    if not available():
+        return None
+    size = _training_size(db)
+    if size < settings.local_classifier_min_samples:
+        return None
+    with _lock:
+        if _trainer is None and (_model is None or size >= _model.trained_on * 1.2):
+            _trainer = threading.Thread(target=_retrain, args=(db.get_bind(),), daemon=True)
+            _trainer.start()
+        return _model
+
+
+def split_confident(
+    db: Session, transcripts: Iterable[tuple[Hashable, str]]
+) -> tuple[dict[Hashable, dict], list[tuple[Hashable, str]]]:
+    """Local payloads for confident transcripts, and the `(id, text)` pairs that must go to the LLM."""
+    transcripts = list(transcripts)
+    threshold = settings.local_classifier_threshold
+    model = get_local_classifier(db) if threshold > 0 and transcripts else None
+    if model is None:
+        return {}, transcripts
+    confident: dict[Hashable, dict] = {}
+    escalated: list[tuple[Hashable, str]] = []
+    predictions = model.predict([text for _, text in transcripts])
+    for (key, text), prediction in zip(transcripts, predictions):
+        if prediction.confidence >= threshold:
+            confident[key] = prediction.payload
+        else:
+            escalated.append((key, text))
+    with _lock:
+        _counters["predicted"] += len(confident)
+        _counters["escalated"] += len(escalated)
+    return confident, escalated
+
+
+def local_stats() -> LocalClassifierStats:
+    with _lock:
+        predicted, escalated = _counters["predicted"], _counters["escalated"]
+        trained_on = _model.trained_on if _model else 0
+    total = predicted + escalated
+    return LocalClassifierStats(
+        enabled=available() and settings.local_classifier_threshold > 0,
+        threshold=settings.local_classifier_threshold,
+        trained_on=trained_on,
+        predicted=predicted,
+        escalated=escalated,
+        llm_calls_avoided=predicted / total if total else 0.0,
+    )
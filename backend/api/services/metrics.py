@@ -1,25 +1,33 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from datetime import datetime
+from typing import Iterable
+
 from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
 
 from ..models.classification import Classification
-from ..models.client import Client
+from ..models.classification_labels import ClassificationPain, ClassificationRisk
+from ..models.pain import PainLabel
 from ..models.transcript import Transcript
 from ..schemas.metrics import (
     AvailablePains,
     AutomatizationOutcome,
     AutomatizationOutcomeSeries,
     ConversionMetrics,
+    MetricsDashboard,
+    MetricsFilters,
     MetricsFunnel,
     MetricsOverview,
     MonthlyConversion,
     OriginDistribution,
     OriginStat,
+    PainConversion,
+    PainConversionSeries,
     PainDistribution,
     PainStat,
+    RiskDistribution,
+    RiskStat,
     SellerConversionResponse,
     SellerConversionStat,
     SentimentConversion,
@@ -31,284 +39,369 @@ from ..schemas.metrics import (
 )
 
 
-def overview(db: Session) -> MetricsOverview:
-    total_clients = db.scalar(select(func.count(Client.id))) or 0
-    classified_transcripts = db.scalar(select(func.count(Classification.id))) or 0
-    closed_wins = db.scalar(select(func.count(Transcript.id)).where(Transcript.closed.is_(True))) or 0
-    open_opps = db.scalar(select(func.count(Transcript.id)).where(Transcript.closed.is_(False))) or 0
+from . import crossfilter, rollups
+from .clients import RANGE_MAP
+
+Rollups = dict[str, list[tuple[list, int, int]]]
+CLASSIFICATION_FILTERS = ("use_case", "origin", "budget_tier", "urgency", "sentiment", "automatization")
+
+
+def month_bucket(db: Session, column):
+    """`YYYY-MM` of a datetime column, computed by the database."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(func.date_trunc("month", column), "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def _predicates(db: Session, filters: MetricsFilters) -> list:
+    """SQL conditions over transcripts ⟕ classifications for the given filters."""
+    conditions = []
+    if filters.seller:
+        conditions.append(Transcript.assigned_seller == filters.seller)
+    if filters.date_range in RANGE_MAP:
+        latest = db.scalar(select(func.max(Transcript.meeting_date)))
+        if latest is not None:
+            conditions.append(Transcript.meeting_date >= latest - RANGE_MAP[filters.date_range])
+    if filters.date_from is not None:
+        conditions.append(Transcript.meeting_date >= filters.date_from)
+    if filters.date_to is not None:
+        conditions.append(Transcript.meeting_date < filters.date_to)
+    if filters.closed is not None:
+        conditions.append(Transcript.closed.is_(filters.closed))
+    for field in CLASSIFICATION_FILTERS:
+        value = getattr(filters, field)
+        if value is not None:
+            conditions.append(getattr(Classification, field) == value)
+    if filters.pain:
+        tagged = (
+            select(ClassificationPain.classification_id)
+            .join(PainLabel, PainLabel.id == ClassificationPain.pain_id)
+            .where(PainLabel.name == filters.pain)
+        )
+        conditions.append(Classification.id.in_(tagged))
+    return conditions
+
+
+def _dimension_keys(db: Session, dimension: str) -> tuple[tuple, bool]:
+    """GROUP BY expressions of a rollup dimension and whether it only counts classified transcripts."""
+    if dimension == "stage":
+        stage = case(
+            (Classification.id.is_(None), "discovery"),
+            (Classification.fit_score < 0.6, "evaluation"),
+            (Classification.fit_score < 0.8, "negotiation"),
+            else_="qualified",
+        )
+        return (stage,), False
+    if dimension == "month":
+        return (month_bucket(db, Transcript.meeting_date),), False
+    if dimension == "seller":
+        return (Transcript.assigned_seller,), False
+    if dimension == "urgency_budget":
+        return (Classification.urgency, Classification.budget_tier), True
+    return (getattr(Classification, dimension),), True
+
+
+def _aggregate(db: Session, dimensions: Iterable[str], filters: MetricsFilters) -> Rollups:
+    """The rollup buckets recomputed from the filtered rows, one GROUP BY per dimension."""
+    conditions = _predicates(db, filters)
+    closed = func.sum(case((Transcript.closed.is_(True), 1), else_=0))
+    result: Rollups = {}
+    for dimension in dimensions:
+        query = (
+            select(Transcript.id)
+            .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+            .where(*conditions)
+        )
+        if dimension == "clients":
+            total = db.scalar(query.with_only_columns(func.count(func.distinct(Transcript.client_id)))) or 0
+            result[dimension] = [([], total, 0)] if total else []
+            continue
+        keys, classified_only = _dimension_keys(db, dimension)
+        query = query.with_only_columns(*keys, func.count(Transcript.id), closed).group_by(*keys)
+        if classified_only:
+            query = query.where(Classification.id.is_not(None))
+        if dimension == "month":
+            query = query.where(Transcript.meeting_date.is_not(None))
+        result[dimension] = [(list(key), int(total), int(count or 0)) for *key, total, count in db.execute(query)]
+    return result
+
+
+def _read(db: Session, dimensions: Iterable[str], filters: MetricsFilters | None) -> Rollups:
+    """
+    Rollup buckets; O(buckets) from `metric_rollups` unless filters force a
+    pass over the matching rows, in the columnar snapshot when NumPy is
+    installed or in SQL otherwise (and while the snapshot is loading).
+    """
+    if filters is None or not filters.is_active():
+        return rollups.read(db, dimensions)
+    if crossfilter.available():
+        data = crossfilter.aggregate(db, dimensions, filters)
+        if data is not None:
+            return data
+    return _aggregate(db, dimensions, filters)
+
+
+def _conversion(closed: int, total: int) -> float:
+    return closed / total if total else 0.0
+
+
+def _overview(data: Rollups) -> MetricsOverview:
+    stages = {key[0]: (total, closed) for key, total, closed in data["stage"]}
     return MetricsOverview(
-        total_clients=total_clients,
-        classified_clients=classified_transcripts,
-        open_opportunities=open_opps,
-        closed_wins=closed_wins,
+        total_clients=sum(total for _, total, _ in data["clients"]),
+        classified_clients=sum(total for stage, (total, _) in stages.items() if stage != "discovery"),
+        open_opportunities=sum(total - closed for total, closed in stages.values()),
+        closed_wins=sum(closed for _, closed in stages.values()),
     )
 
 
-def funnel(db: Session) -> MetricsFunnel:
-    discovery = db.scalar(select(func.count(Transcript.id)).where(~Transcript.classification.has())) or 0
-    evaluation = (
-        db.scalar(
-            select(func.count(Classification.id)).where(Classification.fit_score < 0.6)
-        )
-        or 0
-    )
-    negotiation = (
-        db.scalar(
-            select(func.count(Classification.id)).where(
-                Classification.fit_score >= 0.6, Classification.fit_score < 0.8
-            )
-        )
-        or 0
-    )
-    closed = db.scalar(select(func.count(Transcript.id)).where(Transcript.closed.is_(True))) or 0
+def overview(db: Session, filters: MetricsFilters | None = None) -> MetricsOverview:
+    return _overview(_read(db, ("clients", "stage"), filters))
+
+
+def _funnel(data: Rollups) -> MetricsFunnel:
+    stages = {key[0]: total for key, total, _ in data["stage"]}
     return MetricsFunnel(
-        discovery=discovery,
-        evaluation=evaluation,
-        negotiation=negotiation,
-        closed=closed,
+        discovery=stages.get("discovery", 0),
+        evaluation=stages.get("evaluation", 0),
+        negotiation=stages.get("negotiation", 0),
+        closed=sum(closed for _, _, closed in data["stage"]),
     )
 
 
-def conversion_metrics(db: Session) -> ConversionMetrics:
-    result = db.execute(
-        select(Transcript.meeting_date, Transcript.closed)
-        .where(Transcript.meeting_date.is_not(None))
-        .order_by(Transcript.meeting_date.desc())
-    ).all()
+def funnel(db: Session, filters: MetricsFilters | None = None) -> MetricsFunnel:
+    return _funnel(_read(db, ("stage",), filters))
 
-    monthly_counter: dict[str, dict[str, int]] = defaultdict(
-        lambda: {"closed": 0, "total": 0}
-    )
-    for meeting_date, closed in result:
-        if meeting_date is None:
-            continue
-        label = meeting_date.strftime("%Y-%m")
-        stats = monthly_counter[label]
-        stats["total"] += 1
-        if closed:
-            stats["closed"] += 1
-
-    monthly: list[MonthlyConversion] = []
-    for label in sorted(monthly_counter.keys()):
-        stats = monthly_counter[label]
-        total = stats["total"]
-        closed_count = stats["closed"]
-        conversion = closed_count / total if total else 0.0
-        monthly.append(
-            MonthlyConversion(
-                month=label,
-                closed=closed_count,
-                total=total,
-                conversion=conversion,
-            )
-        )
 
+def _conversions(data: Rollups) -> ConversionMetrics:
+    monthly = [
+        MonthlyConversion(month=key[0], closed=closed, total=total, conversion=_conversion(closed, total))
+        for key, total, closed in sorted(data["month"])
+    ]
     return ConversionMetrics(monthly=monthly)
 
 
-def urgency_budget_heatmap(db: Session) -> UrgencyBudgetHeatmap:
-    closed_case = func.sum(
-        case((Transcript.closed.is_(True), 1), else_=0)
-    ).label("closed_count")
+def conversion_metrics(db: Session, filters: MetricsFilters | None = None) -> ConversionMetrics:
+    return _conversions(_read(db, ("month",), filters))
 
-    query = (
-        select(
-            Classification.urgency,
-            Classification.budget_tier,
-            func.count(Classification.id).label("total"),
-            closed_case,
-        )
-        .join(Transcript, Transcript.id == Classification.transcript_id)
-        .group_by(Classification.urgency, Classification.budget_tier)
-    )
 
-    rows = db.execute(query).all()
-    cells: list[UrgencyBudgetCell] = []
-    for urgency, budget, total, closed in rows:
-        if budget is None:
-            budget = "Unknown"
-        closed_value = int(closed or 0)
-        total_value = int(total or 0)
-        conversion = closed_value / total_value if total_value else 0.0
-        cells.append(
-            UrgencyBudgetCell(
-                urgency=int(urgency or 0),
-                budget_tier=budget,
-                total=total_value,
-                closed=closed_value,
-                conversion=conversion,
-            )
+def _urgency_budget(data: Rollups) -> UrgencyBudgetHeatmap:
+    cells = [
+        UrgencyBudgetCell(
+            urgency=int(urgency or 0),
+            budget_tier=budget if budget is not None else "Unknown",
+            total=total,
+            closed=closed,
+            conversion=_conversion(closed, total),
         )
-
+        for (urgency, budget), total, closed in data["urgency_budget"]
+    ]
     return UrgencyBudgetHeatmap(cells=cells)
 
 
-def use_case_distribution(db: Session, status: str = "all") -> UseCaseDistribution:
-    query = (
-        select(Classification.use_case, func.count(Classification.id).label("total"))
-        .join(Transcript, Transcript.id == Classification.transcript_id)
-        .group_by(Classification.use_case)
-    )
+def urgency_budget_heatmap(db: Session, filters: MetricsFilters | None = None) -> UrgencyBudgetHeatmap:
+    return _urgency_budget(_read(db, ("urgency_budget",), filters))
 
-    if status == "closed":
-        query = query.where(Transcript.closed.is_(True))
-    elif status == "open":
-        query = query.where(Transcript.closed.is_(False))
-
-    rows = db.execute(query).all()
-    items: list[UseCaseStat] = []
-    for use_case, total in rows:
-        name = use_case or "Desconocido"
-        items.append(UseCaseStat(use_case=name, total=int(total or 0)))
 
+def _use_cases(data: Rollups, status: str) -> UseCaseDistribution:
+    counts = {"all": lambda total, closed: total, "closed": lambda total, closed: closed}.get(
+        status, lambda total, closed: total - closed
+    )
+    items = [
+        UseCaseStat(use_case=key[0] or "Desconocido", total=counts(total, closed))
+        for key, total, closed in data["use_case"]
+        if counts(total, closed)
+    ]
     items.sort(key=lambda item: item.total, reverse=True)
     return UseCaseDistribution(items=items)
 
 
-def pain_distribution(db: Session) -> PainDistribution:
-    rows = db.execute(select(Classification.pains)).scalars().all()
-    counter: dict[str, int] = defaultdict(int)
+def use_case_distribution(
+    db: Session, status: str = "all", filters: MetricsFilters | None = None
+) -> UseCaseDistribution:
+    return _use_cases(_read(db, ("use_case",), filters), status)
 
-    for pains in rows:
-        if not pains:
-            continue
-        for pain in pains:
-            label = (pain or "").strip()
-            if label:
-                counter[label] += 1
 
-    items = [
-        PainStat(pain=label, total=value)
-        for label, value in sorted(counter.items(), key=lambda item: item[1], reverse=True)
-    ]
-    return PainDistribution(items=items)
-
-
-def sentiment_conversion_breakdown(db: Session) -> SentimentConversionSeries:
-    rows = (
-        db.execute(
-            select(
-                Classification.sentiment,
-                Transcript.closed,
-                func.count(Transcript.id).label("total"),
-            )
-            .join(Transcript, Transcript.id == Classification.transcript_id)
-            .group_by(Classification.sentiment, Transcript.closed)
-        )
-        .all()
+def _filter_labels(db: Session, query, label_column, filters: MetricsFilters | None):
+    """Restrict a query over a classification child table to the classifications matching `filters`."""
+    if filters is None or not filters.is_active():
+        return query
+    return (
+        query.join(Classification, Classification.id == label_column)
+        .join(Transcript, Transcript.id == Classification.transcript_id)
+        .where(*_predicates(db, filters))
     )
 
-    stats: dict[int, dict[str, int]] = defaultdict(lambda: {"closed": 0, "open": 0})
-    for sentiment, closed, total in rows:
-        sentiment_value = int(sentiment or 0)
-        entry = stats[sentiment_value]
-        if closed:
-            entry["closed"] += int(total or 0)
-        else:
-            entry["open"] += int(total or 0)
-
-    items = [
-        SentimentConversion(
-            sentiment=sentiment,
-            closed=value["closed"],
-            open=value["open"],
-        )
-        for sentiment, value in sorted(stats.items())
-    ]
-    return SentimentConversionSeries(items=items)
 
+def pain_distribution(db: Session, filters: MetricsFilters | None = None) -> PainDistribution:
+    counts = None
+    if filters is not None and filters.is_active() and crossfilter.available():
+        counts = crossfilter.pain_counts(db, filters)
+    if counts is not None:
+        return PainDistribution(items=[PainStat(pain=name, total=count) for name, count in counts])
+    total = func.count(ClassificationPain.classification_id).label("total")
+    query = select(PainLabel.name, total).join(PainLabel, PainLabel.id == ClassificationPain.pain_id)
+    rows = db.execute(
+        _filter_labels(db, query, ClassificationPain.classification_id, filters)
+        .group_by(ClassificationPain.pain_id, PainLabel.name)
+        .order_by(total.desc(), PainLabel.name)
+    ).all()
+    return PainDistribution(items=[PainStat(pain=name, total=int(count)) for name, count in rows])
 
-def seller_conversion_stats(db: Session) -> SellerConversionResponse:
-    closed_case = func.sum(
-        case((Transcript.closed.is_(True), 1), else_=0)
-    ).label("closed_count")
 
-    rows = (
-        db.execute(
-            select(
-                Transcript.assigned_seller,
-                func.count(Transcript.id).label("total"),
-                closed_case,
-            ).group_by(Transcript.assigned_seller)
-        )
-        .all()
-    )
+def pain_conversion_breakdown(db: Session, filters: MetricsFilters | None = None) -> PainConversionSeries:
+    closed_case = func.sum(case((Transcript.closed.is_(True), 1), else_=0)).label("closed_count")
+    total = func.count(ClassificationPain.classification_id).label("total")
+    rows = db.execute(
+        select(PainLabel.name, total, closed_case)
+        .join(PainLabel, PainLabel.id == ClassificationPain.pain_id)
+        .join(Classification, Classification.id == ClassificationPain.classification_id)
+        .join(Transcript, Transcript.id == Classification.transcript_id)
+        .where(*(_predicates(db, filters) if filters is not None else ()))
+        .group_by(ClassificationPain.pain_id, PainLabel.name)
+        .order_by(total.desc(), PainLabel.name)
+    ).all()
 
-    items: list[SellerConversionStat] = []
-    for seller, total, closed in rows:
-        total_value = int(total or 0)
-        closed_value = int(closed or 0)
-        conversion = closed_value / total_value if total_value else 0.0
+    items: list[PainConversion] = []
+    for name, total_value, closed in rows:
+        total_value, closed_value = int(total_value or 0), int(closed or 0)
         items.append(
-            SellerConversionStat(
-                seller=seller or "Sin asignar",
+            PainConversion(
+                pain=name,
                 closed=closed_value,
+                open=total_value - closed_value,
                 total=total_value,
-                conversion=conversion,
+                conversion=closed_value / total_value if total_value else 0.0,
             )
         )
+    return PainConversionSeries(items=items)
 
-    items.sort(key=lambda item: item.conversion, reverse=True)
-    return SellerConversionResponse(items=items)
+
+def risk_distribution(db: Session, filters: MetricsFilters | None = None) -> RiskDistribution:
+    total = func.count(ClassificationRisk.classification_id).label("total")
+    query = select(ClassificationRisk.risk, total)
+    rows = db.execute(
+        _filter_labels(db, query, ClassificationRisk.classification_id, filters)
+        .group_by(ClassificationRisk.risk)
+        .order_by(total.desc(), ClassificationRisk.risk)
+    ).all()
+    return RiskDistribution(items=[RiskStat(risk=risk, total=int(count)) for risk, count in rows])
 
 
-def origin_distribution(db: Session) -> OriginDistribution:
-    rows = (
-        db.execute(
-            select(Classification.origin, func.count(Classification.id).label("total"))
-            .group_by(Classification.origin)
-        ).all()
-    )
+def _sentiment_conversion(data: Rollups) -> SentimentConversionSeries:
+    stats: dict[int, dict[str, int]] = defaultdict(lambda: {"closed": 0, "open": 0})
+    for key, total, closed in data["sentiment"]:
+        entry = stats[int(key[0] or 0)]
+        entry["closed"] += closed
+        entry["open"] += total - closed
+    items = [SentimentConversion(sentiment=sentiment, **value) for sentiment, value in sorted(stats.items())]
+    return SentimentConversionSeries(items=items)
+
 
+def sentiment_conversion_breakdown(db: Session, filters: MetricsFilters | None = None) -> SentimentConversionSeries:
+    return _sentiment_conversion(_read(db, ("sentiment",), filters))
+
+
+def _seller_conversion(data: Rollups) -> SellerConversionResponse:
     items = [
-        OriginStat(origin=origin or "Unknown", total=int(total or 0))
-        for origin, total in rows
+        SellerConversionStat(
+            seller=key[0] or "Sin asignar",
+            closed=closed,
+            total=total,
+            conversion=_conversion(closed, total),
+        )
+        for key, total, closed in data["seller"]
     ]
+    items.sort(key=lambda item: item.conversion, reverse=True)
+    return SellerConversionResponse(items=items)
+
+
+def seller_conversion_stats(db: Session, filters: MetricsFilters | None = None) -> SellerConversionResponse:
+    return _seller_conversion(_read(db, ("seller",), filters))
+
+
+def _origins(data: Rollups) -> OriginDistribution:
+    items = [OriginStat(origin=key[0] or "Unknown", total=total) for key, total, _ in data["origin"]]
     items.sort(key=lambda item: item.total, reverse=True)
     return OriginDistribution(items=items)
 
 
-def automatization_outcomes(db: Session) -> AutomatizationOutcomeSeries:
-    rows = (
-        db.execute(
-            select(
-                Classification.automatization,
-                Transcript.closed,
-                func.count(Transcript.id).label("total"),
-            )
-            .join(Transcript, Transcript.id == Classification.transcript_id)
-            .group_by(Classification.automatization, Transcript.closed)
-        )
-        .all()
-    )
+def origin_distribution(db: Session, filters: MetricsFilters | None = None) -> OriginDistribution:
+    return _origins(_read(db, ("origin",), filters))
 
-    stats: dict[bool, dict[str, int]] = defaultdict(lambda: {"closed": 0, "open": 0})
-    for automatization, closed, total in rows:
-        key = bool(automatization)
-        entry = stats[key]
-        if closed:
-            entry["closed"] += int(total or 0)
-        else:
-            entry["open"] += int(total or 0)
 
+def _automatization(data: Rollups) -> AutomatizationOutcomeSeries:
+    stats: dict[bool, dict[str, int]] = defaultdict(lambda: {"closed": 0, "open": 0})
+    for key, total, closed in data["automatization"]:
+        entry = stats[bool(key[0])]
+        entry["closed"] += closed
+        entry["open"] += total - closed
     items = [
-        AutomatizationOutcome(
-            automatization=state,
-            closed=values["closed"],
-            open=values["open"],
-        )
+        AutomatizationOutcome(automatization=state, **values)
         for state, values in sorted(stats.items(), key=lambda item: item[0], reverse=True)
     ]
     return AutomatizationOutcomeSeries(items=items)
 
 
-def list_pains(db: Session) -> AvailablePains:
-    rows = db.execute(select(Classification.pains)).scalars().all()
-    pains_set: set[str] = set()
-    for row in rows:
-        if not row:
-            continue
-        for pain in row:
-            if pain:
-                pains_set.add(pain)
-    return AvailablePains(pains=sorted(pains_set))
+def automatization_outcomes(db: Session, filters: MetricsFilters | None = None) -> AutomatizationOutcomeSeries:
+    return _automatization(_read(db, ("automatization",), filters))
+
+
+def list_pains(db: Session, filters: MetricsFilters | None = None) -> AvailablePains:
+    """Canonical pain labels in use; aliases merged into them are not listed."""
+    query = select(PainLabel.name).join(ClassificationPain, ClassificationPain.pain_id == PainLabel.id)
+    rows = db.scalars(
+        _filter_labels(db, query, ClassificationPain.classification_id, filters)
+        .where(PainLabel.merged_into_id.is_(None))
+        .group_by(PainLabel.id, PainLabel.name)
+        .order_by(PainLabel.name)
+    ).all()
+    return AvailablePains(pains=list(rows))
+
+
+DASHBOARD_SECTIONS = tuple(MetricsDashboard.model_fields)
+_SECTION_DIMENSIONS = {
+    "overview": ("clients", "stage"),
+    "funnel": ("stage",),
+    "conversions": ("month",),
+    "urgency_budget": ("urgency_budget",),
+    "use_cases": ("use_case",),
+    "sentiment_conversion": ("sentiment",),
+    "seller_conversion": ("seller",),
+    "origins": ("origin",),
+    "automatization_outcomes": ("automatization",),
+}
+_SECTION_BUILDERS = {
+    "overview": _overview,
+    "funnel": _funnel,
+    "conversions": _conversions,
+    "urgency_budget": _urgency_budget,
+    "use_cases": lambda data: {status: _use_cases(data, status) for status in ("all", "closed", "open")},
+    "sentiment_conversion": _sentiment_conversion,
+    "seller_conversion": _seller_conversion,
+    "origins": _origins,
+    "automatization_outcomes": _automatization,
+}
+
+
+def dashboard(
+    db: Session, sections: Iterable[str] | None = None, filters: MetricsFilters | None = None
+) -> MetricsDashboard:
+    """
+    The requested Metrics page sections (all by default) from one read of
+    the rollup buckets they need (or, with filters, one GROUP BY per
+    bucket dimension over the matching rows), plus the pain index when the
+    pain distribution is requested.
+    """
+    wanted = set(sections or DASHBOARD_SECTIONS)
+    unknown = wanted - set(DASHBOARD_SECTIONS)
+    if unknown:
+        raise ValueError(f"Secciones desconocidas: {', '.join(sorted(unknown))}")
+    result: dict = {}
+    dimensions = {dimension for section in wanted for dimension in _SECTION_DIMENSIONS.get(section, ())}
+    if dimensions:
+        data = _read(db, dimensions, filters)
+        result.update({section: _SECTION_BUILDERS[section](data) for section in wanted if section in _SECTION_BUILDERS})
+    if "pains" in wanted:
+        result["pains"] = pain_distribution(db, filters)
+    return MetricsDashboard(**result)
@@ -0,0 +1,197 @@
+"""
+Response cache for `/api/metrics/*`, versioned by a data generation counter.
+
+The generation is a single row in `metrics_generation`, bumped in the same
+transaction as every session commit that wrote to a table behind the
+metrics, so writes from CLIs and other worker processes invalidate cached
+bodies and ETags too. Each request reads it with one primary-key lookup.
+`metrics_changes` keeps, for the latest generations, which transcripts each
+write changed, so in-memory copies can be patched instead of reloaded.
+"""
+from __future__ import annotations
+
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Iterable
+
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models.metrics_generation import MetricsChange, MetricsGeneration
+from ..schemas.metrics import MetricsCacheStats
+from ..settings import settings
+
+METRIC_TABLES = frozenset(
+    {
+        "clients",
+        "transcripts",
+        "classifications",
+        "classification_pains",
+        "classification_risks",
+        "pain_labels",
+        "pain_aliases",
+        "metric_rollups",
+    }
+)
+
+CHANGE_LOG_SIZE = 1024
+CHANGE_MAX_IDS = 50_000
+
+
+def current(db: Session) -> tuple[str, int]:
+    """`(database token, generation)`; `("", 0)` before the first write."""
+    row = db.execute(select(MetricsGeneration.token, MetricsGeneration.generation)).first()
+    return (row[0], row[1]) if row else ("", 0)
+
+
+def generation(db: Session) -> int:
+    return current(db)[1]
+
+
+def bump(db: Session, transcript_ids: Iterable[int] | None = None) -> int:
+    """
+    Advance the generation inside `db`'s transaction and log the transcripts
+    the write changed (`None` when unknown). The row lock taken by the
+    UPDATE orders concurrent writers, so generations become visible in order.
+    """
+    statement = (
+        update(MetricsGeneration)
+        .where(MetricsGeneration.id == 1)
+        .values(generation=MetricsGeneration.generation + 1)
+        .returning(MetricsGeneration.generation)
+    )
+    value = db.scalar(statement)
+    if value is None:
+        row = {"id": 1, "token": uuid.uuid4().hex[:8], "generation": 0}
+        dialect_insert = {"postgresql": pg_insert, "sqlite": sqlite_insert}.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            db.execute(dialect_insert(MetricsGeneration).values(**row).on_conflict_do_nothing(index_elements=["id"]))
+        else:
+            db.execute(insert(MetricsGeneration).values(**row))
+        value = db.scalar(statement)
+    ids = set(transcript_ids) if transcript_ids is not None else None
+    db.execute(
+        insert(MetricsChange).values(
+            generation=value, transcript_ids=sorted(ids) if ids is not None and len(ids) <= CHANGE_MAX_IDS else None
+        )
+    )
+    db.execute(delete(MetricsChange).where(MetricsChange.generation <= value - CHANGE_LOG_SIZE))
+    return value
+
+
+def changes_since(db: Session, since: int, until: int) -> set[int] | None:
+    """Transcripts changed by the generations in `(since, until]`, or `None` if any of them is unknown."""
+    if until - since > CHANGE_LOG_SIZE:
+        return None
+    entries = db.scalars(
+        select(MetricsChange.transcript_ids).where(MetricsChange.generation > since, MetricsChange.generation <= until)
+    ).all()
+    if len(entries) != until - since or any(ids is None for ids in entries):
+        return None
+    return set().union(*map(set, entries))
+
+
+def touch(session: Session, transcript_ids: Iterable[int]) -> None:
+    """Record the transcripts a session is changing, logged with its generation on commit."""
+    session.info["metrics_dirty"] = True
+    session.info.setdefault("metrics_transcripts", set()).update(transcript_ids)
+
+
+def etag(token: str, value: int) -> str:
+    return f'W/"{token}-{value}"'
+
+
+class MetricsCache:
+    """LRU of serialized response bodies bounded by total bytes and entry count."""
+
+    def __init__(self, max_bytes: int, max_entries: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[int, bytes]] = OrderedDict()
+        self.size = 0
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def count(self, outcome: str) -> None:
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def get(self, key: str, generation: int) -> bytes | None:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, generation: int, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self.entries[key] = (generation, body)
+            self.size += len(body)
+            while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+
+cache = MetricsCache(settings.metrics_cache_max_bytes, settings.metrics_cache_max_entries)
+
+
+def stats(db: Session) -> MetricsCacheStats:
+    with cache._lock:
+        counters = dict(cache.counters)
+        entries, size = len(cache.entries), cache.size
+    lookups = counters["hits"] + counters["misses"] + counters["not_modified"]
+    return MetricsCacheStats(
+        generation=generation(db),
+        entries=entries,
+        bytes=size,
+        max_bytes=cache.max_bytes,
+        hit_rate=(counters["hits"] + counters["not_modified"]) / lookups if lookups else 0.0,
+        **counters,
+    )
+
+
+def _mark(session: Session, tables: set[str]) -> None:
+    if not session.info.get("metrics_dirty") and tables & METRIC_TABLES:
+        session.info["metrics_dirty"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, context) -> None:
+    _mark(session, {getattr(item, "__tablename__", "") for item in (*session.new, *session.dirty, *session.deleted)})
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_execute(state) -> None:
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is not None:
+        _mark(state.session, {table.name for table in state.bind_mapper.tables})
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session: Session) -> None:
+    session.flush()
+    transcript_ids = session.info.pop("metrics_transcripts", None)
+    if session.info.pop("metrics_dirty", False):
+        bump(session, transcript_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop("metrics_dirty", None)
+    session.info.pop("metrics_transcripts", None)
@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import re
+import threading
+import weakref
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..models.classification import Classification
+from ..models.classification_labels import ClassificationPain
+from ..models.pain import PainAlias, PainLabel
+from ..schemas.classification import PainRule
+from ..settings import settings
+from .classification_labels import sync_pains
+from .text import fold
+
+WORD = re.compile(r"[a-z0-9ñ]+")
+STOPWORDS = frozenset("a al con de del el en la las los para por su sus un una y o e".split())
+PLURAL_ES = re.compile(r"(?<=[lnrdz])es$")
+
+
+def _singular(word: str) -> str:
+    if len(word) <= 3 or not word.endswith("s"):
+        return word
+    return PLURAL_ES.sub("", word) if PLURAL_ES.search(word) else word[:-1]
+
+
+def normalize(label: str) -> str:
+    """Order-insensitive key: accent-folded, lowercased, singular content words, sorted."""
+    words = WORD.findall(fold(label))
+    content = sorted(_singular(word) for word in words if word not in STOPWORDS)
+    return " ".join(content or words)
+
+
+def trigrams(key: str) -> frozenset[str]:
+    padded = f"  {key} "
+    return frozenset(padded[index : index + 3] for index in range(len(padded) - 2))
+
+
+class PainIndex:
+    """
+    In-memory view of the canonical labels and their aliases, with an
+    inverted trigram index so a new string is only compared with labels
+    that share at least one trigram.
+    """
+
+    def __init__(self, labels: Iterable[tuple[int, str, str, int | None]], aliases: Iterable[tuple[str, int]]) -> None:
+        self.lock = threading.RLock()
+        self.final: dict[int, int] = {}
+        self.names: dict[int, str] = {}
+        self.by_key: dict[str, int] = {}
+        self.grams: dict[str, set[int]] = defaultdict(set)
+        self.sizes: dict[int, int] = {}
+        self.last_id = 0
+        merged = {}
+        for label_id, name, key, merged_into in labels:
+            self.last_id = max(self.last_id, label_id)
+            if merged_into is None:
+                self.add_label(label_id, name, key)
+            else:
+                merged[label_id] = merged_into
+        for label_id in merged:
+            target = label_id
+            while target in merged:
+                target = merged[target]
+            self.final[label_id] = target
+        self.aliases = {alias: self.final.get(label_id, label_id) for alias, label_id in aliases}
+
+    def add_label(self, label_id: int, name: str, key: str) -> None:
+        self.last_id = max(self.last_id, label_id)
+        self.names[label_id] = name
+        self.final[label_id] = label_id
+        self.by_key.setdefault(key, label_id)
+        grams = trigrams(key)
+        self.sizes[label_id] = len(grams)
+        for gram in grams:
+            self.grams[gram].add(label_id)
+
+    def retire(self, label_id: int, key: str, target: int) -> None:
+        """Stop matching `label_id` and resolve it to `target` from now on."""
+        self.names.pop(label_id, None)
+        self.sizes.pop(label_id, None)
+        self.final[label_id] = target
+        if self.by_key.get(key) == label_id:
+            self.by_key[key] = target
+        for gram in trigrams(key):
+            self.grams[gram].discard(label_id)
+
+    def match(self, key: str) -> tuple[int | None, float]:
+        """Best label by trigram Jaccard similarity of the normalized keys."""
+        grams = trigrams(key)
+        shared: dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for label_id in self.grams.get(gram, ()):
+                shared[label_id] += 1
+        best, score = None, 0.0
+        for label_id, count in shared.items():
+            similarity = count / (len(grams) + self.sizes[label_id] - count)
+            if similarity > score:
+                best, score = label_id, similarity
+        return best, score
+
+
+_indexes: "weakref.WeakKeyDictionary[Engine, PainIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def _engine(db: Session) -> Engine:
+    bind = db.get_bind()
+    return getattr(bind, "engine", bind)
+
+
+def get_index(db: Session) -> PainIndex:
+    engine = _engine(db)
+    with _indexes_lock:
+        index = _indexes.get(engine)
+        if index is None:
+            labels = db.execute(select(PainLabel.id, PainLabel.name, PainLabel.key, PainLabel.merged_into_id)).all()
+            aliases = db.execute(select(PainAlias.alias, PainAlias.label_id)).all()
+            index = _indexes[engine] = PainIndex(labels, aliases)
+        return index
+
+
+def invalidate(db: Session) -> None:
+    with _indexes_lock:
+        _indexes.pop(_engine(db), None)
+
+
+def _forget_on_rollback(db: Session) -> None:
+    """Labels created in this session vanish if it rolls back, so the index must be rebuilt."""
+    if not db.info.get("pain_index_hook"):
+        event.listen(db, "after_soft_rollback", lambda session, transaction: invalidate(session))
+        db.info["pain_index_hook"] = True
+
+
+def _load_labels(db: Session, index: PainIndex, condition) -> None:
+    """Add labels written through another engine or process to `index`, following merges."""
+    query = select(PainLabel.id, PainLabel.name, PainLabel.key, PainLabel.merged_into_id)
+    merged: dict[int, int] = {}
+    requested: set[int] = set()
+    while condition is not None:
+        for label_id, name, key, merged_into in db.execute(query.where(condition)).all():
+            if merged_into is None:
+                index.add_label(label_id, name, key)
+            else:
+                merged[label_id] = merged_into
+                index.last_id = max(index.last_id, label_id)
+        missing = {target for target in merged.values() if target not in index.final and target not in merged}
+        missing -= requested
+        requested |= missing
+        condition = PainLabel.id.in_(missing) if missing else None
+    for label_id in merged:
+        target = label_id
+        while target in merged:
+            target = merged[target]
+        index.final[label_id] = index.final.get(target, target)
+
+
+def _new_label(db: Session, index: PainIndex, name: str, key: str) -> int:
+    label = PainLabel(name=name, key=key)
+    db.add(label)
+    db.flush()
+    index.add_label(label.id, name, key)
+    return label.id
+
+
+def _insert_alias(db: Session, rule: dict) -> int:
+    """Insert a merge rule unless the alias was stored concurrently; returns the label the alias points to."""
+    dialect_insert = {"postgresql": pg_insert, "sqlite": sqlite_insert}.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        db.add(PainAlias(**rule))
+        db.flush()
+        return rule["label_id"]
+    statement = (
+        dialect_insert(PainAlias)
+        .values(**rule)
+        .on_conflict_do_nothing(index_elements=["alias"])
+        .returning(PainAlias.label_id)
+    )
+    label_id = db.scalar(statement)
+    if label_id is None:
+        label_id = db.scalar(select(PainAlias.label_id).where(PainAlias.alias == rule["alias"]))
+    return label_id
+
+
+def _resolve(db: Session, index: PainIndex, name: str) -> int:
+    """
+    Label for a string missing from the index. Another engine or process may
+    have stored the alias or new labels since the index was loaded, so those
+    are read back before anything is created.
+    """
+    label_id = db.scalar(select(PainAlias.label_id).where(PainAlias.alias == name))
+    if label_id is None:
+        _load_labels(db, index, PainLabel.id > index.last_id)
+        key = normalize(name) or fold(name)
+        rule = {"alias": name, "score": 1.0, "status": "merged"}
+        if key in index.by_key:
+            rule["label_id"] = index.by_key[key]
+        else:
+            candidate, score = index.match(key)
+            if candidate is not None and score >= settings.pain_merge_threshold:
+                rule["label_id"], rule["score"] = candidate, score
+            else:
+                rule["label_id"] = _new_label(db, index, name, key)
+                rule["status"] = "canonical"
+                if candidate is not None and score >= settings.pain_review_threshold:
+                    rule["status"], rule["suggested_label_id"], rule["score"] = "suggested", candidate, score
+        label_id = _insert_alias(db, rule)
+        if rule["status"] != "merged" and label_id != rule["label_id"]:
+            # Lost the race for this alias: fold the label just created into the stored one.
+            db.execute(update(PainLabel).where(PainLabel.id == rule["label_id"]).values(merged_into_id=label_id))
+            index.retire(rule["label_id"], key, label_id)
+    if label_id not in index.final:
+        _load_labels(db, index, PainLabel.id == label_id)
+    label_id = index.final.get(label_id, label_id)
+    index.aliases[name] = label_id
+    return label_id
+
+
+def canonicalize(db: Session, pains: Iterable[str] | None) -> list[int]:
+    """
+    Canonical label ids for raw pain strings, in order and without
+    repeats. Unknown strings become aliases of an existing label (same
+    normalized key, or trigram similarity above `PAIN_MERGE_THRESHOLD`) or
+    new labels, flushed in the caller's transaction.
+    """
+    ids: list[int] = []
+    index = get_index(db)
+    with index.lock:
+        for raw in pains or ():
+            name = " ".join((raw or "").split())
+            if not name:
+                continue
+            label_id = index.aliases.get(name)
+            if label_id is None:
+                _forget_on_rollback(db)
+                label_id = _resolve(db, index, name)
+            if label_id not in ids:
+                ids.append(label_id)
+    return ids
+
+
+def label_names(db: Session, label_ids: Iterable[int]) -> list[str]:
+    """Names of the surviving labels; ids unknown to the index are read from the database."""
+    label_ids = list(label_ids)
+    index = get_index(db)
+    with index.lock:
+        unknown = {label_id for label_id in label_ids if label_id not in index.final}
+        if unknown:
+            _load_labels(db, index, PainLabel.id.in_(unknown))
+        finals = [index.final.get(label_id) for label_id in label_ids]
+        return [index.names[label_id] for label_id in finals if label_id in index.names]
+
+
+def active_labels(db: Session) -> dict[int, str]:
+    """Canonical (not merged) labels in creation order."""
+    return dict(sorted(get_index(db).names.items()))
+
+
+def relink(db: Session, label_ids: set[int] | None = None) -> int:
+    """
+    Recompute `pain_ids` (and `classification_pains`) of the classifications
+    linked to `label_ids`, or of all of them when None; does not commit.
+    """
+    query = select(Classification.id, Classification.pains, Classification.pain_ids)
+    if label_ids is not None:
+        linked = select(ClassificationPain.classification_id).where(ClassificationPain.pain_id.in_(label_ids))
+        query = query.where(Classification.id.in_(linked))
+    updates = []
+    for classification_id, pains, current in db.execute(query).all():
+        pain_ids = canonicalize(db, pains)
+        if pain_ids != current:
+            updates.append({"id": classification_id, "pain_ids": pain_ids})
+    if updates:
+        db.execute(update(Classification), updates)
+        sync_pains(db, {row["id"]: row["pain_ids"] for row in updates})
+    return len(updates)
+
+
+def backfill_pain_ids(db: Session, batch_size: int = 1000) -> None:
+    """Canonicalize classifications stored before `pain_ids` existed, oldest first."""
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Classification.id, Classification.pains)
+            .where(Classification.pain_ids.is_(None), Classification.id > last_id)
+            .order_by(Classification.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        pain_ids = {classification_id: canonicalize(db, pains) for classification_id, pains in rows}
+        db.execute(update(Classification), [{"id": key, "pain_ids": value} for key, value in pain_ids.items()])
+        sync_pains(db, pain_ids)
+        db.commit()
+        last_id = rows[-1][0]
+
+
+def list_rules(db: Session, status: str | None = None) -> list[PainRule]:
+    query = select(PainAlias).order_by(PainAlias.score.desc(), PainAlias.id)
+    if status:
+        query = query.where(PainAlias.status == status)
+    names = dict(db.execute(select(PainLabel.id, PainLabel.name)).all())
+    return [
+        PainRule(
+            id=rule.id,
+            alias=rule.alias,
+            label_id=rule.label_id,
+            label=names.get(rule.label_id, ""),
+            suggested_label_id=rule.suggested_label_id,
+            suggested_label=names.get(rule.suggested_label_id) if rule.suggested_label_id else None,
+            score=rule.score,
+            status=rule.status,
+        )
+        for rule in db.scalars(query).all()
+    ]
+
+
+def _review(db: Session, rule_id: int) -> PainAlias:
+    rule = db.get(PainAlias, rule_id)
+    if rule is None:
+        raise ValueError("Regla de pain no encontrada")
+    rule.reviewed_at = datetime.now(timezone.utc)
+    return rule
+
+
+def _finish_review(db: Session, rule: PainAlias, previous: int) -> PainRule:
+    from .pain_taxonomy import pain_taxonomy
+
+    db.flush()
+    invalidate(db)
+    relink(db, {previous})
+    db.commit()
+    pain_taxonomy.reset()
+    return next(item for item in list_rules(db) if item.id == rule.id)
+
+
+def approve_rule(db: Session, rule_id: int, label_id: int | None = None) -> PainRule:
+    """
+    Map the alias to `label_id` (default: its suggestion, or its current
+    label to confirm an automatic merge). A label left without aliases is
+    marked as merged into the target so it leaves the prompt and metrics.
+    """
+    rule = _review(db, rule_id)
+    target = label_id or rule.suggested_label_id or rule.label_id
+    if db.get(PainLabel, target) is None:
+        raise ValueError("Pain canónico no encontrado")
+    previous = rule.label_id
+    rule.label_id, rule.suggested_label_id, rule.status = target, None, "approved"
+    db.flush()
+    if previous != target and not db.scalar(select(PainAlias.id).where(PainAlias.label_id == previous).limit(1)):
+        db.execute(update(PainLabel).where(PainLabel.id == previous).values(merged_into_id=target))
+    return _finish_review(db, rule, previous)
+
+
+def reject_rule(db: Session, rule_id: int) -> PainRule:
+    """Keep the alias apart: drop its suggestion, or give an automatic merge its own label again."""
+    rule = _review(db, rule_id)
+    previous = rule.label_id
+    if rule.status in ("merged", "approved"):
+        label = PainLabel(name=rule.alias, key=normalize(rule.alias) or fold(rule.alias))
+        db.add(label)
+        db.flush()
+        rule.label_id = label.id
+    rule.suggested_label_id, rule.status = None, "rejected"
+    return _finish_review(db, rule, previous)
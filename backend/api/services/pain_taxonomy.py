@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models.database import SessionLocal
+from ..models.pain import PainLabel
+from .metrics import list_pains
+
+
+class PainTaxonomy:
+    """
+    In-process set of known pain categories, loaded from the database and
+    then extended by `save_classification`, so prompt building never scans
+    the `classifications` table.
+
+    Pains keep their first-seen order (the initial load is sorted), so new
+    categories are appended to the end of the list. The list is rendered in
+    the middle of the prompt head, so the prefix stays identical only up to
+    the last known pain; a new category invalidates everything after it.
+
+    Other processes write pains too: every read compares the newest label id
+    and the number of merged labels against the values seen at the last
+    load, and reloads when they moved. A reload keeps the known order.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pains: dict[str, None] | None = None
+        self._stamp: tuple[int | None, int] | None = None
+        self._prefixes: dict[Callable[[list[str]], str], str] = {}
+
+    @staticmethod
+    def _read_stamp(db: Session) -> tuple[int | None, int]:
+        last_id, merged = db.execute(select(func.max(PainLabel.id), func.count(PainLabel.merged_into_id))).one()
+        return last_id, merged
+
+    def _ensure_loaded(self) -> dict[str, None]:
+        db = SessionLocal()
+        try:
+            stamp = self._read_stamp(db)
+            if self._pains is not None and stamp == self._stamp:
+                return self._pains
+            loaded = dict.fromkeys(list_pains(db).pains)
+        finally:
+            db.close()
+        known = [pain for pain in self._pains or () if pain in loaded]
+        pains = dict.fromkeys([*known, *loaded])
+        if list(pains) != list(self._pains or ()):
+            self._prefixes.clear()
+        self._pains, self._stamp = pains, stamp
+        return self._pains
+
+    def pains(self) -> list[str]:
+        with self._lock:
+            return list(self._ensure_loaded())
+
+    def add(self, pains: Iterable[str] | None) -> bool:
+        """Record pains just written by a classification; returns True if any was new."""
+        with self._lock:
+            if self._pains is None:
+                return False
+            new = [pain for pain in pains or () if pain and pain not in self._pains]
+            if not new:
+                return False
+            self._pains.update(dict.fromkeys(new))
+            self._prefixes.clear()
+            return True
+
+    def prefix(self, render: Callable[[list[str]], str]) -> str:
+        """`render(pains)` memoized until the taxonomy changes."""
+        with self._lock:
+            pains = self._ensure_loaded()
+            if render not in self._prefixes:
+                self._prefixes[render] = render(list(pains))
+            return self._prefixes[render]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pains = self._stamp = None
+            self._prefixes.clear()
+
+
+pain_taxonomy = PainTaxonomy()
@@ -1,26 +1,59 @@
-import csv
+import asyncio
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from io import StringIO
-from typing import Iterable
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable
 
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from ..schemas.client import ClientCreate
 from ..schemas.transcript import TranscriptCreate
 from ..schemas.pipeline import CSVIngestResponse
-from .transcripts import upsert_transcript
-from .classify import classify_transcript
+from ..models.ingest_run import IngestRun
+from ..settings import settings
+from .bulk import PreparedRow, bulk_upsert, find_unchanged, prepare_row
+from .classify import iter_classifications, pending_transcripts
+from .ingest_runs import fingerprint_upload, start_run
+from .readers import AsyncReadable, iter_csv_record_batches, iter_csv_rows, iter_ndjson_rows, parse_records
+
+PARALLEL_CHUNK_ROWS = 1000
+DEFAULT_CLIENT_NAME = "Cliente sin nombre"
+TRUE_VALUES = ("1", "true", "yes", "y", "si")
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y")
+COLUMN_ALIASES: dict[str, list[str]] = {
+    "name": ["Nombre", "name"],
+    "email": ["Correo Electronico", "email", "Email"],
+    "phone": ["Numero de Telefono", "telefono", "phone"],
+    "closed": ["closed", "Cerrado"],
+    "assigned_seller": ["Vendedor asignado", "assigned_seller"],
+    "meeting_date": ["Fecha de la Reunion", "meeting_date"],
+    "transcript": ["Transcripcion", "transcript"],
+}
+FORMAT_EXTENSIONS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
 
 
 def _parse_bool(value: str | None) -> bool:
-    return str(value or "").strip().lower() in {"1", "true", "yes", "y", "si"}
+    return str(value or "").strip().lower() in TRUE_VALUES
 
 
 def _parse_datetime(value: str | None) -> datetime | None:
     if not value:
         return None
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y"):
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(value.strip(), fmt)
         except ValueError:
@@ -28,7 +61,7 @@ def _parse_datetime(value: str | None) -> datetime | None:
     return None
 
 
-def _value_from_row(row: dict[str, str], keys: list[str]) -> str | None:
+def _value_from_row(row: dict[str, str | None], keys: list[str]) -> str | None:
     for key in keys:
         if key in row and row[key] is not None:
             cleaned = row[key].strip()
@@ -37,46 +70,294 @@ def _value_from_row(row: dict[str, str], keys: list[str]) -> str | None:
     return None
 
 
-def _clean_row(row: dict[str, str]) -> tuple[ClientCreate, TranscriptCreate]:
+def _clean_row(row: dict[str, str | None]) -> tuple[ClientCreate, TranscriptCreate]:
     client_payload = ClientCreate(
-        name=_value_from_row(row, ["Nombre", "name"]) or "Cliente sin nombre",
-        email=_value_from_row(row, ["Correo Electronico", "email", "Email"]),
-        phone=_value_from_row(row, ["Numero de Telefono", "telefono", "phone"]),
+        name=_value_from_row(row, COLUMN_ALIASES["name"]) or DEFAULT_CLIENT_NAME,
+        email=_value_from_row(row, COLUMN_ALIASES["email"]),
+        phone=_value_from_row(row, COLUMN_ALIASES["phone"]),
     )
-    closed_raw = _value_from_row(row, ["closed", "Cerrado"])
+    closed_raw = _value_from_row(row, COLUMN_ALIASES["closed"])
     transcript_payload = TranscriptCreate(
-        assigned_seller=_value_from_row(row, ["Vendedor asignado", "assigned_seller"]),
-        meeting_date=_parse_datetime(_value_from_row(row, ["Fecha de la Reunion", "meeting_date"])),
+        assigned_seller=_value_from_row(row, COLUMN_ALIASES["assigned_seller"]),
+        meeting_date=_parse_datetime(_value_from_row(row, COLUMN_ALIASES["meeting_date"])),
         closed=_parse_bool(closed_raw) if closed_raw is not None else False,
-        transcript=_value_from_row(row, ["Transcripcion", "transcript"]),
+        transcript=_value_from_row(row, COLUMN_ALIASES["transcript"]),
     )
     return client_payload, transcript_payload
 
-async def ingest_csv(db: Session, upload: UploadFile) -> CSVIngestResponse:
-    content = await upload.read()
-    reader = csv.DictReader(StringIO(content.decode("utf-8")))
-    processed = 0
-    inserted_clients = 0
-    inserted_transcripts = 0
-    classified_transcripts = 0
-
-    for row in reader:
-        processed += 1
-        client_payload, transcript_payload = _clean_row(row)
-        transcript, client_created, transcript_created = upsert_transcript(
-            db, client_payload, transcript_payload
-        )
-        if client_created:
-            inserted_clients += 1
-        if transcript_created:
-            inserted_transcripts += 1
-        classification = classify_transcript(db, transcript.id)
-        if classification.created:
-            classified_transcripts += 1
-
-    return CSVIngestResponse(
-        processed_rows=processed,
-        inserted_clients=inserted_clients,
-        inserted_transcripts=inserted_transcripts,
-        classified_transcripts=classified_transcripts,
+
+def _prepare(row: dict[str, str | None]) -> PreparedRow:
+    return prepare_row(*_clean_row(row))
+
+
+def _prepare_records(fieldnames: list[str], records: list[str]) -> list[PreparedRow]:
+    """Process-pool task: parse, normalize and hash a chunk of raw CSV records."""
+    return [_prepare(row) for row in parse_records(fieldnames, records)]
+
+
+_executors: dict[int, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    """Process pool of `workers` processes, created once and shared by every request asking for that size."""
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = ProcessPoolExecutor(max_workers=workers)
+        return executor
+
+
+def _discard_executor(workers: int, executor: ProcessPoolExecutor) -> None:
+    with _executors_lock:
+        if _executors.get(workers) is executor:
+            del _executors[workers]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _iter_sources(
+    sources: Iterable[AsyncReadable] | AsyncIterable[AsyncReadable],
+) -> AsyncIterator[AsyncReadable]:
+    if hasattr(sources, "__aiter__"):
+        async for source in sources:
+            yield source
+    else:
+        for source in sources:
+            yield source
+
+
+async def iter_prepared_parallel(
+    sources: Iterable[AsyncReadable] | AsyncIterable[AsyncReadable],
+    workers: int | None = None,
+    chunk_rows: int = PARALLEL_CHUNK_ROWS,
+) -> AsyncIterator[PreparedRow]:
+    """
+    Fan parsing, normalization and hashing of one or more CSV sources out to a
+    shared process pool, yielding prepared rows in input order. At most two
+    chunks per worker are in flight, so memory stays bounded. If the consumer
+    stops early, chunks not yet started are cancelled and the ones running
+    finish in the pool without blocking the event loop.
+    """
+    workers = workers or settings.ingest_workers or os.cpu_count() or 1
+    executor = _executor(workers)
+    loop = asyncio.get_running_loop()
+    pending: deque[asyncio.Future[list[PreparedRow]]] = deque()
+    try:
+        async for source in _iter_sources(sources):
+            async for fieldnames, records in iter_csv_record_batches(source, chunk_rows):
+                pending.append(loop.run_in_executor(executor, _prepare_records, fieldnames, records))
+                if len(pending) >= workers * 2:
+                    for row in await pending.popleft():
+                        yield row
+        while pending:
+            for row in await pending.popleft():
+                yield row
+    except BrokenProcessPool:
+        await run_in_threadpool(_discard_executor, workers, executor)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def ingest_prepared(
+    db: Session,
+    rows: AsyncIterator[PreparedRow],
+    batch_size: int | None = None,
+    on_progress: Callable[[CSVIngestResponse], None] | None = None,
+    on_error: Callable[[int, Exception], None] | None = None,
+    run: IngestRun | None = None,
+    delta: bool = False,
+) -> CSVIngestResponse:
+    """
+    Store and classify streamed rows batch by batch.
+
+    Blocking DB work runs in the threadpool so the event loop stays
+    responsive, and each batch is classified concurrently under the Gemini
+    rate limiter. A failed classification is counted (and passed to
+    `on_error`) without rolling back or blocking the rows after it. With a `run`, the
+    committed and classified row offsets are checkpointed in the same
+    transactions as the data, and `rows` must start at `run.classified_rows`.
+    In `delta` mode, rows whose fingerprint is already stored are recognized
+    with one query per batch and skipped without any write (they are only
+    classified if they still lack a classification); a `retrying` run is
+    always replayed this way.
+    """
+    batch_size = batch_size or settings.ingest_batch_size
+    delta = delta or (run is not None and run.status == "retrying")
+    offset = run.classified_rows if run else 0
+    result = CSVIngestResponse(
+        processed_rows=0,
+        inserted_clients=0,
+        inserted_transcripts=0,
+        classified_transcripts=0,
+        skipped_rows=offset,
     )
+
+    def report() -> None:
+        if on_progress:
+            on_progress(result)
+
+    totals = ("inserted_clients", "inserted_transcripts", "classified_transcripts", "errors")
+    base = {field: getattr(run, field) for field in totals} if run else {}
+
+    def checkpoint(**offsets: int) -> None:
+        """Stage offsets and cumulative counters; they commit with the next data commit."""
+        if run is None:
+            return
+        for field, value in offsets.items():
+            setattr(run, field, value)
+        for field in totals:
+            setattr(run, field, base[field] + getattr(result, field))
+
+    def store(batch: list[PreparedRow], start: int) -> list[int | None]:
+        checkpoint(committed_rows=start + len(batch))
+        unchanged = find_unchanged(db, [row.fingerprint for row in batch]) if delta else {}
+        changed = [row for row in batch if row.fingerprint not in unchanged]
+        stored_ids, clients_created, transcripts_created = bulk_upsert(db, changed)
+        result.inserted_clients += clients_created
+        result.inserted_transcripts += transcripts_created
+        if delta:
+            result.unchanged_rows += len(batch) - len(changed)
+            result.new_rows += transcripts_created
+            result.changed_rows += max(sum(1 for item in stored_ids if item is not None) - transcripts_created, 0)
+
+        stored = iter(stored_ids)
+        transcript_ids = []
+        for row in batch:
+            if row.fingerprint in unchanged:
+                transcript_id, classified = unchanged[row.fingerprint]
+                transcript_ids.append(None if classified else transcript_id)
+            else:
+                transcript_ids.append(next(stored))
+        return transcript_ids
+
+    async def flush(batch: list[PreparedRow], start: int) -> None:
+        transcript_ids = await run_in_threadpool(store, batch, start)
+        report()
+        pending = await run_in_threadpool(pending_transcripts, db, [item for item in transcript_ids if item])
+        positions: dict[int, list[int]] = {}
+        for position, transcript_id in enumerate(transcript_ids, start=start + 1):
+            if transcript_id in pending:
+                positions.setdefault(transcript_id, []).append(position)
+        # The classified offset only advances over a contiguous prefix of finished rows.
+        waiting = {position for group in positions.values() for position in group}
+        classified_until = start
+
+        def advance() -> None:
+            nonlocal classified_until
+            end = start + len(batch)
+            while classified_until < end and classified_until + 1 not in waiting:
+                classified_until += 1
+            checkpoint(classified_rows=classified_until)
+
+        advance()
+        async for transcript_id, outcome in iter_classifications(db, pending):
+            if isinstance(outcome, Exception):
+                result.errors += 1
+                if run is not None:
+                    run.last_error = f"Fila {positions[transcript_id][0]}: {outcome}"
+                if on_error:
+                    on_error(transcript_id, outcome)
+            else:
+                result.classified_transcripts += 1
+            waiting.difference_update(positions[transcript_id])
+            advance()
+            report()
+        if run is not None:
+            await run_in_threadpool(db.commit)
+
+    try:
+        batch: list[PreparedRow] = []
+        async for row in rows:
+            result.processed_rows += 1
+            batch.append(row)
+            if len(batch) >= batch_size:
+                await flush(batch, offset)
+                offset += len(batch)
+                batch = []
+        if batch:
+            await flush(batch, offset)
+    except Exception as exc:
+        if run is not None:
+            db.rollback()
+            run.status = "failed"
+            run.last_error = str(exc)
+            db.commit()
+        raise
+    if run is not None:
+        run.status = "completed"
+        db.commit()
+    return result
+
+
+async def _prepare_after(rows: AsyncIterator[dict[str, str | None]], skip: int) -> AsyncIterator[PreparedRow]:
+    index = 0
+    async for row in rows:
+        index += 1
+        if index > skip:
+            yield _prepare(row)
+
+
+async def ingest_rows(
+    db: Session, rows: AsyncIterator[dict[str, str | None]], run: IngestRun | None = None, **options
+) -> CSVIngestResponse:
+    """Ingest raw rows, resuming after the rows `run` already classified."""
+    skip = run.classified_rows if run else 0
+    return await ingest_prepared(db, _prepare_after(rows, skip), run=run, **options)
+
+
+async def ingest_csv(
+    db: Session, upload: UploadFile, batch_size: int | None = None, resume: bool = True, delta: bool = False
+) -> CSVIngestResponse:
+    fingerprint = await fingerprint_upload(upload)
+    run = start_run(db, fingerprint, upload.filename, resume=resume)
+    return await ingest_rows(db, iter_csv_rows(upload), run=run, batch_size=batch_size, delta=delta)
+
+
+def detect_format(filename: str | None, requested: str | None = None) -> str:
+    if requested:
+        if requested not in FORMAT_EXTENSIONS.values():
+            raise ValueError(f"Formato no soportado: '{requested}'. Usa csv, ndjson, parquet o arrow")
+        return requested
+    suffix = os.path.splitext(filename or "")[1].lower()
+    if suffix not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Formato no soportado: '{suffix or filename}'. Usa CSV, NDJSON, Parquet o Arrow IPC")
+    return FORMAT_EXTENSIONS[suffix]
+
+
+async def ingest_upload(
+    db: Session,
+    upload: UploadFile,
+    fmt: str | None = None,
+    batch_size: int | None = None,
+    resume: bool = True,
+    delta: bool = False,
+) -> CSVIngestResponse:
+    """Ingest a CSV, NDJSON, Parquet or Arrow IPC upload through the same store/classify stages."""
+    fmt = detect_format(upload.filename, fmt)
+    if fmt == "csv":
+        return await ingest_csv(db, upload, batch_size=batch_size, resume=resume, delta=delta)
+    if fmt == "ndjson":
+        fingerprint = await fingerprint_upload(upload)
+        run = start_run(db, fingerprint, upload.filename, resume=resume)
+        return await ingest_rows(db, iter_ndjson_rows(upload), run=run, batch_size=batch_size, delta=delta)
+
+    from .columnar import iter_columnar_prepared, require_pyarrow
+
+    require_pyarrow()
+    fingerprint = await fingerprint_upload(upload)
+    run = start_run(db, fingerprint, upload.filename, resume=resume)
+    rows = iter_columnar_prepared(upload.file, fmt, skip=run.classified_rows)
+    return await ingest_prepared(db, rows, run=run, batch_size=batch_size, delta=delta)
+
+
+async def ingest_files(
+    db: Session,
+    sources: Iterable[AsyncReadable] | AsyncIterable[AsyncReadable],
+    workers: int | None = None,
+    batch_size: int | None = None,
+    delta: bool = False,
+) -> CSVIngestResponse:
+    """Ingest several CSV sources with multi-core parsing and a single batching writer."""
+    return await ingest_prepared(db, iter_prepared_parallel(sources, workers), batch_size=batch_size, delta=delta)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+
+from ..settings import settings
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket of `per_minute` units.
+
+    `reserve` takes the units immediately, letting the balance go negative,
+    and returns how long the caller must wait before using them. Callers are
+    therefore served in arrival order and the state is guarded by a plain
+    lock, so one bucket can be shared by coroutines and worker threads.
+    """
+
+    def __init__(self, per_minute: float, burst: float | None = None) -> None:
+        self.rate = per_minute / 60
+        self.capacity = burst if burst is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def try_take(self, amount: float = 1) -> bool:
+        """Take `amount` only if available right now, like a server enforcing its quota."""
+        with self._lock:
+            self._refill()
+            if self._tokens < amount:
+                return False
+            self._tokens -= amount
+            return True
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute quota enforced together."""
+
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def reserve(self, tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    async def acquire(self, tokens: int) -> None:
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def acquire_blocking(self, tokens: int) -> None:
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+
+def backoff_delay(attempt: int, base: float = 2.0, cap: float = 60.0) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+_limiter: RateLimiter | None = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter sized to the configured Gemini quota."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(settings.gemini_rpm, settings.gemini_tpm)
+    return _limiter
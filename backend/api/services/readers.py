@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import json
+import zipfile
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, Protocol
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 64 * 1024
+
+
+class AsyncReadable(Protocol):
+    async def read(self, size: int = -1) -> bytes: ...
+
+
+class FileSource:
+    """Async `read` over a blocking binary file, executed in the threadpool."""
+
+    def __init__(self, handle: BinaryIO) -> None:
+        self._handle = handle
+
+    async def read(self, size: int = -1) -> bytes:
+        return await run_in_threadpool(self._handle.read, size)
+
+
+async def iter_text_chunks(
+    upload: AsyncReadable, chunk_size: int = CHUNK_SIZE, encoding: str = "utf-8-sig"
+) -> AsyncIterator[str]:
+    """Read the upload in fixed-size chunks, decoding multi-byte characters safely."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def iter_csv_records(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Group physical lines into complete CSV records.
+
+    A record is complete once it contains an even number of quote characters,
+    so quoted fields with embedded newlines (e.g. `Transcripcion`) survive
+    chunk boundaries. Only the current record is ever held in memory.
+    """
+    pending = ""
+    record: list[str] = []
+    quotes = 0
+    async for text in chunks:
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            record.append(line)
+            record.append("\n")
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                yield "".join(record)
+                record.clear()
+                quotes = 0
+    if pending:
+        record.append(pending)
+    if record:
+        yield "".join(record)
+
+
+def _record_to_row(fieldnames: list[str], values: list[str]) -> dict[str, str | None]:
+    row: dict[str, str | None] = dict(zip(fieldnames, values))
+    for key in fieldnames[len(values):]:
+        row[key] = None
+    return row
+
+
+def parse_records(fieldnames: list[str], records: list[str]) -> Iterator[dict[str, str | None]]:
+    """Parse raw records produced by `iter_csv_records` (e.g. inside a worker process)."""
+    for values in csv.reader(records):
+        if values:
+            yield _record_to_row(fieldnames, values)
+
+
+async def iter_csv_record_batches(
+    upload: AsyncReadable, batch_size: int, chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[tuple[list[str], list[str]]]:
+    """Yield `(fieldnames, raw_records)` batches without parsing the records."""
+    fieldnames: list[str] | None = None
+    batch: list[str] = []
+    async for record in iter_csv_records(iter_text_chunks(upload, chunk_size)):
+        if fieldnames is None:
+            fieldnames = next(csv.reader([record]), []) or None
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield fieldnames, batch
+            batch = []
+    if batch and fieldnames:
+        yield fieldnames, batch
+
+
+async def iter_csv_rows(
+    upload: AsyncReadable, chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[dict[str, str | None]]:
+    """Stream `csv.DictReader`-compatible rows from an upload with bounded memory."""
+    fieldnames: list[str] | None = None
+    async for record in iter_csv_records(iter_text_chunks(upload, chunk_size)):
+        values = next(csv.reader([record]), [])
+        if not values:
+            continue
+        if fieldnames is None:
+            fieldnames = values
+            continue
+        yield _record_to_row(fieldnames, values)
+
+
+def _ndjson_value(value: object) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+async def iter_ndjson_rows(
+    upload: AsyncReadable, chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[dict[str, str | None]]:
+    """Stream one row per JSON line, with values stringified like CSV cells."""
+    pending = ""
+    async for text in iter_text_chunks(upload, chunk_size):
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield {key: _ndjson_value(value) for key, value in json.loads(line).items()}
+    if pending.strip():
+        yield {key: _ndjson_value(value) for key, value in json.loads(pending).items()}
+
+
+async def iter_upload_sources(upload: UploadFile) -> AsyncIterator[AsyncReadable]:
+    """Yield the upload itself, or each CSV member when it is a zip archive; file I/O runs in the threadpool."""
+    is_zip = await run_in_threadpool(zipfile.is_zipfile, upload.file)
+    await run_in_threadpool(upload.file.seek, 0)
+    if not is_zip:
+        yield upload
+        return
+    archive = await run_in_threadpool(zipfile.ZipFile, upload.file)
+    try:
+        for member in archive.infolist():
+            if member.is_dir() or not member.filename.lower().endswith(".csv"):
+                continue
+            handle = await run_in_threadpool(archive.open, member)
+            try:
+                yield FileSource(handle)
+            finally:
+                await run_in_threadpool(handle.close)
+    finally:
+        await run_in_threadpool(archive.close)
+
+
+async def iter_uploads_sources(uploads: Iterable[UploadFile]) -> AsyncIterator[AsyncReadable]:
+    """`iter_upload_sources` over several uploads, in order."""
+    for upload in uploads:
+        async for source in iter_upload_sources(upload):
+            yield source
\ No newline at end of file
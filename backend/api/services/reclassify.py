@@ -0,0 +1,241 @@
+"""
+Offline reclassification campaign for a new prompt or model version.
+
+    api-reclassify --stale                  # everything not classified by the current PROMPT_VERSION
+    api-reclassify --ids 4 8 15 --no-swap   # stage only, swap later with --swap-only
+    api-reclassify --seller Toro --limit 200
+
+Targets are staged in `reclassification_results` in priority order (open
+opportunities first, then the most likely to close and the most recent).
+Answers are written there chunk by chunk, so stopping the command and
+running it again resumes where it left off. Once every target is answered,
+all new classifications replace the old ones in a single transaction, so
+dashboards never read a half-migrated mix.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from hashlib import sha256
+from typing import Callable
+
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..models.classification import Classification
+from ..models.reclassification import ReclassificationResult, ReclassificationRun
+from ..models.transcript import Transcript
+from ..schemas.classification import ClassificationBase
+from . import classification_cache
+from .classify import iter_payloads, save_classifications
+from .llm_classifier import MODEL_NAME, PROMPT_VERSION
+
+CHUNK_SIZE = 50
+
+
+def select_targets(
+    db: Session,
+    transcript_ids: list[int] | None = None,
+    stale: bool = False,
+    seller: str | None = None,
+    limit: int | None = None,
+) -> list[int]:
+    """Transcript ids with text matching the selection, open opportunities first."""
+    query = (
+        select(Transcript.id)
+        .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+        .where(Transcript.transcript.is_not(None), Transcript.transcript != "")
+        .order_by(
+            Transcript.closed.asc(),
+            Classification.close_probability.desc().nulls_last(),
+            Transcript.meeting_date.desc().nulls_last(),
+            Transcript.id,
+        )
+    )
+    if transcript_ids:
+        query = query.where(Transcript.id.in_(transcript_ids))
+    if stale:
+        query = query.where(or_(Classification.prompt_version.is_(None), Classification.prompt_version != PROMPT_VERSION))
+    if seller:
+        query = query.where(Transcript.assigned_seller == seller)
+    if limit:
+        query = query.limit(limit)
+    return list(db.scalars(query).all())
+
+
+def start_campaign(
+    db: Session, selection: dict, resume: bool = True, retry_failed: bool = True
+) -> ReclassificationRun:
+    """
+    Return the campaign for this selection and the current model and prompt
+    version. An unswapped one is resumed (retrying its failed items unless
+    `retry_failed` is False); otherwise the targets are selected and staged
+    again.
+    """
+    fingerprint = sha256(
+        json.dumps([MODEL_NAME, PROMPT_VERSION, selection], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    run = db.scalar(select(ReclassificationRun).where(ReclassificationRun.fingerprint == fingerprint))
+    if run is not None and resume and run.status != "swapped":
+        if retry_failed:
+            db.execute(
+                update(ReclassificationResult)
+                .where(ReclassificationResult.run_id == run.id, ReclassificationResult.error.is_not(None))
+                .values(error=None)
+            )
+            run.failed = 0
+            run.status = "running"
+        db.commit()
+        return run
+
+    if run is None:
+        run = ReclassificationRun(
+            fingerprint=fingerprint, model=MODEL_NAME, prompt_version=PROMPT_VERSION, selection=selection
+        )
+        db.add(run)
+    else:
+        db.execute(delete(ReclassificationResult).where(ReclassificationResult.run_id == run.id))
+        run.swapped_at = None
+    targets = select_targets(db, **selection)
+    run.status = "running"
+    run.total, run.processed, run.failed = len(targets), 0, 0
+    db.flush()
+    if targets:
+        db.execute(
+            insert(ReclassificationResult),
+            [
+                {"run_id": run.id, "transcript_id": transcript_id, "position": position}
+                for position, transcript_id in enumerate(targets)
+            ],
+        )
+    db.commit()
+    return run
+
+
+def _pending(db: Session, run: ReclassificationRun, size: int) -> dict[int, str]:
+    rows = db.execute(
+        select(ReclassificationResult.transcript_id, Transcript.transcript)
+        .join(Transcript, Transcript.id == ReclassificationResult.transcript_id)
+        .where(
+            ReclassificationResult.run_id == run.id,
+            ReclassificationResult.payload.is_(None),
+            ReclassificationResult.error.is_(None),
+        )
+        .order_by(ReclassificationResult.position)
+        .limit(size)
+    ).all()
+    return dict(rows)
+
+
+async def run_campaign(
+    db: Session,
+    run: ReclassificationRun,
+    chunk_size: int = CHUNK_SIZE,
+    concurrency: int | None = None,
+    on_progress: Callable[[ReclassificationRun], None] | None = None,
+) -> ReclassificationRun:
+    """
+    Answer every pending target, `chunk_size` at a time, through the
+    classification cache and the rate-limited LLM (the local pre-classifier
+    is skipped: its labels do not depend on the prompt). Each chunk's
+    answers and cache entries are committed together as the checkpoint.
+    """
+    while pending := _pending(db, run, chunk_size):
+        staged, to_cache, failed = [], {}, 0
+        async for transcript_id, outcome, source, digest in iter_payloads(db, pending, concurrency, local=False):
+            row = {"run_id": run.id, "transcript_id": transcript_id, "source": source, "payload": None, "error": None}
+            try:
+                if isinstance(outcome, Exception):
+                    raise outcome
+                row["payload"] = ClassificationBase.model_validate(outcome).model_dump()
+            except Exception as exc:
+                row["error"] = str(exc) or exc.__class__.__name__
+                failed += 1
+            else:
+                if digest is not None:
+                    to_cache[digest] = row["payload"]
+            staged.append(row)
+        db.execute(update(ReclassificationResult), staged)
+        classification_cache.store_many(db, to_cache)
+        run.processed += len(staged) - failed
+        run.failed += failed
+        db.commit()
+        if on_progress:
+            on_progress(run)
+    run.status = "ready"
+    db.commit()
+    return run
+
+
+def swap(db: Session, run: ReclassificationRun) -> int:
+    """Replace the classifications of every answered target in one transaction; returns how many."""
+    if _pending(db, run, 1):
+        raise ValueError("La campaña aún tiene transcritos pendientes")
+    rows = db.execute(
+        select(ReclassificationResult.transcript_id, ReclassificationResult.payload, ReclassificationResult.source)
+        .where(ReclassificationResult.run_id == run.id, ReclassificationResult.payload.is_not(None))
+    ).all()
+    results = {
+        transcript_id: (ClassificationBase.model_validate(payload), source or "llm")
+        for transcript_id, payload, source in rows
+    }
+    existing = dict(
+        db.execute(
+            select(Classification.transcript_id, Classification.id).where(
+                Classification.transcript_id.in_(results)
+            )
+        ).all()
+    )
+    run.status = "swapped"
+    run.swapped_at = datetime.now(timezone.utc)
+    try:
+        save_classifications(db, results, existing)
+    except Exception:
+        db.rollback()
+        raise
+    return len(results)
+
+
+def main() -> None:
+    from ..models.database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", type=int, nargs="+", help="only these transcript ids")
+    parser.add_argument("--stale", action="store_true", help="only transcripts not classified by the current prompt")
+    parser.add_argument("--seller", help="only transcripts of this seller")
+    parser.add_argument("--limit", type=int, help="at most this many transcripts")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="transcripts per checkpoint")
+    parser.add_argument("--concurrency", type=int, help="requests in flight (default CLASSIFY_CONCURRENCY)")
+    parser.add_argument("--restart", action="store_true", help="discard the staged answers and start over")
+    parser.add_argument("--no-swap", action="store_true", help="stage the answers without replacing classifications")
+    parser.add_argument("--swap-only", action="store_true", help="replace classifications with a finished campaign")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        selection = {"transcript_ids": args.ids, "stale": args.stale, "seller": args.seller, "limit": args.limit}
+        run = start_campaign(db, selection, resume=not args.restart, retry_failed=not args.swap_only)
+        print(f"Campaña {run.id} ({run.model}, prompt {run.prompt_version}): {run.total} transcritos")
+        if not args.swap_only:
+            started = time.perf_counter()
+
+            def progress(run: ReclassificationRun) -> None:
+                done = run.processed + run.failed
+                rate = done / max(time.perf_counter() - started, 1e-9)
+                print(f"  {done}/{run.total} ({run.failed} con error, {rate:.1f}/s)", flush=True)
+
+            asyncio.run(run_campaign(db, run, args.chunk, args.concurrency, progress))
+        if args.no_swap:
+            print("Respuestas guardadas; ejecuta con --swap-only para aplicarlas")
+            return
+        print(f"Reemplazadas {swap(db, run)} clasificaciones ({run.failed} conservan la anterior por error)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
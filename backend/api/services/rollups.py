@@ -0,0 +1,225 @@
+"""
+Incrementally maintained dashboard counters (`metric_rollups`).
+
+Every write path takes a `snapshot` of the transcripts it is about to
+change and calls `refresh` with it before committing, so the rollups move
+by the difference in the same transaction. The snapshot locks those
+transcripts until the commit, so concurrent writers to the same rows are
+serialized instead of both subtracting the same "before" state. If the
+rollups drift (e.g. after a manual SQL edit), rebuild them from the raw rows:
+
+    api-rebuild-rollups
+"""
+from __future__ import annotations
+
+import json
+from collections import defaultdict
+from typing import Iterable
+
+from sqlalchemy import delete, exists, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models.classification import Classification
+from ..models.client import Client
+from ..models.metric_rollup import MetricRollup
+from ..models.transcript import Transcript
+from . import metrics_cache
+
+DIMENSIONS = ("clients", "stage", "month", "seller", "urgency_budget", "use_case", "sentiment", "origin", "automatization")
+CHUNK_SIZE = 1000
+
+Deltas = dict[tuple[str, str], list[int]]
+
+_COLUMNS = (
+    Transcript.id,
+    Transcript.meeting_date,
+    Transcript.assigned_seller,
+    Transcript.closed,
+    Classification.id,
+    Classification.fit_score,
+    Classification.urgency,
+    Classification.budget_tier,
+    Classification.use_case,
+    Classification.sentiment,
+    Classification.origin,
+    Classification.automatization,
+)
+
+
+def _bucket(*values) -> str:
+    return json.dumps(values, ensure_ascii=False)
+
+
+def stage(classification_id: int | None, fit_score: float | None) -> str:
+    """Funnel stage of a transcript, with the thresholds of `/metrics/funnel`."""
+    if classification_id is None:
+        return "discovery"
+    if fit_score < 0.6:
+        return "evaluation"
+    if fit_score < 0.8:
+        return "negotiation"
+    return "qualified"
+
+
+def _collect(rows: Iterable[tuple], deltas: Deltas | None = None, sign: int = 1) -> Deltas:
+    deltas = deltas if deltas is not None else defaultdict(lambda: [0, 0])
+    for _, meeting_date, seller, closed, classification_id, fit, urgency, budget, use_case, sentiment, origin, automated in rows:
+        keys = [("stage", _bucket(stage(classification_id, fit))), ("seller", _bucket(seller))]
+        if meeting_date is not None:
+            keys.append(("month", _bucket(meeting_date.strftime("%Y-%m"))))
+        if classification_id is not None:
+            keys += [
+                ("urgency_budget", _bucket(urgency, budget)),
+                ("use_case", _bucket(use_case)),
+                ("sentiment", _bucket(sentiment)),
+                ("origin", _bucket(origin)),
+                ("automatization", _bucket(automated)),
+            ]
+        for key in keys:
+            deltas[key][0] += sign
+            deltas[key][1] += sign if closed else 0
+    return deltas
+
+
+def _rows(db: Session, transcript_ids: list[int], lock: bool = False) -> list[tuple]:
+    rows = []
+    for start in range(0, len(transcript_ids), CHUNK_SIZE):
+        query = (
+            select(*_COLUMNS)
+            .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+            .where(Transcript.id.in_(transcript_ids[start : start + CHUNK_SIZE]))
+        )
+        if lock:
+            query = query.order_by(Transcript.id).with_for_update(of=Transcript)
+        rows += db.execute(query).all()
+    return rows
+
+
+def _begin_immediate(db: Session) -> None:
+    """SQLite has no row locks: take the database write lock unless this transaction already holds one."""
+    connection = db.connection()
+    if not getattr(connection.connection.dbapi_connection, "in_transaction", True):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def snapshot(db: Session, transcript_ids: Iterable[int]) -> list[tuple]:
+    """
+    Current state of the transcripts a write is about to change, for
+    `refresh`. The rows stay locked until the caller commits: `FOR UPDATE`
+    on Postgres, `BEGIN IMMEDIATE` on SQLite.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        _begin_immediate(db)
+        return _rows(db, sorted(set(transcript_ids)))
+    return _rows(db, sorted(set(transcript_ids)), lock=True)
+
+
+def refresh(db: Session, transcript_ids: Iterable[int], before: list[tuple] | None = None) -> None:
+    """Move the rollups by the difference between `before` and the current (flushed) state; does not commit."""
+    transcript_ids = sorted(set(transcript_ids))
+    deltas = _collect(before or (), sign=-1)
+    _collect(_rows(db, transcript_ids), deltas)
+    _apply(db, deltas)
+    metrics_cache.touch(db, transcript_ids)
+
+
+def add_clients(db: Session, count: int) -> None:
+    if count:
+        _apply(db, {("clients", _bucket()): [count, 0]})
+
+
+def _apply(db: Session, deltas: Deltas) -> None:
+    rows = [
+        {"dimension": dimension, "bucket": bucket, "total": total, "closed": closed}
+        for (dimension, bucket), (total, closed) in deltas.items()
+        if total or closed
+    ]
+    if not rows:
+        return
+    dialect_insert = {"postgresql": pg_insert, "sqlite": sqlite_insert}.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(MetricRollup)
+        statement = statement.on_conflict_do_update(
+            index_elements=["dimension", "bucket"],
+            set_={
+                "total": MetricRollup.total + statement.excluded.total,
+                "closed": MetricRollup.closed + statement.excluded.closed,
+            },
+        )
+        db.execute(statement, rows)
+        return
+    for row in rows:
+        key = (MetricRollup.dimension == row["dimension"], MetricRollup.bucket == row["bucket"])
+        if db.scalar(select(exists().where(*key))):
+            db.execute(
+                update(MetricRollup)
+                .where(*key)
+                .values(total=MetricRollup.total + row["total"], closed=MetricRollup.closed + row["closed"])
+            )
+        else:
+            db.execute(insert(MetricRollup).values(**row))
+
+
+def read(db: Session, dimensions: Iterable[str] = DIMENSIONS) -> dict[str, list[tuple[list, int, int]]]:
+    """Non-empty buckets of the given dimensions as `(key, total, closed)`, in one query."""
+    result: dict[str, list[tuple[list, int, int]]] = {dimension: [] for dimension in dimensions}
+    rows = db.execute(
+        select(MetricRollup.dimension, MetricRollup.bucket, MetricRollup.total, MetricRollup.closed).where(
+            MetricRollup.dimension.in_(result), MetricRollup.total != 0
+        )
+    ).all()
+    for dimension, bucket, total, closed in rows:
+        result[dimension].append((json.loads(bucket), total, closed))
+    return result
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every rollup from the raw rows in one transaction; returns the number of buckets."""
+    deltas: Deltas = defaultdict(lambda: [0, 0])
+    last_id = 0
+    while rows := db.execute(
+        select(*_COLUMNS)
+        .outerjoin(Classification, Classification.transcript_id == Transcript.id)
+        .where(Transcript.id > last_id)
+        .order_by(Transcript.id)
+        .limit(CHUNK_SIZE)
+    ).all():
+        _collect(rows, deltas)
+        last_id = rows[-1][0]
+    clients = db.scalar(select(func.count(Client.id))) or 0
+    if clients:
+        deltas[("clients", _bucket())] = [clients, 0]
+    db.execute(delete(MetricRollup))
+    records = [
+        {"dimension": dimension, "bucket": bucket, "total": total, "closed": closed}
+        for (dimension, bucket), (total, closed) in deltas.items()
+    ]
+    if records:
+        db.execute(insert(MetricRollup), records)
+    db.commit()
+    return len(records)
+
+
+def ensure(db: Session) -> None:
+    """Build the rollups when the table was just created over existing data."""
+    if db.scalar(select(exists().where(MetricRollup.total.is_not(None)))):
+        return
+    if db.scalar(select(exists().where(Client.id.is_not(None)))):
+        rebuild(db)
+
+
+def main() -> None:
+    from ..models.database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        print(f"Rollups reconstruidos: {rebuild(db)} buckets")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+import unicodedata
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents, keeping `ñ` (it is a separate letter in Spanish)."""
+    return "".join(
+        char for char in unicodedata.normalize("NFKD", text.lower().replace("ñ", "\0")) if not unicodedata.combining(char)
+    ).replace("\0", "ñ")
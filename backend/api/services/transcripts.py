@@ -7,12 +7,13 @@ from sqlalchemy.orm import Session
 
 from ..models.classification import Classification
 from ..models.client import Client
-from ..models.transcript import Transcript
+from ..models.transcript import Transcript, content_hash, row_fingerprint
 from ..schemas.classification import ClassificationBase
 from ..schemas.client import ClientCreate
 from ..schemas.transcript import TranscriptCreate
 
 
+from . import rollups
 from .clients import upsert_client
 
 
@@ -40,11 +41,13 @@ def upsert_transcript(
     if transcript is None and payload.transcript:
         transcript = db.scalar(
             select(Transcript).where(
-                Transcript.client_id == client.id, Transcript.transcript == payload.transcript
+                Transcript.client_id == client.id,
+                Transcript.content_hash == content_hash(payload.transcript),
             )
         )
     transcript_created = False
     data = payload.model_dump()
+    before = rollups.snapshot(db, [transcript.id]) if transcript else None
     if transcript:
         for field, value in data.items():
             if value is not None:
@@ -56,6 +59,18 @@ def upsert_transcript(
         transcript = Transcript(client_id=client.id, **create_data)
         db.add(transcript)
         transcript_created = True
+    # Keep the bulk path's unchanged-row check in step with single upserts.
+    transcript.row_fingerprint = row_fingerprint(
+        client.name,
+        client.email_hash,
+        client.phone_hash,
+        transcript.assigned_seller,
+        transcript.meeting_date,
+        bool(transcript.closed),
+        transcript.content_hash,
+    )
+    db.flush()
+    rollups.refresh(db, [transcript.id], before)
     db.commit()
     db.refresh(transcript)
     return transcript, client_created, transcript_created
\ No newline at end of file
@@ -10,6 +10,30 @@ class Settings(BaseSettings):
     google_api_key: str | None = None
     frontend_origin: str | None = "http://localhost:5173"
     database_url: str | None = None
+    ingest_batch_size: int = 500
+    ingest_workers: int | None = None
+    llm_backend: str = "gemini"
+    llm_fake_url: str = "http://127.0.0.1:8765"
+    llm_cassette_dir: str | None = None
+    llm_cassette_mode: str = "replay"
+    gemini_rpm: int = 15
+    gemini_tpm: int = 250_000
+    classify_concurrency: int = 8
+    classify_concurrency_max: int = 32
+    circuit_failure_threshold: int = 5
+    circuit_reset_seconds: float = 30.0
+    classify_pack_tokens: int = 0
+    classify_pack_max_items: int = 10
+    transcript_token_budget: int = 1500
+    pain_merge_threshold: float = 0.8
+    pain_review_threshold: float = 0.5
+    local_classifier_threshold: float = 0.0
+    local_classifier_min_samples: int = 50
+    classification_cache_max_entries: int = 50_000
+    classification_cache_max_age_days: int = 180
+    metrics_cache_max_bytes: int = 8_000_000
+    metrics_cache_max_entries: int = 512
+    metrics_crossfilter: bool = True
 
     model_config = SettingsConfigDict(env_file=ENV_FILE, env_file_encoding="utf-8", extra="ignore")
 
@@ -0,0 +1,65 @@
+"""
+End-to-end classification throughput against the local fake LLM server.
+
+Starts `api.services.fake_llm_server` in-process with the given latency and
+per-minute quota, points the classifier at it and classifies synthetic
+transcripts through `classify_concurrently`, with and without packing:
+
+    python -m benchmarks.classify_throughput [count] [rpm] [latency_s]
+
+No network access or API key is needed.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/benchmark.db")
+
+
+async def _classify(count: int, pack_tokens: int) -> tuple[int, int]:
+    from api.services.llm_classifier import classify_concurrently
+
+    items = [(index, f"Reunión {index}: necesitamos automatizar la atención por WhatsApp.") for index in range(count)]
+    ok = failed = 0
+    async for _, outcome in classify_concurrently(items, pack_tokens=pack_tokens):
+        if isinstance(outcome, Exception):
+            failed += 1
+        else:
+            ok += 1
+    return ok, failed
+
+
+def main(count: int, rpm: int, latency: float) -> None:
+    from api.models.database import init_db
+    from api.services import llm_backends, llm_health, rate_limit
+    from api.services.fake_llm_server import serve
+    from api.settings import settings
+
+    init_db()
+    server = serve(latency=latency, jitter=latency / 4, rpm=rpm)
+    settings.llm_backend, settings.llm_fake_url, settings.llm_cassette_dir = "fake", server.url, None
+    settings.gemini_rpm = rpm
+    print(f"transcripts={count} quota={rpm}rpm latency={latency}s concurrency={settings.classify_concurrency}")
+    print(f"{'mode':>10} {'ok':>6} {'failed':>7} {'seconds':>8} {'per_min':>8} {'requests':>9} {'429s':>6} {'limit':>6}")
+    for label, pack_tokens in (("single", 0), ("packed", 8000)):
+        llm_backends.get_backend.cache_clear()
+        rate_limit._limiter = None
+        llm_health._controller = llm_health._breaker = None
+        before = dict(server.stats)
+        started = time.perf_counter()
+        ok, failed = asyncio.run(_classify(count, pack_tokens))
+        elapsed = time.perf_counter() - started
+        requests = server.stats["served"] - before["served"]
+        limited = server.stats["rate_limited"] - before["rate_limited"]
+        print(f"{label:>10} {ok:>6} {failed:>7} {elapsed:>8.1f} {ok * 60 / elapsed:>8.0f} {requests:>9} {limited:>6} {llm_health.get_controller().current():>6}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 60, int(args[1]) if len(args) > 1 else 120, float(args[2]) if len(args) > 2 else 0.3)
@@ -0,0 +1,90 @@
+"""
+Peak RSS of the streaming CSV reader for growing input sizes.
+
+Each size runs in a fresh subprocess so `ru_maxrss` reflects only that run:
+
+    python -m benchmarks.ingest_memory 10 100 1000
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+HEADER = "Nombre,Correo Electronico,Numero de Telefono,Fecha de la Reunion,Vendedor asignado,closed,Transcripcion\n"
+ROW = (
+    'Cliente {i},cliente{i}@example.com,569{i:08d},2024-03-15,Toro,1,'
+    '"Linea uno de la reunion {i}.\nLinea dos con ""comillas"" y acentos: atención, reunión.\n'
+    + "Volumen de consultas repetitivas. " * 20
+    + '"\n'
+)
+
+
+def _write_fixture(path: Path, size_mb: int) -> None:
+    target = size_mb * 1024 * 1024
+    written = 0
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write(HEADER)
+        i = 0
+        while written < target:
+            line = ROW.format(i=i)
+            handle.write(line)
+            written += len(line)
+            i += 1
+
+
+class _FileUpload:
+    def __init__(self, path: Path) -> None:
+        self._handle = path.open("rb")
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._handle.read(size)
+
+
+async def _consume(path: Path) -> int:
+    from api.services.readers import iter_csv_rows
+
+    rows = 0
+    async for _ in iter_csv_rows(_FileUpload(path)):
+        rows += 1
+    return rows
+
+
+def _measure(path: Path) -> None:
+    started = time.perf_counter()
+    rows = asyncio.run(_consume(path))
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{rows}\t{elapsed:.2f}\t{peak_mb:.1f}")
+
+
+def main(sizes: list[int]) -> None:
+    print(f"{'size_mb':>8} {'rows':>10} {'seconds':>8} {'peak_rss_mb':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in sizes:
+            path = Path(tmp) / f"ingest_{size_mb}mb.csv"
+            _write_fixture(path, size_mb)
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.ingest_memory", "--measure", str(path)],
+                check=True,
+                capture_output=True,
+                text=True,
+                cwd=Path(__file__).resolve().parents[1],
+            ).stdout.strip()
+            rows, seconds, peak = output.split("\t")
+            print(f"{size_mb:>8} {rows:>10} {seconds:>8} {peak:>12}")
+            path.unlink()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--measure":
+        _measure(Path(sys.argv[2]))
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or [10, 100, 1000])
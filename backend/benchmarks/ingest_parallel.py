@@ -0,0 +1,51 @@
+"""
+Rows/sec of the parallel parse/normalize/hash stage for 1, 2, 4 and 8 workers.
+
+    python -m benchmarks.ingest_parallel [size_mb]
+
+The writer stage is excluded: it is a single batching consumer whose cost
+depends on the database, not on the number of workers.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from benchmarks.ingest_memory import _FileUpload, _write_fixture  # noqa: E402
+
+WORKER_COUNTS = (1, 2, 4, 8)
+
+
+async def _consume(path: Path, workers: int) -> int:
+    from api.services.pipeline import iter_prepared_parallel
+
+    rows = 0
+    async for _ in iter_prepared_parallel([_FileUpload(path)], workers=workers):
+        rows += 1
+    return rows
+
+
+def main(size_mb: int) -> None:
+    print(f"cpus={os.cpu_count()} input={size_mb}MB")
+    print(f"{'workers':>8} {'rows':>10} {'seconds':>8} {'rows_per_s':>11} {'speedup':>8}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "ingest.csv"
+        _write_fixture(path, size_mb)
+        for workers in WORKER_COUNTS:
+            started = time.perf_counter()
+            rows = asyncio.run(_consume(path, workers))
+            elapsed = time.perf_counter() - started
+            rate = rows / elapsed
+            baseline = baseline or rate
+            print(f"{workers:>8} {rows:>10} {elapsed:>8.2f} {rate:>11.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,43 @@
+"""
+Agreement of the local pre-classifier with the stored LLM labels.
+
+Trains on a random 80% of the LLM-labelled classifications in the configured
+database, predicts the remaining 20% and, for each confidence threshold,
+reports the share of LLM calls that would be avoided and the per-field
+agreement on the transcripts kept locally:
+
+    python -m benchmarks.local_classifier [threshold ...]
+"""
+from __future__ import annotations
+
+import os
+import sys
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+
+def main(thresholds: list[float]) -> None:
+    from api.models.database import SessionLocal, init_db
+    from api.services.local_classifier import CATEGORICAL_FIELDS, evaluate, training_rows
+
+    init_db()
+    db = SessionLocal()
+    try:
+        texts, payloads = training_rows(db)
+    finally:
+        db.close()
+    if len(texts) < 10:
+        sys.exit(f"Only {len(texts)} LLM-labelled transcripts; classify more before benchmarking.")
+
+    train, test, trained, predicted, rows = evaluate(texts, payloads, thresholds)
+    print(f"train={train} test={test} fit={trained:.2f}s predict={predicted * 1000 / max(test, 1):.2f}ms/transcript")
+    print(f"{'threshold':>9} {'avoided':>8} " + " ".join(f"{name[:10]:>10}" for name in CATEGORICAL_FIELDS))
+    for threshold, avoided, agreement in rows:
+        cells = " ".join(f"{agreement[name]:>10.1%}" for name in CATEGORICAL_FIELDS)
+        print(f"{threshold:>9.2f} {avoided:>8.1%} {cells}")
+
+
+if __name__ == "__main__":
+    main([float(arg) for arg in sys.argv[1:]] or list(THRESHOLDS))
@@ -0,0 +1,75 @@
+"""
+Latency of cross-filtered dashboard reads answered by SQL GROUP BYs against
+the in-process columnar snapshot, on synthetic data:
+
+    python -m benchmarks.metrics_crossfilter [transcripts] [repeats]
+
+Each "click" is one filtered `/metrics/dashboard` (every section) called
+through the service layer, so neither HTTP nor the response cache is
+measured. Also reports the one-off snapshot load and the cost of patching
+it after a write.
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+from .metrics_dashboard import _seed
+
+CLICKS = (
+    {"use_case": "Soporte"},
+    {"use_case": "Ventas", "seller": "Toro"},
+    {"urgency": 4, "budget_tier": "high"},
+    {"pain": "Pain 3"},
+    {"date_range": "30d", "closed": True},
+)
+
+
+def _timed(call, repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        call()
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+def main(count: int, repeats: int) -> None:
+    from sqlalchemy import select, update
+
+    from api.models.classification import Classification
+    from api.models.database import SessionLocal, init_db
+    from api.schemas.metrics import MetricsFilters
+    from api.services import crossfilter, metrics, rollups
+    from api.settings import settings
+
+    init_db()
+    _seed(count)
+    db = SessionLocal()
+    print(f"transcripts={count} repeats={repeats}")
+
+    started = time.perf_counter()
+    crossfilter.aggregate(db, rollups.DIMENSIONS, MetricsFilters(closed=True))
+    print(f"snapshot load: {time.perf_counter() - started:.2f} s")
+
+    print(f"{'filters':>40} {'sql ms':>9} {'snapshot ms':>12}")
+    for click in CLICKS:
+        filters = MetricsFilters(**click)
+        settings.metrics_crossfilter = False
+        sql = _timed(lambda: metrics.dashboard(db, filters=filters), 1)
+        settings.metrics_crossfilter = True
+        snapshot = _timed(lambda: metrics.dashboard(db, filters=filters), repeats)
+        label = ", ".join(f"{key}={value}" for key, value in click.items())
+        print(f"{label:>40} {sql:>9.1f} {snapshot:>12.2f}")
+
+    ids = db.scalars(select(Classification.transcript_id).limit(1000)).all()
+    before = rollups.snapshot(db, ids)
+    db.execute(update(Classification).where(Classification.transcript_id.in_(ids)).values(use_case="Agenda"))
+    rollups.refresh(db, ids, before)
+    db.commit()
+    started = time.perf_counter()
+    crossfilter.aggregate(db, rollups.DIMENSIONS, MetricsFilters(closed=True))
+    print(f"patch after a {len(ids)}-transcript write: {(time.perf_counter() - started) * 1000:.1f} ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000, int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,139 @@
+"""
+Latency and SQL statements of `/api/metrics/dashboard` against the sum of
+the individual endpoints the Metrics page used to call, on synthetic data:
+
+    python -m benchmarks.metrics_dashboard [transcripts] [repeats]
+
+Requests go through the ASGI app, so each individual endpoint pays for its
+own session, as it does from the browser.
+"""
+from __future__ import annotations
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/benchmark.db")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+INDIVIDUAL = (
+    "/api/metrics/overview",
+    "/api/metrics/funnel",
+    "/api/metrics/conversions",
+    "/api/metrics/urgency-budget",
+    "/api/metrics/use-cases?status=all",
+    "/api/metrics/use-cases?status=closed",
+    "/api/metrics/use-cases?status=open",
+    "/api/metrics/pains/distribution",
+    "/api/metrics/sentiment-conversion",
+    "/api/metrics/seller-conversion",
+    "/api/metrics/origins",
+    "/api/metrics/automatization-outcomes",
+)
+
+
+def _seed(count: int) -> None:
+    from sqlalchemy import insert
+
+    from api.models.classification import Classification
+    from api.models.classification_labels import ClassificationPain
+    from api.models.client import Client
+    from api.models.database import SessionLocal
+    from api.models.pain import PainLabel
+    from api.models.transcript import Transcript
+    from api.services import rollups
+
+    rng = random.Random(7)
+    db = SessionLocal()
+    pains = [f"Pain {index}" for index in range(30)]
+    db.execute(insert(PainLabel), [{"id": index + 1, "name": name, "key": name.lower()} for index, name in enumerate(pains)])
+    db.execute(insert(Client), [{"id": index + 1, "name": f"Cliente {index}"} for index in range(count)])
+    db.execute(
+        insert(Transcript),
+        [
+            {
+                "id": index + 1,
+                "client_id": index + 1,
+                "assigned_seller": rng.choice(["Toro", "Puma", "Zorro", "Boa", None]),
+                "meeting_date": datetime(2024, rng.randint(1, 12), rng.randint(1, 28)),
+                "closed": rng.random() < 0.3,
+                "transcript": f"Reunión {index}",
+            }
+            for index in range(count)
+        ],
+    )
+    classified = [index + 1 for index in range(count) if rng.random() < 0.9]
+    db.execute(
+        insert(Classification),
+        [
+            {
+                "id": transcript_id,
+                "transcript_id": transcript_id,
+                "sentiment": rng.randint(-1, 1),
+                "urgency": rng.randint(1, 5),
+                "budget_tier": rng.choice(["low", "medium", "high", None]),
+                "use_case": rng.choice(["Soporte", "Ventas", "Agenda", "Cobranza"]),
+                "origin": rng.choice(["Web", "Referido", "Evento", "LinkedIn"]),
+                "automatization": rng.random() < 0.5,
+                "fit_score": rng.random(),
+                "close_probability": rng.random(),
+                "summary": "ok",
+            }
+            for transcript_id in classified
+        ],
+    )
+    db.execute(
+        insert(ClassificationPain),
+        [
+            {"classification_id": classification_id, "pain_id": pain_id}
+            for classification_id in classified
+            for pain_id in rng.sample(range(1, len(pains) + 1), 2)
+        ],
+    )
+    db.commit()
+    rollups.rebuild(db)
+    db.close()
+
+
+def _measure(client, engine, paths: tuple[str, ...], repeats: int) -> tuple[float, int]:
+    from sqlalchemy import event
+
+    statements = []
+
+    def count(*args) -> None:
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for path in paths:
+            client.get(path).raise_for_status()
+    elapsed = (time.perf_counter() - started) / repeats
+    event.remove(engine, "before_cursor_execute", count)
+    return elapsed * 1000, len(statements) // repeats
+
+
+def main(count: int, repeats: int) -> None:
+    from fastapi.testclient import TestClient
+
+    from api.main import app
+    from api.models.database import engine, init_db
+
+    init_db()
+    _seed(count)
+    client = TestClient(app)
+    print(f"transcripts={count} repeats={repeats}")
+    print(f"{'mode':>12} {'requests':>9} {'statements':>11} {'ms':>9}")
+    rows = (("individual", INDIVIDUAL), ("dashboard", ("/api/metrics/dashboard",)))
+    for label, paths in rows:
+        client.get(paths[0])
+        ms, statements = _measure(client, engine, paths, repeats)
+        print(f"{label:>12} {len(paths):>9} {statements:>11} {ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from api.models.database import Base
+
+
+@pytest.fixture
+def engine():
+    """Fresh in-memory database shared by every connection of the test."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sessions(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db(sessions):
+    session = sessions()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def db_url(tmp_path) -> str:
+    """File database for tests that need several engines on the same data."""
+    url = f"sqlite:///{tmp_path / 'vambe.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return url
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import event, func, select
+
+from api.models.client import Client
+from api.models.transcript import Transcript
+from api.schemas.client import ClientCreate
+from api.schemas.transcript import TranscriptCreate
+from api.services.bulk import bulk_upsert, prepare_row
+from api.services.ingest_runs import start_run
+from api.services.transcripts import upsert_transcript
+from api.services import pipeline
+
+
+def _row(name: str, email: str | None, text: str, date: datetime | None = None, closed: bool = False):
+    return prepare_row(
+        ClientCreate(name=name, email=email, phone="5690000"),
+        TranscriptCreate(meeting_date=date, closed=closed, transcript=text, assigned_seller="Toro"),
+    )
+
+
+def test_bulk_upsert_counts_and_dedupes_within_and_across_batches(db) -> None:
+    march = datetime(2024, 3, 15)
+    rows = [
+        _row("Ana", "ana@example.com", "hola", march),
+        _row("Ana", "ANA@example.com ", "hola editado", march, closed=True),
+        _row("Luis", "luis@example.com", "sin fecha"),
+        _row("Luis", "luis@example.com", "sin fecha"),
+    ]
+    ids, clients, transcripts = bulk_upsert(db, rows)
+    assert (clients, transcripts) == (2, 2)
+    assert ids[0] == ids[1] and ids[2] == ids[3]
+
+    updated = db.get(Transcript, ids[0])
+    assert updated.closed is True and updated.transcript == "hola editado"
+
+    ids_again, clients, transcripts = bulk_upsert(db, rows)
+    assert ids_again == ids
+    assert (clients, transcripts) == (0, 0)
+    assert db.scalar(select(func.count(Client.id))) == 2
+    assert db.scalar(select(func.count(Transcript.id))) == 2
+
+
+def test_bulk_upsert_matches_transcripts_by_normalized_content_hash(db) -> None:
+    ids, _, _ = bulk_upsert(db, [_row("Ana", "ana@example.com", "Hola,  mundo\n")])
+    stored = db.get(Transcript, ids[0])
+    assert stored.content_hash is not None
+
+    ids_again, _, transcripts = bulk_upsert(db, [_row("Ana", "ana@example.com", "Hola, mundo")])
+    assert ids_again == ids and transcripts == 0
+
+
+def test_start_run_resumes_or_resets_checkpoint(db) -> None:
+    run = start_run(db, "f" * 64, "clientes.csv")
+    run.committed_rows = run.classified_rows = 40
+    db.commit()
+
+    assert start_run(db, "f" * 64, None).classified_rows == 40
+    restarted = start_run(db, "f" * 64, None, resume=False)
+    assert (restarted.classified_rows, restarted.filename) == (0, "clientes.csv")
+
+
+async def _stream(rows):
+    for row in rows:
+        yield row
+
+
+def test_delta_ingest_skips_unchanged_rows_without_writes(monkeypatch, db) -> None:
+    monkeypatch.setattr(pipeline, "pending_transcripts", lambda db, transcript_ids: {})
+    march = datetime(2024, 3, 15)
+    rows = [_row("Ana", "ana@example.com", "hola", march), _row("Luis", "luis@example.com", "buenas", march)]
+    asyncio.run(pipeline.ingest_prepared(db, _stream(rows), delta=True))
+
+    writes = []
+    event.listen(
+        db.get_bind(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: writes.append(statement)
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE"))
+        else None,
+    )
+    rows.append(_row("Eva", "eva@example.com", "nueva", march))
+    rows[1] = _row("Luis", "luis@example.com", "buenas", march, closed=True)
+    result = asyncio.run(pipeline.ingest_prepared(db, _stream(rows), delta=True))
+    assert (result.new_rows, result.changed_rows, result.unchanged_rows) == (1, 1, 1)
+
+    writes.clear()
+    result = asyncio.run(pipeline.ingest_prepared(db, _stream(rows), delta=True))
+    assert (result.new_rows, result.changed_rows, result.unchanged_rows) == (0, 0, 3)
+    assert writes == []
+
+
+def test_single_upserts_keep_the_delta_fingerprint_current(monkeypatch, db) -> None:
+    monkeypatch.setattr(pipeline, "pending_transcripts", lambda db, transcript_ids: {})
+    march = datetime(2024, 3, 15)
+    rows = [_row("Ana", "ana@example.com", "hola", march)]
+    asyncio.run(pipeline.ingest_prepared(db, _stream(rows), delta=True))
+
+    transcript, _, created = upsert_transcript(
+        db,
+        ClientCreate(name="Ana", email="ana@example.com", phone="5690000"),
+        TranscriptCreate(meeting_date=march, closed=False, transcript="hola editado", assigned_seller="Toro"),
+    )
+    assert not created and transcript.row_fingerprint != rows[0].fingerprint
+
+    result = asyncio.run(pipeline.ingest_prepared(db, _stream(rows), delta=True))
+    assert (result.changed_rows, result.unchanged_rows) == (1, 0)
+    assert db.get(Transcript, transcript.id).transcript == "hola"
+
+    result = asyncio.run(pipeline.ingest_prepared(db, _stream(rows), delta=True))
+    assert result.unchanged_rows == 1
+
+
+def test_resuming_a_run_with_errors_retries_only_the_unclassified_rows(monkeypatch, db) -> None:
+    from api.schemas.classification import ClassificationBase
+    from api.services import classify
+
+    failing = {"buenas"}
+    attempts: list[str] = []
+
+    async def fake_classifications(db, transcripts, concurrency=None):
+        for transcript_id, text in transcripts.items():
+            attempts.append(text)
+            if text in failing:
+                yield transcript_id, RuntimeError("LLM caído")
+                continue
+            payload = ClassificationBase(sentiment=0, urgency=1, origin="Web", fit_score=0.5, close_probability=0.5, summary="ok")
+            yield transcript_id, classify.save_classification(db, transcript_id, payload, source="llm")
+
+    monkeypatch.setattr(pipeline, "iter_classifications", fake_classifications)
+    rows = [_row("Ana", "ana@example.com", "hola"), _row("Luis", "luis@example.com", "buenas")]
+    first = asyncio.run(pipeline.ingest_prepared(db, _stream(rows), run=start_run(db, "e" * 64, "clientes.csv")))
+    assert (first.classified_transcripts, first.errors) == (1, 1)
+
+    failing.clear()
+    attempts.clear()
+    run = start_run(db, "e" * 64, None)
+    assert (run.status, run.classified_rows) == ("retrying", 0)
+    second = asyncio.run(pipeline.ingest_prepared(db, _stream(rows), run=run))
+    assert attempts == ["buenas"]
+    assert (second.unchanged_rows, second.classified_transcripts, second.errors) == (2, 1, 0)
+    assert (run.status, run.errors, run.classified_transcripts, run.classified_rows) == ("completed", 0, 2, 2)
+    assert start_run(db, "e" * 64, None).status == "running"
+
+
+def test_bulk_rows_missing_fields_fingerprint_the_merged_stored_state(monkeypatch, db) -> None:
+    monkeypatch.setattr(pipeline, "pending_transcripts", lambda db, transcript_ids: {})
+    march = datetime(2024, 3, 15)
+    full = _row("Ana", "ana@example.com", "hola", march)
+    asyncio.run(pipeline.ingest_prepared(db, _stream([full]), delta=True))
+
+    partial = prepare_row(
+        ClientCreate(name="Ana", email="ana@example.com"),
+        TranscriptCreate(meeting_date=march, closed=False, transcript="hola"),
+    )
+    ids, _, _ = bulk_upsert(db, [partial])
+    stored = db.get(Transcript, ids[0])
+    assert stored.assigned_seller == "Toro"
+    assert stored.row_fingerprint == full.fingerprint != partial.fingerprint
+
+    result = asyncio.run(pipeline.ingest_prepared(db, _stream([full]), delta=True))
+    assert result.unchanged_rows == 1
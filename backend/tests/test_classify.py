@@ -0,0 +1,449 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from api.main import app
+from api.models.classification import Classification
+from api.models.client import Client
+from api.models.pain import PainLabel
+from api.models.transcript import Transcript
+from api.schemas.classification import ClassificationBase, PackedClassificationResponse
+from api.routes import classify as classify_routes
+from api.schemas.metrics import AvailablePains
+from api.services import classification_cache, classify, compaction, llm_classifier, llm_health
+from api.services import local_classifier
+from api.services import pain_taxonomy as pain_taxonomy_module
+from api.services.fake_llm_server import fake_response, serve
+from api.services.llm_backends import CassetteBackend, FakeServerBackend, RateLimitError
+from api.services.llm_health import AdaptiveConcurrency, CircuitBreaker, CircuitOpenError
+from api.services.local_classifier import LocalClassifier, evaluate
+from api.services.pain_taxonomy import PainTaxonomy
+from api.services.rate_limit import RateLimiter, TokenBucket, backoff_delay
+
+
+class RateLimited(Exception):
+    code = 429
+
+    def __str__(self) -> str:
+        return "429 RESOURCE_EXHAUSTED"
+
+
+@pytest.fixture(autouse=True)
+def fresh_llm_health(monkeypatch):
+    monkeypatch.setattr(llm_health, "_controller", AdaptiveConcurrency(8, 32))
+    monkeypatch.setattr(llm_health, "_breaker", CircuitBreaker(5, 30))
+
+
+def test_token_bucket_spaces_requests_beyond_the_burst() -> None:
+    bucket = TokenBucket(per_minute=60, burst=2)
+    assert bucket.reserve() == 0 and bucket.reserve() == 0
+    assert 0.9 < bucket.reserve() <= 1.0
+    assert 1.9 < bucket.reserve() <= 2.0
+
+
+def test_rate_limiter_waits_for_the_scarcer_quota() -> None:
+    limiter = RateLimiter(rpm=600, tpm=6000)
+    assert limiter.reserve(6000) == 0
+    assert 0.9 < limiter.reserve(100) <= 1.0
+
+
+def test_backoff_delay_is_jittered_and_capped() -> None:
+    delays = {backoff_delay(3, base=1, cap=5) for _ in range(20)}
+    assert len(delays) > 1 and all(0 <= delay <= 5 for delay in delays)
+
+
+def test_classify_concurrently_overlaps_calls_and_retries_rate_limits(monkeypatch) -> None:
+    monkeypatch.setattr(llm_classifier, "build_prompt", lambda transcript: transcript)
+    monkeypatch.setattr(llm_classifier, "backoff_delay", lambda attempt: 0)
+    monkeypatch.setattr(llm_classifier, "get_rate_limiter", lambda: RateLimiter(rpm=6000, tpm=10**9))
+    in_flight = peak = 0
+    failures = {"t2": 1}
+
+    class Backend:
+        async def agenerate(self, model, prompt, schema):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            if failures.get(prompt):
+                failures[prompt] -= 1
+                raise RateLimited()
+            if prompt == "bad":
+                raise ValueError("boom")
+            return f'{{"summary": "{prompt}"}}'
+
+    monkeypatch.setattr(llm_classifier, "get_backend", Backend)
+
+    async def collect():
+        items = [(index, f"t{index}") for index in range(8)] + [(99, "bad")]
+        return {key: value async for key, value in llm_classifier.classify_concurrently(items, concurrency=4)}
+
+    started = time.perf_counter()
+    results = asyncio.run(collect())
+    assert time.perf_counter() - started < 0.05 * 9
+    assert peak == 4
+    assert results[2] == {"summary": "t2"}
+    assert isinstance(results[99], ValueError)
+
+
+PAYLOAD = {"sentiment": 1, "urgency": 2, "origin": "Web", "fit_score": 0.5, "close_probability": 0.4, "summary": "ok"}
+
+
+def test_identical_text_is_classified_once_and_served_from_cache(monkeypatch, db) -> None:
+    calls = []
+
+    async def fake_call(text: str) -> dict:
+        calls.append(text)
+        return PAYLOAD
+
+    monkeypatch.setattr(classify, "classify_concurrently", _sequential(fake_call))
+    transcripts = [
+        Transcript(client=Client(name=f"Cliente {index}"), transcript=text)
+        for index, text in enumerate(["Necesitamos  automatizar", "Necesitamos automatizar", "Otro texto", "Otro texto"])
+    ]
+    db.add_all(transcripts)
+    db.commit()
+
+    async def run(items):
+        return {key: value async for key, value in classify.iter_classifications(db, {t.id: t.transcript for t in items})}
+
+    hits_before = classification_cache.cache_stats(db).hits
+    first = asyncio.run(run(transcripts[:3]))
+    assert len(calls) == 2 and all(isinstance(item, Classification) for item in first.values())
+
+    second = asyncio.run(run(transcripts[3:]))
+    assert len(calls) == 2 and isinstance(second[transcripts[3].id], Classification)
+    stats = classification_cache.cache_stats(db)
+    assert stats.entries == 2 and stats.hits == hits_before + 1
+    assert db.scalar(select(func.count(Classification.id))) == 4
+
+
+def test_classify_batch_uses_a_constant_number_of_statements(monkeypatch, engine, db) -> None:
+
+    async def fake_call(text: str) -> dict:
+        if text == "falla":
+            return ValueError("respuesta inválida")
+        return PAYLOAD
+
+    monkeypatch.setattr(classify, "classify_concurrently", _sequential(fake_call))
+    client = Client(name="Cliente")
+    transcripts = [Transcript(client=client, transcript=f"Texto {index}") for index in range(200)]
+    transcripts += [Transcript(client=client, transcript="falla"), Transcript(client=client, transcript="")]
+    db.add_all(transcripts)
+    db.commit()
+    ids = [t.id for t in transcripts] + [9999]
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    responses = asyncio.run(classify.classify_batch(db, ids))
+
+    assert len(statements) < 20
+    assert [r.transcript_id for r in responses] == ids
+    assert sum(r.created for r in responses) == 200
+    errors = {r.transcript_id: r.error for r in responses if r.error}
+    assert set(errors) == {ids[-3], ids[-2], 9999}
+    assert errors[9999] == "Transcrito no encontrado"
+    assert db.scalar(select(func.count(Classification.id))) == 200
+
+    again = asyncio.run(classify.classify_batch(db, ids[:3]))
+    assert not any(r.created for r in again) and all(r.classification for r in again)
+
+
+def test_classify_batch_keeps_a_concurrent_classification_and_reports_it(monkeypatch, db_url) -> None:
+    engine = create_engine(db_url)
+    db = sessionmaker(bind=engine)()
+    client = Client(name="Cliente")
+    transcripts = [Transcript(client=client, transcript=f"Texto {index}") for index in range(3)]
+    db.add_all(transcripts)
+    db.commit()
+    ids = [t.id for t in transcripts]
+
+    async def fake_call(text: str) -> dict:
+        if text == "Texto 2":
+            other = sessionmaker(bind=engine)()
+            classify.save_classification(other, ids[1], ClassificationBase.model_validate({**PAYLOAD, "summary": "otra"}))
+            other.close()
+        return PAYLOAD
+
+    monkeypatch.setattr(classify, "classify_concurrently", _sequential(fake_call))
+    responses = asyncio.run(classify.classify_batch(db, ids))
+
+    assert [r.created for r in responses] == [True, False, True]
+    assert [bool(r.error) for r in responses] == [False, True, False]
+    assert responses[1].classification.summary == "otra"
+    assert db.scalar(select(func.count(Classification.id))) == 3
+
+
+def _sequential(call):
+    async def classify_concurrently(items, concurrency=None):
+        for key, text in items:
+            yield key, await call(text)
+
+    return classify_concurrently
+
+
+def test_pain_taxonomy_appends_new_pains_and_rerenders_the_prefix(monkeypatch, sessions) -> None:
+    stored = ["Atención lenta", "Costos"]
+    monkeypatch.setattr(pain_taxonomy_module, "SessionLocal", sessions)
+    monkeypatch.setattr(pain_taxonomy_module, "list_pains", lambda db: AvailablePains(pains=sorted(stored)))
+    taxonomy = PainTaxonomy()
+    renders = []
+
+    def render(pains: list[str]) -> str:
+        renders.append(pains)
+        return " | ".join(pains)
+
+    assert taxonomy.prefix(render) == "Atención lenta | Costos"
+    assert taxonomy.add(["Costos", ""]) is False
+    assert taxonomy.add(["Integraciones"]) is True
+    assert taxonomy.prefix(render) == "Atención lenta | Costos | Integraciones"
+    assert taxonomy.prefix(render) and len(renders) == 2
+
+    # Another process stores a label: the next read reloads and keeps the known order.
+    stored.extend(["Integraciones", "Bajo soporte"])
+    with sessions() as db:
+        db.add(PainLabel(name="Bajo soporte", key="bajo soporte"))
+        db.commit()
+    assert taxonomy.prefix(render) == "Atención lenta | Costos | Integraciones | Bajo soporte"
+
+
+def test_packed_requests_split_answers_and_retry_only_invalid_items(monkeypatch) -> None:
+    monkeypatch.setattr(llm_classifier, "build_prompt", lambda transcript: transcript)
+    monkeypatch.setattr(llm_classifier, "build_packed_prompt", lambda transcripts: "PACK:" + "|".join(transcripts))
+    monkeypatch.setattr(llm_classifier, "get_rate_limiter", lambda: RateLimiter(rpm=6000, tpm=10**9))
+    prompts = []
+
+    class Backend:
+        async def agenerate(self, model, prompt, schema):
+            prompts.append(prompt)
+            if prompt.startswith("PACK:"):
+                items = [
+                    {**PAYLOAD, "id": "1", "summary": "a"},
+                    {**PAYLOAD, "id": "2", "sentiment": 9},
+                ]
+                return json.dumps({"items": items})
+            return json.dumps({**PAYLOAD, "summary": prompt})
+
+    monkeypatch.setattr(llm_classifier, "get_backend", Backend)
+
+    async def collect():
+        items = [("k1", "uno"), ("k2", "dos"), ("k3", "tres")]
+        return {
+            key: value
+            async for key, value in llm_classifier.classify_concurrently(items, pack_tokens=10_000)
+        }
+
+    results = asyncio.run(collect())
+    assert prompts[0] == "PACK:uno|dos|tres" and sorted(prompts[1:]) == ["dos", "tres"]
+    assert results["k1"]["summary"] == "a"
+    assert results["k2"]["summary"] == "dos" and results["k3"]["summary"] == "tres"
+
+
+def test_pack_transcripts_respects_token_budget_and_item_cap(monkeypatch) -> None:
+    monkeypatch.setattr(llm_classifier, "packed_prompt_prefix", lambda: "")
+    items = [(index, "x" * 4000) for index in range(5)]
+    packs = list(llm_classifier.pack_transcripts(items, token_budget=3000, max_items=10))
+    assert [len(pack) for pack in packs] == [2, 2, 1]
+    assert [len(pack) for pack in llm_classifier.pack_transcripts(items, 10**6, max_items=3)] == [3, 2]
+
+    monkeypatch.setattr(llm_classifier, "packed_prompt_prefix", lambda: "p" * 1600)
+    packs = list(llm_classifier.pack_transcripts(items, token_budget=3000, max_items=10))
+    assert [len(pack) for pack in packs] == [1, 1, 1, 1, 1]
+
+
+def _labelled_corpus(size: int) -> tuple[list[str], list[dict]]:
+    sources = [
+        ("Los conocimos en una conferencia de retail", "Eventos"),
+        ("Encontramos Vambe buscando en Google", "Web"),
+        ("Un colega nos recomendó la herramienta", "Conocidos"),
+    ]
+    texts, payloads = [], []
+    for index in range(size):
+        sentence, origin = sources[index % len(sources)]
+        automate = index % 2 == 0
+        texts.append(f"{sentence}. " + ("Necesitamos automatizar respuestas." if automate else "Atendemos a mano."))
+        payloads.append({**PAYLOAD, "origin": origin, "automatization": automate, "pains": ["Volumen alto"]})
+    return texts, payloads
+
+
+def test_local_classifier_learns_keyword_fields_with_confidence() -> None:
+    texts, payloads = _labelled_corpus(60)
+    train, test, _, _, rows = evaluate(texts, payloads, thresholds=(0.5,))
+    threshold, avoided, agreement = rows[0]
+    assert (train, test) == (48, 12) and avoided > 0.5
+    assert agreement["origin"] == 1.0 and agreement["automatization"] == 1.0
+
+    model = LocalClassifier.fit(texts, payloads)
+    [prediction] = model.predict(["Nos habló de ustedes un colega. Necesitamos automatizar todo."])
+    assert prediction.payload["origin"] == "Conocidos" and prediction.payload["automatization"] is True
+    assert prediction.payload["pains"] == ["Volumen alto"]
+    assert 0 < prediction.confidence <= min(prediction.field_confidence.values()) + 1e-9
+
+
+def test_local_classifier_trains_in_the_background_with_a_cached_sample_count(monkeypatch, engine, db) -> None:
+    texts, payloads = _labelled_corpus(60)
+    release = threading.Event()
+
+    def training_rows(session):
+        release.wait(5)
+        return texts, payloads
+
+    monkeypatch.setattr(local_classifier, "training_rows", training_rows)
+    monkeypatch.setattr(local_classifier.settings, "local_classifier_min_samples", 10)
+    monkeypatch.setattr(local_classifier, "_model", None)
+    monkeypatch.setattr(local_classifier, "_trainer", None)
+    monkeypatch.setattr(local_classifier, "_samples", (time.monotonic(), len(texts)))
+    counts = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: counts.append(statement))
+
+    assert local_classifier.get_local_classifier(db) is None
+    trainer = local_classifier._trainer
+    assert trainer is not None and trainer.is_alive()
+    assert local_classifier.get_local_classifier(db) is None and local_classifier._trainer is trainer
+
+    release.set()
+    trainer.join(30)
+    model = local_classifier.get_local_classifier(db)
+    assert model is not None and model.trained_on == len(texts)
+    assert local_classifier._trainer is None and counts == []
+
+
+def test_fake_server_injects_429s_and_cassette_replays_offline(tmp_path) -> None:
+    schema = ClassificationBase.model_json_schema()
+    server = serve(latency=0, jitter=0, rpm=2)
+    try:
+        live = FakeServerBackend(server.url)
+        first = live.generate("modelo", "hola", schema)
+        assert live.generate("modelo", "hola", schema) == first
+        with pytest.raises(RateLimitError):
+            live.generate("modelo", "chao", schema)
+    finally:
+        server.shutdown()
+
+    server = serve(latency=0, jitter=0)
+    try:
+        recorder = CassetteBackend(FakeServerBackend(server.url), tmp_path, mode="record")
+        recorded = recorder.generate("modelo", "hola", schema)
+    finally:
+        server.shutdown()
+
+    replay = CassetteBackend(None, tmp_path, mode="replay")
+    assert asyncio.run(replay.agenerate("modelo", "hola", schema)) == recorded
+    ClassificationBase.model_validate_json(recorded)
+    with pytest.raises(LookupError):
+        replay.generate("modelo", "otro prompt", schema)
+
+
+def test_fake_server_answers_every_item_of_a_packed_prompt() -> None:
+    prompt = llm_classifier.PACKED_ITEM.replace("{id}", "1") + llm_classifier.PACKED_ITEM.replace("{id}", "2")
+    answer = fake_response(prompt, PackedClassificationResponse.model_json_schema())
+    assert [item.id for item in PackedClassificationResponse.model_validate(answer).items] == ["1", "2"]
+
+
+def test_compaction_cleans_boilerplate_and_fits_the_budget(monkeypatch) -> None:
+    noisy = "Vendedor: Hola. Cliente: Buenos días. [00:01:12] Cliente: eh, recibimos 800 consultas semanales. Perfecto."
+    cleaned = compaction.compact(noisy + " Cliente: recibimos 800 consultas semanales.", budget=200)
+    assert cleaned.text == "Cliente: recibimos 800 consultas semanales."
+    assert cleaned.dropped_sentences == 4
+
+    filler = " ".join(f"Hablamos del tema {index} con el equipo comercial." for index in range(200))
+    text = f"Somos una clínica con 300 pacientes diarios. {filler} Necesitamos automatizar las reservas de 300 pacientes."
+    compacted = compaction.compact(text, budget=60)
+    assert compacted.original_tokens > 1000 and compacted.tokens <= 60
+    assert compacted.text.startswith("Somos una clínica") and "[...]" in compacted.text
+    assert compaction.compact(text, budget=0).text == text
+
+    prompts = []
+
+    class Backend:
+        async def agenerate(self, model, prompt, schema):
+            prompts.append(prompt)
+            return json.dumps(PAYLOAD)
+
+    monkeypatch.setattr(llm_classifier, "get_backend", Backend)
+    monkeypatch.setattr(llm_classifier, "build_prompt", lambda transcript: transcript)
+    monkeypatch.setattr(compaction.settings, "transcript_token_budget", 60)
+    calls = compaction.compaction_stats().calls
+    asyncio.run(llm_classifier.call_api_async(text))
+    stats = compaction.compaction_stats()
+    assert prompts == [compacted.text]
+    assert stats.calls == calls + 1 and stats.saved_ratio > 0
+
+
+def test_aimd_limit_grows_on_success_and_halves_once_per_round_of_429s() -> None:
+    controller = AdaptiveConcurrency(4, 6)
+    for _ in range(5):
+        controller.on_success(0.1)
+    assert controller.current() == 5
+    controller.on_rate_limited()
+    controller.on_rate_limited()
+    assert controller.current() == 2
+    for _ in range(100):
+        controller.on_success(0.1)
+    assert controller.current() == 6
+    time.sleep(0.11)
+    controller.on_success(1.0)
+    assert controller.limit < 6
+
+
+def test_circuit_opens_on_outages_fails_fast_and_recovers_with_a_probe(monkeypatch) -> None:
+    monkeypatch.setattr(llm_classifier, "build_prompt", lambda transcript: transcript)
+    monkeypatch.setattr(llm_classifier, "backoff_delay", lambda attempt: 0)
+    monkeypatch.setattr(llm_classifier, "get_rate_limiter", lambda: RateLimiter(rpm=6000, tpm=10**9))
+    breaker = CircuitBreaker(3, 30)
+    monkeypatch.setattr(llm_health, "_breaker", breaker)
+    calls = []
+
+    class Unavailable(Exception):
+        code = 503
+
+    class Backend:
+        async def agenerate(self, model, prompt, schema):
+            calls.append(prompt)
+            if breaker.state == "half_open":
+                return json.dumps(PAYLOAD)
+            raise Unavailable("503 UNAVAILABLE")
+
+    monkeypatch.setattr(llm_classifier, "get_backend", Backend)
+
+    async def collect():
+        items = [(index, f"t{index}") for index in range(10)]
+        return dict([item async for item in llm_classifier.classify_concurrently(items, concurrency=1)])
+
+    results = asyncio.run(collect())
+    assert len(calls) == 3 and breaker.state == "open"
+    assert sum(isinstance(outcome, CircuitOpenError) for outcome in results.values()) >= 9
+    assert llm_health.llm_health().circuit_state == "open"
+
+    monkeypatch.setattr(breaker, "reset_seconds", 0)
+    assert asyncio.run(llm_classifier.call_api_async("probe"))["summary"] == "ok"
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_classify_single_maps_an_open_circuit_and_exhausted_retries_to_503(monkeypatch) -> None:
+    client = TestClient(app, raise_server_exceptions=False)
+    errors = iter(
+        [
+            CircuitOpenError(12.2),
+            llm_classifier.RateLimitExhaustedError(),
+            RuntimeError(llm_classifier.RATE_LIMIT_MESSAGE),
+        ]
+    )
+
+    def classify_transcript(db, transcript_id):
+        raise next(errors)
+
+    monkeypatch.setattr(classify_routes, "classify_transcript", classify_transcript)
+    response = client.post("/api/classify/1")
+    assert response.status_code == 503 and response.headers["Retry-After"] == "13"
+    response = client.post("/api/classify/1")
+    assert response.status_code == 503 and response.headers["Retry-After"] == "60"
+    assert client.post("/api/classify/1").status_code == 500
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import json
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+
+from api.services.pipeline import _prepare, detect_format
+from api.services.readers import iter_ndjson_rows
+from tests.test_readers import SAMPLE_CSV, _FakeUpload
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from api.services.columnar import iter_columnar_prepared, prepare_batch  # noqa: E402
+
+
+def _sample_rows() -> list[dict[str, str]]:
+    with SAMPLE_CSV.open(encoding="utf-8") as handle:
+        return list(csv.DictReader(handle))
+
+
+def test_detect_format_by_extension() -> None:
+    assert detect_format("export.parquet") == "parquet"
+    assert detect_format("export.jsonl") == "ndjson"
+    assert detect_format("export.bin", "arrow") == "arrow"
+    with pytest.raises(ValueError):
+        detect_format("export.xlsx")
+    with pytest.raises(ValueError):
+        detect_format("export.csv", "xlsx")
+
+
+def test_parquet_batches_match_row_normalization() -> None:
+    rows = _sample_rows()
+    buffer = BytesIO()
+    pq.write_table(pa.Table.from_pylist(rows), buffer, row_group_size=16)
+    buffer.seek(0)
+
+    async def collect() -> list:
+        return [row async for row in iter_columnar_prepared(buffer, "parquet", skip=5)]
+
+    assert asyncio.run(collect()) == [_prepare(row) for row in rows[5:]]
+
+
+def test_native_arrow_types_are_normalized() -> None:
+    batch = pa.RecordBatch.from_pylist(
+        [
+            {"name": " Ana ", "email": "ANA@x.com", "closed": True, "meeting_date": datetime(2024, 3, 15), "transcript": "hola"},
+            {"name": None, "email": "", "closed": None, "meeting_date": None, "transcript": " "},
+        ]
+    )
+    first, second = prepare_batch(batch)
+    expected = _prepare({"name": "Ana", "email": "ana@x.com", "closed": "1", "meeting_date": "2024-03-15", "transcript": "hola"})
+    assert first == expected
+    assert second.name == "Cliente sin nombre"
+    assert second.transcript["closed"] is False and "transcript" not in second.transcript
+    assert second.email_hash is None
+
+
+def test_ndjson_rows_use_csv_aliases() -> None:
+    payload = "\n".join(json.dumps(row) for row in _sample_rows()[:3]).encode("utf-8")
+
+    async def collect() -> list:
+        return [row async for row in iter_ndjson_rows(_FakeUpload(payload), chunk_size=11)]
+
+    assert asyncio.run(collect()) == _sample_rows()[:3]
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services.pipeline import _prepare, iter_prepared_parallel
+from api.services.readers import iter_csv_rows
+from tests.test_readers import SAMPLE_CSV, _FakeUpload
+
+client = TestClient(app)
+
+
+def test_unknown_ingest_job_returns_404() -> None:
+    assert client.get("/api/ingest/jobs/missing").status_code == 404
+    assert client.get("/api/ingest/jobs/missing/events").status_code == 404
+
+
+def test_unknown_ingest_format_is_rejected() -> None:
+    response = client.post("/api/ingest?format=xlsx", files={"upload": ("datos.xlsx", b"x", "application/octet-stream")})
+    assert response.status_code == 422
+
+
+def test_csv_ingest_job_reports_progress_and_streams_events(monkeypatch, db_url) -> None:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from api.models.database import get_db
+    from api.services import ingest_jobs, pipeline
+
+    sessions = sessionmaker(bind=create_engine(db_url, connect_args={"check_same_thread": False}))
+
+    def override_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_db)
+    monkeypatch.setattr(ingest_jobs, "SessionLocal", sessions)
+    monkeypatch.setattr(pipeline, "pending_transcripts", lambda db, transcript_ids: {})
+    token = uuid4().hex
+    payload = "Nombre,Correo Electronico,Vendedor asignado,closed,Transcripcion\n" + "".join(
+        f"Job {index},job{index}-{token}@example.com,Toro,0,Reunión {token} {index}\n" for index in range(3)
+    )
+    status = _wait_for_job(client.post("/api/ingest/csv/jobs", files={"upload": ("job.csv", payload.encode(), "text/csv")}))
+    job_id = status["job_id"]
+    assert status["state"] == "completed", status
+    assert (status["processed_rows"], status["inserted_clients"], status["inserted_transcripts"]) == (3, 3, 3)
+
+    with client.stream("GET", f"/api/ingest/jobs/{job_id}/events") as events:
+        lines = [line for line in events.iter_lines() if line]
+    assert lines[0] == "event: progress"
+    assert json.loads(lines[1].removeprefix("data: ")) == status
+
+    resumed = _wait_for_job(client.post("/api/ingest/csv/jobs", files={"upload": ("job.csv", payload.encode(), "text/csv")}))
+    assert (resumed["state"], resumed["processed_rows"]) == ("completed", 0)
+    restarted = _wait_for_job(
+        client.post("/api/ingest/csv/jobs?resume=false", files={"upload": ("job.csv", payload.encode(), "text/csv")})
+    )
+    assert (restarted["state"], restarted["processed_rows"], restarted["inserted_clients"]) == ("completed", 3, 0)
+
+
+def _wait_for_job(response) -> dict:
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(100):
+        status = client.get(f"/api/ingest/jobs/{job_id}").json()
+        if status["state"] in {"completed", "failed"}:
+            return status
+        time.sleep(0.05)
+    return status
+
+
+def test_ingest_job_events_wake_on_updates_from_worker_threads() -> None:
+    from api.services.ingest_jobs import IngestJob
+
+    async def collect() -> list[dict]:
+        job = IngestJob("job.csv", "fingerprint")
+        stream = job.events()
+        first = await anext(stream)
+        following = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        await asyncio.to_thread(job.update, processed_rows=2, state="running")
+        second = await asyncio.wait_for(following, timeout=1)
+        await asyncio.to_thread(job.update, state="completed")
+        rest = [event async for event in stream]
+        return [json.loads(event.split("data: ", 1)[1]) for event in (first, second, *rest)]
+
+    events = asyncio.run(collect())
+    assert [(event["state"], event["processed_rows"]) for event in events] == [
+        ("pending", 0),
+        ("running", 2),
+        ("completed", 2),
+    ]
+
+
+def test_parallel_preparation_matches_sequential_order() -> None:
+    payload = SAMPLE_CSV.read_bytes()
+
+    async def collect() -> tuple[list, list]:
+        sequential = [_prepare(row) async for row in iter_csv_rows(_FakeUpload(payload))]
+        parallel = [
+            row
+            async for row in iter_prepared_parallel(
+                [_FakeUpload(payload), _FakeUpload(payload)], workers=2, chunk_rows=7
+            )
+        ]
+        return sequential, parallel
+
+    sequential, parallel = asyncio.run(collect())
+    assert parallel == sequential * 2
+
+
+def test_parallel_preparation_reuses_its_pool_and_cancels_on_early_exit() -> None:
+    from api.services import pipeline
+
+    payload = SAMPLE_CSV.read_bytes()
+
+    async def first_row() -> object:
+        rows = iter_prepared_parallel([_FakeUpload(payload)] * 20, workers=2, chunk_rows=1)
+        row = await anext(rows)
+        await rows.aclose()
+        return row
+
+    assert asyncio.run(first_row()) == asyncio.run(first_row())
+    executor = pipeline._executor(2)
+    assert asyncio.run(first_row()) is not None and pipeline._executor(2) is executor
+
+
+def test_zip_uploads_expand_into_their_csv_members() -> None:
+    import io
+    import zipfile
+
+    from fastapi import UploadFile
+
+    from api.services.readers import iter_uploads_sources
+
+    payload = SAMPLE_CSV.read_bytes()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as bundle:
+        bundle.writestr("a.csv", payload)
+        bundle.writestr("notas.txt", "ignorar")
+        bundle.writestr("b/b.csv", payload)
+    uploads = [UploadFile(archive, filename="datos.zip"), UploadFile(io.BytesIO(payload), filename="c.csv")]
+
+    async def collect() -> list:
+        return [row async for row in iter_prepared_parallel(iter_uploads_sources(uploads), workers=1)]
+
+    sequential = asyncio.run(_sequential(payload))
+    assert asyncio.run(collect()) == sequential * 3
+
+
+async def _sequential(payload: bytes) -> list:
+    return [_prepare(row) async for row in iter_csv_rows(_FakeUpload(payload))]
+
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
 
 from api.main import app
 
@@ -29,3 +30,377 @@ def test_metrics_origins_endpoint() -> None:
     payload = response.json()
     assert "items" in payload
     assert isinstance(payload["items"], list)
+
+
+def _seed(db) -> None:
+    from datetime import datetime
+
+    from api.models.classification import Classification
+    from api.models.client import Client
+    from api.models.transcript import Transcript
+
+    for index in range(40):
+        transcript = Transcript(
+            client=Client(name=f"Cliente {index % 7}"),
+            transcript=f"Reunión {index}",
+            assigned_seller=[None, "Toro", "Puma"][index % 3],
+            meeting_date=datetime(2024, 1 + index % 4, 1 + index % 20) if index % 5 else None,
+            closed=index % 2 == 0,
+        )
+        if index % 6:
+            transcript.classification = Classification(
+                sentiment=index % 3 - 1,
+                urgency=index % 5,
+                budget_tier=[None, "low", "high"][index % 3],
+                use_case=[None, "Soporte", "Ventas"][index % 3],
+                origin=["Web", "Referido"][index % 2],
+                automatization=[None, True, False][index % 3],
+                fit_score=(index % 10) / 10,
+                close_probability=0.5,
+                summary="ok",
+            )
+        db.add(transcript)
+    db.commit()
+
+
+def _unordered(series) -> list:
+    payload = series.model_dump()
+    return sorted(payload.get("items", payload.get("cells")), key=repr)
+
+
+def test_dashboard_matches_the_individual_endpoints_from_one_rollup_read(engine, db) -> None:
+    from sqlalchemy import event
+
+    from api.services import metrics, rollups
+
+    _seed(db)
+    rollups.rebuild(db)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    snapshot = metrics.dashboard(db)
+    assert len(statements) == 2
+    assert snapshot.overview.model_dump() == {
+        "total_clients": 40,
+        "classified_clients": 33,
+        "open_opportunities": 20,
+        "closed_wins": 20,
+    }
+    assert sum(item.total for item in snapshot.conversions.monthly) == 32
+
+    assert snapshot.overview == metrics.overview(db)
+    assert snapshot.funnel == metrics.funnel(db)
+    assert snapshot.conversions == metrics.conversion_metrics(db)
+    assert snapshot.pains == metrics.pain_distribution(db)
+    assert snapshot.sentiment_conversion == metrics.sentiment_conversion_breakdown(db)
+    assert snapshot.automatization_outcomes == metrics.automatization_outcomes(db)
+    assert _unordered(snapshot.urgency_budget) == _unordered(metrics.urgency_budget_heatmap(db))
+    assert _unordered(snapshot.seller_conversion) == _unordered(metrics.seller_conversion_stats(db))
+    assert _unordered(snapshot.origins) == _unordered(metrics.origin_distribution(db))
+    for status in ("all", "closed", "open"):
+        assert _unordered(snapshot.use_cases[status]) == _unordered(metrics.use_case_distribution(db, status))
+
+    partial = metrics.dashboard(db, ["overview"])
+    assert partial.overview == snapshot.overview and partial.funnel is None and partial.origins is None
+
+
+def test_metrics_dashboard_endpoint_selects_sections() -> None:
+    response = client.get("/api/metrics/dashboard", params={"sections": ["funnel", "origins"]})
+    assert response.status_code == 200
+    payload = response.json()
+    assert set(payload["funnel"]) == {"discovery", "evaluation", "negotiation", "closed"}
+    assert payload["overview"] is None and "items" in payload["origins"]
+    assert client.get("/api/metrics/dashboard", params={"sections": "nada"}).status_code == 400
+
+
+def test_rollups_maintained_by_every_write_path_match_a_rebuild(db) -> None:
+    from datetime import datetime
+
+    from api.schemas.classification import ClassificationBase
+    from api.schemas.client import ClientCreate
+    from api.schemas.transcript import TranscriptCreate
+    from api.services import classify, rollups
+    from api.services.bulk import bulk_upsert, prepare_row
+    from api.services.transcripts import upsert_transcript
+
+    def payload(urgency: int, fit: float) -> ClassificationBase:
+        return ClassificationBase(
+            sentiment=1, urgency=urgency, origin="Web", fit_score=fit, close_probability=0.5, summary="ok", use_case="Soporte"
+        )
+
+    rows = [
+        prepare_row(
+            ClientCreate(name=f"Cliente {index}", email=f"c{index}@example.com"),
+            TranscriptCreate(
+                meeting_date=datetime(2024, 1 + index, 5), closed=False, transcript=f"Texto {index}", assigned_seller="Toro"
+            ),
+        )
+        for index in range(4)
+    ]
+    ids, _, _ = bulk_upsert(db, rows)
+    classify.save_classification(db, ids[0], payload(2, 0.7), source="llm")
+    classify.save_classifications(db, {ids[0]: (payload(3, 0.9), "llm"), ids[1]: (payload(1, 0.2), "llm")}, {ids[0]: 1})
+    upsert_transcript(
+        db,
+        ClientCreate(name="Cliente 1", email="c1@example.com"),
+        TranscriptCreate(meeting_date=datetime(2024, 2, 5), closed=True, assigned_seller="Puma"),
+    )
+    upsert_transcript(db, ClientCreate(name="Nuevo", email="n@example.com"), TranscriptCreate(closed=False, transcript="Hola"))
+    bulk_upsert(db, [rows[2]._replace(transcript={**rows[2].transcript, "closed": True})])
+
+    def state() -> dict:
+        return {dimension: sorted(buckets, key=repr) for dimension, buckets in rollups.read(db).items()}
+
+    incremental = state()
+    assert incremental["clients"] == [([], 5, 0)]
+    assert incremental["seller"] == [(["Puma"], 1, 1), (["Toro"], 3, 1), ([None], 1, 0)]
+    rollups.rebuild(db)
+    assert state() == incremental
+
+
+def test_rollup_snapshots_serialize_concurrent_writes_to_the_same_transcript(db_url) -> None:
+    import threading
+
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    from api.models.classification import Classification
+    from api.models.client import Client
+    from api.models.transcript import Transcript
+    from api.schemas.classification import ClassificationBase
+    from api.services import classify, rollups
+
+    second_engine = create_engine(db_url)
+    first, second = sessionmaker(bind=create_engine(db_url))(), sessionmaker(bind=second_engine)()
+
+    def payload(urgency: int) -> ClassificationBase:
+        return ClassificationBase(
+            sentiment=1, urgency=urgency, origin="Web", fit_score=0.5, close_probability=0.5, summary="ok", use_case="Soporte"
+        )
+
+    transcript = Transcript(client=Client(name="Cliente"), transcript="Hola", closed=False)
+    first.add(transcript)
+    first.commit()
+    classify.save_classification(first, transcript.id, payload(1), source="llm")
+
+    before = rollups.snapshot(first, [transcript.id])
+    waiting, written = threading.Event(), threading.Event()
+
+    @event.listens_for(second_engine, "before_cursor_execute")
+    def locking(conn, cursor, statement, *args) -> None:
+        if statement.lstrip().upper().startswith(("BEGIN IMMEDIATE", "INSERT", "UPDATE", "DELETE")):
+            waiting.set()
+
+    def write() -> None:
+        classify.save_classification(second, transcript.id, payload(3), "llm")
+        written.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    # The second session is now blocked on the write lock the snapshot holds.
+    assert waiting.wait(5)
+    first.get(Classification, 1).urgency = 2
+    first.flush()
+    rollups.refresh(first, [transcript.id], before)
+    assert not written.is_set()
+    first.commit()
+    writer.join(10)
+    assert written.is_set()
+
+    incremental = sorted(rollups.read(first)["urgency_budget"], key=repr)
+    assert [(bucket, total) for bucket, total, _ in incremental] == [([3, None], 1)]
+    rollups.rebuild(first)
+    assert sorted(rollups.read(first)["urgency_budget"], key=repr) == incremental
+
+
+def test_metrics_responses_are_cached_until_a_write_commits(monkeypatch, db_url) -> None:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from api.models.client import Client
+    from api.models.database import get_db
+    from api.routes import metrics as metrics_routes
+    from api.services import metrics_cache
+
+    sessions = sessionmaker(bind=create_engine(db_url, connect_args={"check_same_thread": False}))
+
+    def override_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_db)
+    monkeypatch.setattr(metrics_routes, "SessionLocal", sessions)
+    metrics_cache.cache.clear()
+    db = sessions()
+    try:
+        first = client.get("/api/metrics/origins")
+        etag = first.headers["etag"]
+        before = metrics_cache.stats(db)
+
+        assert client.get("/api/metrics/origins").json() == first.json()
+        not_modified = client.get("/api/metrics/origins", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304 and not_modified.content == b""
+        after = metrics_cache.stats(db)
+        assert (after.hits, after.not_modified) == (before.hits + 1, before.not_modified + 1)
+
+        db.scalar(select(Client.id).limit(1))
+        db.commit()
+        assert client.get("/api/metrics/origins", headers={"If-None-Match": etag}).status_code == 304
+        client_row = Client(name="Cliente caché")
+        db.add(client_row)
+        db.commit()
+        db.delete(client_row)
+        db.commit()
+        changed = client.get("/api/metrics/origins", headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert metrics_cache.stats(db).generation == after.generation + 2
+
+        # A write through another engine (a CLI or another worker) invalidates it too.
+        etag = changed.headers["etag"]
+        other = sessionmaker(bind=create_engine(db_url))()
+        other.add(Client(name="Cliente de otro proceso"))
+        other.commit()
+        other.execute(delete(Client).where(Client.name == "Cliente de otro proceso"))
+        other.commit()
+        other.close()
+        assert client.get("/api/metrics/origins", headers={"If-None-Match": etag}).status_code == 200
+    finally:
+        db.close()
+
+
+def test_metrics_cache_evicts_least_recently_used_bodies_by_size() -> None:
+    from api.services.metrics_cache import MetricsCache
+
+    cache = MetricsCache(max_bytes=10, max_entries=10)
+    cache.put("a", 1, b"aaaa")
+    cache.put("b", 1, b"bbbb")
+    assert cache.get("a", 1) == b"aaaa"
+    cache.put("c", 1, b"cccc")
+    assert cache.get("b", 1) is None and cache.get("a", 1) == b"aaaa"
+    assert cache.get("c", 2) is None
+    assert cache.size == 8 and cache.counters["evictions"] == 1
+
+
+def test_metrics_filters_are_applied_as_sql_predicates(db) -> None:
+    from api.schemas.metrics import MetricsFilters
+    from api.services import metrics, rollups
+
+    _seed(db)
+    rollups.rebuild(db)
+    everything = metrics.dashboard(db)
+
+    toro = metrics.dashboard(db, filters=MetricsFilters(seller="Toro"))
+    assert [item.seller for item in toro.seller_conversion.items] == ["Toro"]
+    assert toro.seller_conversion.items == [item for item in everything.seller_conversion.items if item.seller == "Toro"]
+    assert toro.overview.total_clients < everything.overview.total_clients
+
+    closed = metrics.conversion_metrics(db, MetricsFilters(closed=True))
+    assert closed.monthly and all(month.closed == month.total for month in closed.monthly)
+    assert [month.month for month in closed.monthly] == sorted(month.month for month in closed.monthly)
+
+    soporte = metrics.use_case_distribution(db, filters=MetricsFilters(use_case="Soporte"))
+    assert [(item.use_case, item.total) for item in soporte.items] == [
+        (item.use_case, item.total) for item in everything.use_cases["all"].items if item.use_case == "Soporte"
+    ]
+
+    recent = metrics.overview(db, MetricsFilters(date_range="30d"))
+    assert 0 < recent.open_opportunities + recent.closed_wins < 40
+    assert metrics.dashboard(db, filters=MetricsFilters(date_range="all")) == everything
+
+
+def test_crossfilter_snapshot_matches_sql_and_is_patched_by_writes(monkeypatch, db) -> None:
+    from datetime import datetime
+
+    from api.schemas.classification import ClassificationBase
+    from api.schemas.client import ClientCreate
+    from api.schemas.metrics import MetricsFilters
+    from api.schemas.transcript import TranscriptCreate
+    from api.services import classify, crossfilter, metrics, rollups
+    from api.services.transcripts import upsert_transcript
+    from api.settings import settings
+
+    _seed(db)
+    rollups.rebuild(db)
+    slices = [
+        MetricsFilters(seller="Toro"),
+        MetricsFilters(use_case="Soporte", closed=False),
+        MetricsFilters(date_range="30d"),
+        MetricsFilters(date_from=datetime(2024, 2, 1), date_to=datetime(2024, 4, 1), automatization=False),
+        MetricsFilters(urgency=2, budget_tier="low"),
+        MetricsFilters(sentiment=0, origin="Web", seller="Puma"),
+        MetricsFilters(pain="Facturación lenta"),
+        MetricsFilters(seller="Nadie"),
+    ]
+
+    def compare() -> None:
+        for filters in slices:
+            snapshot = crossfilter.aggregate(db, rollups.DIMENSIONS, filters)
+            scanned = metrics._aggregate(db, rollups.DIMENSIONS, filters)
+            assert {key: sorted(value, key=repr) for key, value in snapshot.items()} == {
+                key: sorted(value, key=repr) for key, value in scanned.items()
+            }, filters
+            pains = metrics.pain_distribution(db, filters)
+            monkeypatch.setattr(settings, "metrics_crossfilter", False)
+            assert pains == metrics.pain_distribution(db, filters)
+            monkeypatch.setattr(settings, "metrics_crossfilter", True)
+
+    compare()
+    loaded = crossfilter._snapshot
+    payload = ClassificationBase(
+        sentiment=0, urgency=2, budget_tier="low", origin="Web", fit_score=0.9, close_probability=0.5,
+        summary="ok", use_case="Soporte", pains=["Facturación lenta"],
+    )
+    classify.save_classification(db, 1, payload, source="llm")
+    classify.save_classification(db, 2, payload, source="llm")
+    upsert_transcript(
+        db,
+        ClientCreate(name="Nuevo", email="nuevo@example.com"),
+        TranscriptCreate(meeting_date=datetime(2024, 4, 20), closed=True, assigned_seller="Toro", transcript="Hola"),
+    )
+    compare()
+    assert crossfilter._snapshot is loaded and len(loaded) == 41
+    assert metrics.pain_distribution(db, MetricsFilters(seller="Toro")).model_dump() == {
+        "items": [{"pain": "Facturación lenta", "total": 1}]
+    }
+
+
+def test_crossfilter_follows_writes_from_other_engines_and_uses_sql_while_loading(monkeypatch, db_url) -> None:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from api.models.client import Client
+    from api.models.transcript import Transcript
+    from api.schemas.classification import ClassificationBase
+    from api.schemas.metrics import MetricsFilters
+    from api.services import classify, crossfilter, metrics, rollups
+
+    reader, writer = sessionmaker(bind=create_engine(db_url))(), sessionmaker(bind=create_engine(db_url))()
+    writer.add_all(
+        [
+            Transcript(client=Client(name=f"Cliente {index}"), transcript=f"Hola {index}", assigned_seller="Toro")
+            for index in range(3)
+        ]
+    )
+    writer.commit()
+    rollups.rebuild(writer)
+    crossfilter.reset()
+    filters = MetricsFilters(seller="Toro")
+
+    monkeypatch.setattr(crossfilter, "_loading", True)
+    assert crossfilter.aggregate(reader, rollups.DIMENSIONS, filters) is None
+    assert metrics.overview(reader, filters).total_clients == 3
+    monkeypatch.setattr(crossfilter, "_loading", False)
+
+    def stages() -> dict:
+        return {bucket[0]: total for bucket, total, _ in crossfilter.aggregate(reader, ("stage",), filters)["stage"]}
+
+    assert stages() == {"discovery": 3}
+    loaded = crossfilter._snapshot
+    payload = ClassificationBase(sentiment=1, urgency=2, origin="Web", fit_score=0.9, close_probability=0.5, summary="ok")
+    classify.save_classification(writer, 1, payload, source="llm")
+    assert stages() == {"discovery": 2, "qualified": 1}
+    assert crossfilter._snapshot is loaded
+    crossfilter.reset()
+
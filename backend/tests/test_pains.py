@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from sqlalchemy import create_engine, delete, select, update
+from sqlalchemy.orm import sessionmaker
+
+from api.models.classification import Classification
+from api.models.classification_labels import ClassificationPain
+from api.models.client import Client
+from api.models.pain import PainAlias, PainLabel
+from api.models.transcript import Transcript
+from api.schemas.classification import ClassificationBase
+from api.services import classify, metrics, pain_canonical
+from api.services.classification_labels import backfill_labels
+
+PAYLOAD = {"sentiment": 1, "urgency": 2, "origin": "Web", "fit_score": 0.5, "close_probability": 0.4, "summary": "ok"}
+
+
+def _classify(db, pains: list[str]) -> Classification:
+    transcript = Transcript(client=Client(name="Cliente"), transcript=" ".join(pains))
+    db.add(transcript)
+    db.commit()
+    return classify.save_classification(db, transcript.id, ClassificationBase(**PAYLOAD, pains=pains), source="llm")
+
+
+def test_near_duplicate_pains_share_a_canonical_label(db) -> None:
+    assert pain_canonical.normalize("Alto volumen de consultas") == pain_canonical.normalize("Volumen alto de Consultas")
+    first = _classify(db, ["Alto volumen de consultas", "Respuestas lentas"])
+    second = _classify(db, ["Volumen alto de consultas", "Respuesta lenta", "respuestas  lentas"])
+    third = _classify(db, ["Poca personalización"])
+    fourth = _classify(db, ["Falta de personalización"])
+
+    assert second.pain_ids == first.pain_ids
+    assert second.pains == ["Volumen alto de consultas", "Respuesta lenta", "respuestas  lentas"]
+    assert metrics.list_pains(db).pains == [
+        "Alto volumen de consultas",
+        "Falta de personalización",
+        "Poca personalización",
+        "Respuestas lentas",
+    ]
+    distribution = {item.pain: item.total for item in metrics.pain_distribution(db).items}
+    assert distribution == {
+        "Alto volumen de consultas": 2,
+        "Respuestas lentas": 2,
+        "Poca personalización": 1,
+        "Falta de personalización": 1,
+    }
+
+    suggested = pain_canonical.list_rules(db, "suggested")
+    assert [(rule.alias, rule.suggested_label) for rule in suggested] == [
+        ("Falta de personalización", "Poca personalización")
+    ]
+    pain_canonical.approve_rule(db, suggested[0].id)
+    db.refresh(fourth)
+    assert fourth.pain_ids == third.pain_ids
+    assert "Falta de personalización" not in metrics.list_pains(db).pains
+    assert {item.pain: item.total for item in metrics.pain_distribution(db).items}["Poca personalización"] == 2
+
+    merged = db.scalar(select(PainAlias).where(PainAlias.alias == "Respuesta lenta"))
+    pain_canonical.reject_rule(db, merged.id)
+    db.refresh(second)
+    assert second.pain_ids[0] == first.pain_ids[0] and len(second.pain_ids) == 3
+    assert "Respuesta lenta" in metrics.list_pains(db).pains
+
+
+def test_engines_sharing_a_database_reuse_each_others_aliases_and_labels(monkeypatch, db_url) -> None:
+    first, second = sessionmaker(bind=create_engine(db_url))(), sessionmaker(bind=create_engine(db_url))()
+    _classify(second, ["Costos altos"])
+    created = _classify(first, ["Integraciones"])
+
+    assert pain_canonical.label_names(second, created.pain_ids) == ["Integraciones"]
+    assert _classify(second, ["Integraciones"]).pain_ids == created.pain_ids
+
+    load = pain_canonical._load_labels
+
+    def racing(db, index, condition):
+        monkeypatch.setattr(pain_canonical, "_load_labels", load)
+        load(db, index, condition)
+        _classify(first, ["Soporte lento"])
+
+    monkeypatch.setattr(pain_canonical, "_load_labels", racing)
+    raced = pain_canonical.canonicalize(second, ["Soporte lento"])
+    second.commit()
+    stored = first.scalar(select(PainAlias.label_id).where(PainAlias.alias == "Soporte lento"))
+    assert raced == [stored]
+    assert pain_canonical.label_names(second, raced) == ["Soporte lento"]
+    survivors = second.scalars(
+        select(PainLabel.id).where(PainLabel.name == "Soporte lento", PainLabel.merged_into_id.is_(None))
+    ).all()
+    assert survivors == [stored]
+
+
+def test_pain_and_risk_metrics_group_the_child_tables(db) -> None:
+    first = _classify(db, ["Costos altos", "Atención lenta"])
+    first.transcript.closed = True
+    _classify(db, ["Costos altos"])
+    db.execute(update(Classification).values(risks=["Presupuesto", " Presupuesto "]))
+    db.execute(delete(ClassificationPain))
+    db.commit()
+
+    backfill_labels(db)
+    conversion = {item.pain: (item.closed, item.total) for item in metrics.pain_conversion_breakdown(db).items}
+    assert conversion == {"Costos altos": (1, 2), "Atención lenta": (1, 1)}
+    assert [(item.risk, item.total) for item in metrics.risk_distribution(db).items] == [("Presupuesto", 2)]
+
+    third = _classify(db, ["Costos altos"])
+    db.execute(update(Classification).where(Classification.id == third.id).values(risks=["Presupuesto"]))
+    db.commit()
+    backfill_labels(db)
+    assert [(item.risk, item.total) for item in metrics.risk_distribution(db).items] == [("Presupuesto", 3)]
+    assert {item.pain: item.total for item in metrics.pain_distribution(db).items}["Costos altos"] == 3
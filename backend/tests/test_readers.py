@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+from io import BytesIO, StringIO
+from pathlib import Path
+
+from api.services.readers import iter_csv_rows
+
+SAMPLE_CSV = Path(__file__).resolve().parents[1] / "data" / "vambe_clients.csv"
+
+
+class _FakeUpload:
+    def __init__(self, payload: bytes) -> None:
+        self._buffer = BytesIO(payload)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+
+async def _collect(payload: bytes, chunk_size: int) -> list[dict[str, str | None]]:
+    return [row async for row in iter_csv_rows(_FakeUpload(payload), chunk_size=chunk_size)]
+
+
+def test_stream_matches_dictreader_across_chunk_boundaries() -> None:
+    payload = SAMPLE_CSV.read_bytes()
+    expected = list(csv.DictReader(StringIO(payload.decode("utf-8"))))
+    for chunk_size in (7, 128, 64 * 1024):
+        assert asyncio.run(_collect(payload, chunk_size)) == expected
+
+
+def test_stream_handles_multiline_quoted_transcripts() -> None:
+    payload = (
+        'Nombre,Transcripcion\r\n'
+        'Ana,"Primera linea\r\nsegunda, con ""comillas"""\r\n'
+        '\r\n'
+        'Luis,"ñandú\nfin"'
+    ).encode("utf-8")
+    rows = asyncio.run(_collect(payload, chunk_size=3))
+    assert rows == [
+        {"Nombre": "Ana", "Transcripcion": 'Primera linea\r\nsegunda, con "comillas"'},
+        {"Nombre": "Luis", "Transcripcion": "ñandú\nfin"},
+    ]
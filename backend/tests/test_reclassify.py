@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+
+from sqlalchemy import func, select
+
+from api.models.classification import Classification
+from api.models.client import Client
+from api.models.transcript import Transcript
+from api.services import classify, reclassify
+from api.services.llm_classifier import PROMPT_VERSION
+
+OLD = {"sentiment": 0, "urgency": 0, "origin": "Web", "fit_score": 0.1, "close_probability": 0.1, "summary": "viejo"}
+NEW = {**OLD, "sentiment": 2, "summary": "nuevo"}
+SELECTION = {"transcript_ids": None, "stale": True, "seller": None, "limit": None}
+
+
+def test_campaign_prioritizes_open_deals_resumes_and_swaps_atomically(monkeypatch, db) -> None:
+    for index in range(6):
+        transcript = Transcript(client=Client(name=f"Cliente {index}"), transcript=f"Texto {index}", closed=index < 3)
+        transcript.classification = Classification(**OLD)
+        db.add(transcript)
+    db.commit()
+
+    calls: list[str] = []
+
+    def classify_concurrently(items, concurrency=None):
+        async def run():
+            for key, text in items:
+                calls.append(text)
+                yield key, RuntimeError("cortado") if len(calls) == 4 else NEW
+
+        return run()
+
+    monkeypatch.setattr(classify, "classify_concurrently", classify_concurrently)
+    run = reclassify.start_campaign(db, SELECTION)
+    assert run.total == 6
+    asyncio.run(reclassify.run_campaign(db, run, chunk_size=2))
+    assert calls[:3] == ["Texto 3", "Texto 4", "Texto 5"]
+    assert (run.processed, run.failed) == (5, 1)
+    assert db.scalar(select(func.count()).where(Classification.summary == "nuevo")) == 0
+
+    run = reclassify.start_campaign(db, SELECTION)
+    asyncio.run(reclassify.run_campaign(db, run, chunk_size=2))
+    assert len(calls) == 7 and (run.processed, run.failed) == (6, 0)
+    assert reclassify.swap(db, run) == 6
+    rows = db.scalars(select(Classification)).all()
+    assert {(row.summary, row.prompt_version) for row in rows} == {("nuevo", PROMPT_VERSION)}
+    assert reclassify.select_targets(db, stale=True) == []
@@ -1,5 +1,6 @@
-import { useQuery } from '@tanstack/react-query';
+import { keepPreviousData, useQuery } from '@tanstack/react-query';
 
+import { useFilterStore } from '../store/filterStore';
 import apiClient from './client';
 
 export type Classification = {
@@ -136,86 +137,68 @@ export type SentimentConversionSeries = {
 
 export type UseCaseStatus = "all" | "closed" | "open";
 
+export type MetricsDashboard = {
+  overview: MetricsOverview | null;
+  funnel: MetricsFunnel | null;
+  conversions: ConversionMetrics | null;
+  urgency_budget: UrgencyBudgetHeatmap | null;
+  use_cases: Record<UseCaseStatus, UseCaseDistribution> | null;
+  pains: PainDistribution | null;
+  sentiment_conversion: SentimentConversionSeries | null;
+  seller_conversion: SellerConversionResponse | null;
+  origins: OriginDistribution | null;
+  automatization_outcomes: AutomatizationOutcomeSeries | null;
+};
+
+export type DashboardSection = keyof MetricsDashboard;
+
+// Every widget reads its section from one shared /metrics/dashboard query.
+export const DASHBOARD_SECTIONS: DashboardSection[] = [
+  'overview',
+  'funnel',
+  'conversions',
+  'urgency_budget',
+  'use_cases',
+  'pains',
+  'sentiment_conversion',
+  'seller_conversion',
+  'origins',
+  'automatization_outcomes',
+];
+
 export type ClientFilters = {
   dateRange?: string;
   seller?: string;
   segment?: string;
+  useCase?: string;
 };
 
 const keys = {
   clients: (filters: ClientFilters) => ['clients', filters] as const,
-  overview: ['metrics', 'overview'] as const,
-  funnel: ['metrics', 'funnel'] as const,
-  conversions: ['metrics', 'conversions'] as const,
-  urgencyBudget: ['metrics', 'urgency-budget'] as const,
-  useCases: (status: UseCaseStatus) => ['metrics', 'use-cases', status] as const,
-  pains: ['metrics', 'pains', 'distribution'] as const,
-  sellerConversion: ['metrics', 'seller-conversion'] as const,
-  origins: ['metrics', 'origins'] as const,
-  automatization: ['metrics', 'automatization-outcomes'] as const,
-  sentimentConversion: ['metrics', 'sentiment-conversion'] as const,
+  dashboard: (sections: DashboardSection[], filters: ClientFilters) =>
+    ['metrics', 'dashboard', sections, filters] as const,
 } as const;
 
+const filterParams = (filters: ClientFilters) => ({
+  seller: filters.seller !== 'all' ? filters.seller : undefined,
+  date_range: filters.dateRange === 'all' ? undefined : filters.dateRange,
+  use_case: filters.useCase,
+});
+
 export async function fetchClients(filters: ClientFilters = {}): Promise<ClientListResponse> {
   const { data } = await apiClient.get<ClientListResponse>('/clients', {
-    params: {
-      seller: filters.seller !== 'all' ? filters.seller : undefined,
-      date_range: filters.dateRange === 'all' ? undefined : filters.dateRange,
-    },
+    params: filterParams(filters),
   });
   return data;
 }
 
-export async function fetchMetricsOverview(): Promise<MetricsOverview> {
-  const { data } = await apiClient.get<MetricsOverview>('/metrics/overview');
-  return data;
-}
-
-export async function fetchMetricsFunnel(): Promise<MetricsFunnel> {
-  const { data } = await apiClient.get<MetricsFunnel>('/metrics/funnel');
-  return data;
-}
-
-export async function fetchConversionMetrics(): Promise<ConversionMetrics> {
-  const { data } = await apiClient.get<ConversionMetrics>('/metrics/conversions');
-  return data;
-}
-
-export async function fetchUrgencyBudgetHeatmap(): Promise<UrgencyBudgetHeatmap> {
-  const { data } = await apiClient.get<UrgencyBudgetHeatmap>('/metrics/urgency-budget');
-  return data;
-}
-
-export async function fetchPainDistribution(): Promise<PainDistribution> {
-  const { data } = await apiClient.get<PainDistribution>('/metrics/pains/distribution');
-  return data;
-}
-
-export async function fetchSellerConversion(): Promise<SellerConversionResponse> {
-  const { data } = await apiClient.get<SellerConversionResponse>('/metrics/seller-conversion');
-  return data;
-}
-
-export async function fetchOriginDistribution(): Promise<OriginDistribution> {
-  const { data } = await apiClient.get<OriginDistribution>('/metrics/origins');
-  return data;
-}
-
-export async function fetchAutomatizationOutcomes(): Promise<AutomatizationOutcomeSeries> {
-  const { data } = await apiClient.get<AutomatizationOutcomeSeries>('/metrics/automatization-outcomes');
-  return data;
-}
-
-export async function fetchSentimentConversion(): Promise<SentimentConversionSeries> {
-  const { data } = await apiClient.get<SentimentConversionSeries>('/metrics/sentiment-conversion');
-  return data;
-}
-
-export async function fetchUseCaseDistribution(
-  status: UseCaseStatus = 'all'
-): Promise<UseCaseDistribution> {
-  const { data } = await apiClient.get<UseCaseDistribution>('/metrics/use-cases', {
-    params: { status },
+export async function fetchMetricsDashboard(
+  sections: DashboardSection[] = DASHBOARD_SECTIONS,
+  filters: ClientFilters = {}
+): Promise<MetricsDashboard> {
+  const { data } = await apiClient.get<MetricsDashboard>('/metrics/dashboard', {
+    params: { sections, ...filterParams(filters) },
+    paramsSerializer: { indexes: null },
   });
   return data;
 }
@@ -228,72 +211,83 @@ export function useClients(filters: ClientFilters) {
   });
 }
 
-export function useMetricsOverview() {
+export function useMetricsDashboard<T>(
+  select: (payload: MetricsDashboard) => T,
+  sections: DashboardSection[] = DASHBOARD_SECTIONS,
+  filters: ClientFilters = {}
+) {
   return useQuery({
-    queryKey: keys.overview,
-    queryFn: fetchMetricsOverview,
+    queryKey: keys.dashboard(sections, filters),
+    queryFn: () => fetchMetricsDashboard(sections, filters),
+    select,
+    placeholderData: keepPreviousData,
   });
 }
 
+// Seller and date range chosen in the global filters apply to every widget.
+function useDashboardFilters(): ClientFilters {
+  const seller = useFilterStore((state) => state.seller);
+  const dateRange = useFilterStore((state) => state.dateRange);
+  return { seller, dateRange };
+}
+
+function useFilteredDashboard<T>(select: (payload: MetricsDashboard) => T) {
+  return useMetricsDashboard(select, DASHBOARD_SECTIONS, useDashboardFilters());
+}
+
+export function useMetricsOverview() {
+  return useFilteredDashboard((payload) => payload.overview!);
+}
+
 export function useMetricsFunnel() {
-  return useQuery({
-    queryKey: keys.funnel,
-    queryFn: fetchMetricsFunnel,
-  });
+  return useFilteredDashboard((payload) => payload.funnel!);
 }
 
 export function useConversionMetrics() {
-  return useQuery({
-    queryKey: keys.conversions,
-    queryFn: fetchConversionMetrics,
-  });
+  return useFilteredDashboard((payload) => payload.conversions!);
+}
+
+const CROSS_FILTERED_SECTIONS: DashboardSection[] = [
+  'urgency_budget',
+  'sentiment_conversion',
+  'seller_conversion',
+];
+
+// Widgets re-sliced by the use case selected in UseCaseDistribution.
+function useCrossFilteredDashboard<T>(select: (payload: MetricsDashboard) => T) {
+  const filters = useDashboardFilters();
+  const useCase = useFilterStore((state) => state.useCase);
+  return useMetricsDashboard(
+    select,
+    useCase ? CROSS_FILTERED_SECTIONS : DASHBOARD_SECTIONS,
+    useCase ? { ...filters, useCase } : filters
+  );
 }
 
 export function useUrgencyBudgetHeatmap() {
-  return useQuery({
-    queryKey: keys.urgencyBudget,
-    queryFn: fetchUrgencyBudgetHeatmap,
-  });
+  return useCrossFilteredDashboard((payload) => payload.urgency_budget!);
 }
 
 export function useUseCaseDistribution(status: UseCaseStatus) {
-  return useQuery({
-    queryKey: keys.useCases(status),
-    queryFn: () => fetchUseCaseDistribution(status),
-  });
+  return useFilteredDashboard((payload) => payload.use_cases![status]);
 }
 
 export function usePainDistribution() {
-  return useQuery({
-    queryKey: keys.pains,
-    queryFn: fetchPainDistribution,
-  });
+  return useFilteredDashboard((payload) => payload.pains!);
 }
 
 export function useSellerConversion() {
-  return useQuery({
-    queryKey: keys.sellerConversion,
-    queryFn: fetchSellerConversion,
-  });
+  return useCrossFilteredDashboard((payload) => payload.seller_conversion!);
 }
 
 export function useOriginDistribution() {
-  return useQuery({
-    queryKey: keys.origins,
-    queryFn: fetchOriginDistribution,
-  });
+  return useFilteredDashboard((payload) => payload.origins!);
 }
 
 export function useAutomatizationOutcomes() {
-  return useQuery({
-    queryKey: keys.automatization,
-    queryFn: fetchAutomatizationOutcomes,
-  });
+  return useFilteredDashboard((payload) => payload.automatization_outcomes!);
 }
 
 export function useSentimentConversion() {
-  return useQuery({
-    queryKey: keys.sentimentConversion,
-    queryFn: fetchSentimentConversion,
-  });
+  return useCrossFilteredDashboard((payload) => payload.sentiment_conversion!);
 }
@@ -5,6 +5,16 @@ export type CSVIngestResponse = {
   inserted_clients: number;
   inserted_transcripts: number;
   classified_transcripts: number;
+  errors: number;
+};
+
+export type IngestJobState = "pending" | "running" | "completed" | "failed";
+
+export type IngestJobStatus = CSVIngestResponse & {
+  job_id: string;
+  filename?: string | null;
+  state: IngestJobState;
+  last_error?: string | null;
 };
 
 export async function ingestClientsCsv(file: File): Promise<CSVIngestResponse> {
@@ -22,3 +32,34 @@ export async function ingestClientsCsv(file: File): Promise<CSVIngestResponse> {
   return data;
 }
 
+export async function startIngestJob(file: File): Promise<IngestJobStatus> {
+  const formData = new FormData();
+  formData.append("upload", file);
+
+  const { data } = await apiClient.post<IngestJobStatus>(
+    "/ingest/csv/jobs",
+    formData,
+    {
+      headers: { "Content-Type": "multipart/form-data" },
+    }
+  );
+
+  return data;
+}
+
+export function subscribeIngestJob(
+  jobId: string,
+  onProgress: (status: IngestJobStatus) => void
+): () => void {
+  const source = new EventSource(
+    `${apiClient.defaults.baseURL}/ingest/jobs/${jobId}/events`
+  );
+  source.addEventListener("progress", (event) => {
+    const status = JSON.parse((event as MessageEvent<string>).data) as IngestJobStatus;
+    onProgress(status);
+    if (status.state === "completed" || status.state === "failed") {
+      source.close();
+    }
+  });
+  return () => source.close();
+}
@@ -1,4 +1,4 @@
-import { ChangeEvent, FormEvent, useState } from "react";
+import { ChangeEvent, FormEvent, useEffect, useRef, useState } from "react";
 
 import UploadFileIcon from "@mui/icons-material/UploadFile";
 import {
@@ -7,13 +7,14 @@ import {
   DialogActions,
   DialogContent,
   DialogTitle,
+  LinearProgress,
   Stack,
   Typography,
 } from "@mui/material";
 import { isAxiosError } from "axios";
 
-import type { CSVIngestResponse } from "../../api/ingest";
-import { ingestClientsCsv } from "../../api/ingest";
+import type { CSVIngestResponse, IngestJobStatus } from "../../api/ingest";
+import { startIngestJob, subscribeIngestJob } from "../../api/ingest";
 
 type CsvIngestDialogProps = {
   open: boolean;
@@ -30,10 +31,15 @@ const CsvIngestDialog = ({
 }: CsvIngestDialogProps) => {
   const [file, setFile] = useState<File | null>(null);
   const [isUploading, setIsUploading] = useState(false);
+  const [progress, setProgress] = useState<IngestJobStatus | null>(null);
+  const unsubscribeRef = useRef<(() => void) | null>(null);
+
+  useEffect(() => () => unsubscribeRef.current?.(), []);
 
   const resetState = () => {
     setFile(null);
     setIsUploading(false);
+    setProgress(null);
   };
 
   const handleClose = () => {
@@ -56,9 +62,21 @@ const CsvIngestDialog = ({
     }
     setIsUploading(true);
     try {
-      const response = await ingestClientsCsv(file);
-      onSuccess?.(response);
-      handleClose();
+      const job = await startIngestJob(file);
+      setProgress(job);
+      unsubscribeRef.current = subscribeIngestJob(job.job_id, (status) => {
+        setProgress(status);
+        if (status.state === "completed") {
+          unsubscribeRef.current = null;
+          onSuccess?.(status);
+          resetState();
+          onClose();
+        } else if (status.state === "failed") {
+          unsubscribeRef.current = null;
+          onError?.(status.last_error ?? "Error al procesar el CSV.");
+          setIsUploading(false);
+        }
+      });
     } catch (error) {
       let message = "Error al cargar el CSV.";
       if (isAxiosError(error)) {
@@ -105,6 +123,17 @@ const CsvIngestDialog = ({
                 No se ha seleccionado archivo.
               </Typography>
             )}
+            {progress ? (
+              <Stack spacing={1}>
+                <LinearProgress />
+                <Typography variant="body2" color="text.secondary">
+                  Filas: {progress.processed_rows} · Clientes nuevos:{" "}
+                  {progress.inserted_clients} · Transcritos nuevos:{" "}
+                  {progress.inserted_transcripts} · Clasificados:{" "}
+                  {progress.classified_transcripts} · Errores: {progress.errors}
+                </Typography>
+              </Stack>
+            ) : null}
           </Stack>
         </DialogContent>
         <DialogActions>
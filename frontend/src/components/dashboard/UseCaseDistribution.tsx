@@ -11,6 +11,7 @@ import {
   Bar,
   BarChart,
   CartesianGrid,
+  Cell,
   ResponsiveContainer,
   Tooltip,
   XAxis,
@@ -22,6 +23,7 @@ import {
   type UseCaseStatus,
   useUseCaseDistribution,
 } from "../../api/clients";
+import { useFilterStore } from "../../store/filterStore";
 
 const FILTER_OPTIONS: { label: string; value: UseCaseStatus }[] = [
   { label: "Todos", value: "all" },
@@ -32,6 +34,7 @@ const FILTER_OPTIONS: { label: string; value: UseCaseStatus }[] = [
 const UseCaseDistribution = () => {
   const [status, setStatus] = useState<UseCaseStatus>("all");
   const { data, isLoading } = useUseCaseDistribution(status);
+  const { useCase: selectedUseCase, toggleUseCase } = useFilterStore();
   const theme = useTheme();
 
   const items = [...(data?.items ?? [])];
@@ -48,6 +51,13 @@ const UseCaseDistribution = () => {
     }
   };
 
+  const handleBarClick = (_entry: unknown, index: number) => {
+    const useCase = chartData[index]?.use_case;
+    if (useCase && useCase !== "Desconocido") {
+      toggleUseCase(useCase);
+    }
+  };
+
   const showEmptyState = !isLoading && chartData.length === 0;
 
   return (
@@ -82,7 +92,9 @@ const UseCaseDistribution = () => {
               {totalCases}
             </Typography>
             <Typography variant="body2" color="text.secondary">
-              Total de oportunidades
+              {selectedUseCase
+                ? `Filtrando por ${selectedUseCase} (clic de nuevo para quitar)`
+                : "Total de oportunidades"}
             </Typography>
           </Stack>
           <ToggleButtonGroup
@@ -135,10 +147,22 @@ const UseCaseDistribution = () => {
               <Tooltip />
               <Bar
                 dataKey="total"
-                fill={theme.palette.secondary.main}
                 radius={[0, 12, 12, 0]}
                 barSize={22}
-              />
+                cursor="pointer"
+                onClick={handleBarClick}
+              >
+                {chartData.map((entry) => (
+                  <Cell
+                    key={entry.use_case}
+                    fill={
+                      entry.use_case === selectedUseCase
+                        ? theme.palette.primary.main
+                        : theme.palette.secondary.main
+                    }
+                  />
+                ))}
+              </Bar>
             </BarChart>
           </ResponsiveContainer>
         )}
@@ -4,16 +4,20 @@ export type FilterSlice = {
   dateRange: 'all' | '7d' | '30d' | '90d';
   seller: string;
   segment: string;
+  useCase: string | null;
   setDateRange: (value: FilterSlice['dateRange']) => void;
   setSeller: (value: string) => void;
   setSegment: (value: string) => void;
+  toggleUseCase: (value: string) => void;
 };
 
 export const useFilterStore = create<FilterSlice>((set) => ({
   dateRange: '30d',
   seller: 'all',
   segment: 'all',
+  useCase: null,
   setDateRange: (value) => set({ dateRange: value }),
   setSeller: (value) => set({ seller: value }),
   setSegment: (value) => set({ segment: value }),
+  toggleUseCase: (value) => set((state) => ({ useCase: state.useCase === value ? null : value })),
 }));